@@ -0,0 +1,258 @@
+"""
+End-to-end benchmark: query() against the local mock Weibo site of mock_weibo.py.
+
+Reports, per run and as the median over the runs:
+    items_per_second            items yielded / wall time of the query
+    time_to_first_item          seconds from the start of the query to its first item
+    webdriver_calls_per_item    WebDriver round trips / items yielded (0 for the http engine)
+    peak_rss_mb                 peak resident memory of this process and its children (Chrome) during the runs
+    kb_per_page                 kilobytes served by the mock site per page (html + the assets it fetched)
+
+The results can be saved with --output and compared with a previous file through --baseline: the exit code is 1 when
+a metric is worse than the baseline by more than --tolerance, so that a CI job catches performance regressions.
+
+Usage: python benchmarks/bench_e2e.py --engine chrome --runs 3 --cards 20 --pages 2 --latency 0.05
+       python benchmarks/bench_e2e.py --engine http --output bench.json
+       python benchmarks/bench_e2e.py --engine http --baseline bench.json --tolerance 0.25
+       python benchmarks/bench_e2e.py --engine chrome --no-lean-profile    # before/after the lean browser profile
+       python benchmarks/bench_e2e.py --engine chrome --navigation type    # the same in the tabs of the search bar
+       python benchmarks/bench_e2e.py --engine chrome --no-incremental-extraction    # time_to_first_item before/after
+       python benchmarks/bench_e2e.py --engine chrome --watch-seconds 60    # watch() instead of repeated query() runs
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import mock_weibo  # noqa: E402
+from wei223be19ab11e891bo import query, watch  # noqa: E402
+from wei223be19ab11e891bo.http_engine import close_client_session  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+KEYWORDS = ["比特币", "以太坊", "美联储", "晚霞"]
+# larger is better for these, smaller is better for the others
+HIGHER_IS_BETTER = {"items_per_second"}
+
+
+class RssSampler:
+    """
+    Peak RSS of the process tree, sampled with psutil when it is installed. Without psutil only the peak of this process
+    (and of its terminated children) is known, through getrusage.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self.task = None
+
+    def sample(self):
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        self.peak = max(self.peak, rss)
+
+    async def run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if psutil is not None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.sample()
+            return self.peak
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss \
+            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return usage * 1024  # kilobytes on Linux
+
+
+async def run_query(parameters):
+    """
+    :return: the measures of a single query() run
+    """
+    received = []
+    parameters = dict(parameters, metrics_callback=received.append, metrics_aggregate=False)
+    started = time.monotonic()
+    first_item_at = None
+    items = 0
+    async for _ in query(parameters):
+        items += 1
+        if first_item_at is None:
+            first_item_at = time.monotonic()
+    elapsed = time.monotonic() - started
+    counters = received[0].as_dict()["counters"] if received else {}
+    return {
+        "items": items,
+        "seconds": elapsed,
+        "items_per_second": items / elapsed if elapsed > 0 else 0.0,
+        "time_to_first_item": (first_item_at - started) if first_item_at is not None else elapsed,
+        "webdriver_calls_per_item": counters.get("webdriver_calls", 0) / max(items, 1),
+    }
+
+
+async def run_watch(parameters, seconds):
+    """
+    :return: the measures of a watch() run of that many seconds, in the same form as run_query
+    """
+    received = []
+    parameters = dict(parameters, metrics_callback=received.append, metrics_aggregate=False,
+                      watch_metrics_interval_seconds=seconds * 2)
+    started = time.monotonic()
+    first_item_at = None
+    items = 0
+    stream = watch(parameters)
+    try:
+        while time.monotonic() - started < seconds:
+            try:
+                await asyncio.wait_for(stream.__anext__(), seconds - (time.monotonic() - started))
+            except asyncio.TimeoutError:
+                break
+            items += 1
+            if first_item_at is None:
+                first_item_at = time.monotonic()
+    finally:
+        await stream.aclose()
+    elapsed = time.monotonic() - started
+    webdriver_calls = sum(metrics.as_dict()["counters"].get("webdriver_calls", 0) for metrics in received)
+    return {
+        "items": items,
+        "seconds": elapsed,
+        "items_per_second": items / elapsed if elapsed > 0 else 0.0,
+        "time_to_first_item": (first_item_at - started) if first_item_at is not None else elapsed,
+        "webdriver_calls_per_item": webdriver_calls / max(items, 1),
+    }
+
+
+async def benchmark(arguments):
+    app = mock_weibo.make_app(latency=arguments.latency, cards=arguments.cards, pages=arguments.pages,
+                              ages=[float(age) for age in arguments.ages.split(",")] if arguments.ages else None,
+                              asset_kb=arguments.asset_kb)
+    runner, base_url = await mock_weibo.start(app)
+    parameters = {
+        "engine": arguments.engine,
+        "url": f"{base_url}/login.php?from=weibo.com",  # query() only accepts weibo.com urls
+        "search_url": f"{base_url}/realtime",
+        "keywords": KEYWORDS[:arguments.keywords],
+        "max_oldness_seconds": arguments.max_oldness_seconds,
+        "MAXIMUM_ITEMS_TO_COLLECT": arguments.max_items,
+        "deadline_seconds": arguments.deadline_seconds,
+        "min_post_length": 10,
+        "max_pages": arguments.pages,
+        "parallelism": arguments.parallelism,
+        "navigation": arguments.navigation,
+        "navigation_pacing_seconds": 0,
+        "seen_cache_path": None,
+        "keyword_stats_path": None,
+        "proxy": None,
+        "cookies": None,
+        "lean_profile": arguments.lean_profile,
+        "incremental_extraction": arguments.incremental_extraction,
+        # the mock site serves its assets from its own host, block them by path
+        "blocked_urls": ["*/static/css/*", "*/static/fonts/*", "*/static/pic/*", "*beacon.sina.com.cn*"],
+    }
+    sampler = RssSampler()
+    sampler.start()
+    runs = []
+    try:
+        for i in range(arguments.runs):
+            if arguments.watch_seconds:
+                runs.append(await run_watch(parameters, arguments.watch_seconds))
+            else:
+                runs.append(await run_query(parameters))
+            print(f"run {i + 1}: " + ", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                                               for key, value in runs[-1].items()))
+    finally:
+        peak_rss = await sampler.stop()
+        await close_client_session()
+        await runner.cleanup()
+    results = {key: statistics.median(run[key] for run in runs)
+               for key in ("items_per_second", "time_to_first_item", "webdriver_calls_per_item")}
+    results["peak_rss_mb"] = peak_rss / 2 ** 20
+    stats = app["stats"]
+    results["kb_per_page"] = (stats["page_bytes"] + stats["asset_bytes"]) / 1024 / max(stats["pages"], 1)
+    results["items"] = statistics.median(run["items"] for run in runs)
+    results["settings"] = {key: value for key, value in vars(arguments).items()
+                           if key not in ("output", "baseline", "tolerance")}
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    """
+    :return: a message per metric that is worse than the baseline by more than tolerance (a ratio)
+    """
+    messages = []
+    for key in ("items_per_second", "time_to_first_item", "webdriver_calls_per_item", "peak_rss_mb", "kb_per_page"):
+        if key not in baseline or not baseline[key]:
+            continue
+        ratio = results[key] / baseline[key]
+        if (key in HIGHER_IS_BETTER and ratio < 1 - tolerance) or (key not in HIGHER_IS_BETTER and ratio > 1 + tolerance):
+            messages.append(f"{key}: {results[key]:.3f} vs {baseline[key]:.3f} in the baseline")
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=["chrome", "http"], default="chrome")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--keywords", type=int, default=2, help="keywords searched per query")
+    parser.add_argument("--parallelism", type=int, default=1)
+    parser.add_argument("--cards", type=int, default=20, help="cards per result page")
+    parser.add_argument("--pages", type=int, default=2, help="result pages per keyword")
+    parser.add_argument("--ages", default=None, help="comma separated post ages in seconds, see mock_weibo.make_app")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--asset-kb", type=int, default=20, help="size of every asset referenced by the pages")
+    parser.add_argument("--lean-profile", action=argparse.BooleanOptionalAction, default=True,
+                        help="run Chrome with the lean profile (see browser_profile.py)")
+    parser.add_argument("--navigation", choices=["direct", "type"], default="direct",
+                        help="how the next keyword is reached: in \"type\" mode the results open in a new tab, whose "
+                             "first load is not lean")
+    parser.add_argument("--incremental-extraction", action=argparse.BooleanOptionalAction, default=True,
+                        help="hand the cards over after every scroll step (see scroll_stream)")
+    parser.add_argument("--watch-seconds", type=float, default=0,
+                        help="measure watch() for this many seconds per run, instead of a query() run")
+    parser.add_argument("--max-items", type=int, default=100)
+    parser.add_argument("--deadline-seconds", type=float, default=120, help="time budget of a query")
+    parser.add_argument("--max-oldness-seconds", type=int, default=1800)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results of a previous --output")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    arguments = parser.parse_args()
+
+    results = asyncio.run(benchmark(arguments))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if arguments.baseline:
+        with open(arguments.baseline, encoding="utf-8") as f:
+            messages = regressions(results, json.load(f), arguments.tolerance)
+        for message in messages:
+            print(f"REGRESSION {message}")
+        sys.exit(1 if messages else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark of the near-duplicate detection.
+
+signature: the MinHash signature of a post alone.
+check: NearDuplicateIndex.check (signature, LSH lookup and indexing), the index holding `size` posts already: unique
+posts, and waves of copies with a few characters changed like the spam of the market keywords.
+
+Usage: python benchmarks/bench_neardup.py [number of posts]
+"""
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from wei223be19ab11e891bo.neardup import DEFAULT_MAX_ENTRIES, NearDuplicateIndex, signature  # noqa: E402
+
+CHARACTERS = "比特币以太坊今天又涨了市场情绪非常乐观大家怎么看后续的走势呢美联储宣布维持利率不变北京时间周四凌晨符合预期" \
+             "声明称近几个月通胀有所缓解但仍处于高位晚霞太好看随手一拍都是壁纸我的镜头里夏天新一周也要加油鸭"
+SPAM_SHARE = 0.3  # share of the posts copying a recent one
+
+
+def random_post(rng):
+    return "".join(rng.choice(CHARACTERS) for _ in range(rng.randint(40, 140)))
+
+
+def repost(rng, post):
+    characters = list(post)
+    for _ in range(rng.randint(1, 3)):
+        characters[rng.randrange(len(characters))] = rng.choice(CHARACTERS)
+    return "".join(characters) + rng.choice(["", "转发", "速来加群"])
+
+
+def posts(rng, count):
+    """
+    :return: the posts, and whether each one copies an earlier one
+    """
+    recent, batch = [], []
+    for _ in range(count):
+        if recent and rng.random() < SPAM_SHARE:
+            batch.append((repost(rng, rng.choice(recent[-50:])), True))
+        else:
+            recent.append(random_post(rng))
+            batch.append((recent[-1], False))
+    return batch
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = random.Random(42)
+    batch = posts(rng, count)
+    seconds = min(timeit.repeat(lambda: [signature(post) for post, _ in batch], number=1, repeat=3))
+    print(f"{'signature':>16}: {seconds / count * 1e6:6.1f} us/post")
+    for size in (1000, DEFAULT_MAX_ENTRIES):
+        index = NearDuplicateIndex(max_entries=size)
+        for i, (post, _) in enumerate(posts(rng, size)):
+            index.check(post, f"https://weibo.com/fill/{i}")
+        started = time.perf_counter()
+        found = [index.check(post, f"https://weibo.com/1/{i}") is not None for i, (post, _) in enumerate(batch)]
+        seconds = time.perf_counter() - started
+        copies = sum(copy for _, copy in batch)
+        missed = sum(copy and not hit for (_, copy), hit in zip(batch, found))
+        false = sum(hit and not copy for (_, copy), hit in zip(batch, found))
+        print(f"{'check':>8} {size:>7}: {seconds / count * 1e6:6.1f} us/post, {copies - missed}/{copies} copies found, "
+              f"{false} false positives")
+
+
+if __name__ == "__main__":
+    main()
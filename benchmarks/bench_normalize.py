@@ -0,0 +1,67 @@
+"""
+Benchmark of the post content normalization.
+
+legacy: the former clean_content, a per-character generator dropping the Private Use Area followed by replace("#", " "),
+called once per card.
+normalize: TextNormalizer.normalize, called once per card.
+normalize_batch: TextNormalizer.normalize_batch, called once per page.
+
+Note that the legacy function does less work: it leaves the zero-width characters, the emoji placeholders, the
+展开全文 links and the whitespace runs in the content.
+
+Usage: python benchmarks/bench_normalize.py [number of pages]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from wei223be19ab11e891bo.normalize import DEFAULT_NORMALIZER  # noqa: E402
+
+# realtime result cards as innerText returns them
+POSTS = [
+    "#比特币[超话]# 比特币今天又站上了新高\u200b，币圈的朋友们怎么看？[哈哈][哈哈] 我觉得还会继续涨一波，"
+    "毕竟减半行情还没走完 \ue627 \n\n 展开全文c",
+    "【#美联储宣布维持利率不变#】北京时间周四凌晨，美联储宣布将联邦基金利率目标区间维持在5.25%至5.5%之间，"
+    "符合市场预期。声明称，近几个月通胀有所缓解但仍处于高位。\n \ue60b网页链接 展开全文c",
+    "转发微博 [doge]",
+    "今天的晚霞太好看了吧！！！[心][心][心]  \n\n\n  随手一拍都是壁纸 #我的镜头里的夏天# \ue627 ",
+    "回复@一只小透明:\u200d同感，这届年轻人真的太难了[允悲][允悲]\ufeff 收起全文d",
+    "#乌克兰局势# 乌克兰方面表示，将继续与国际伙伴就能源基础设施的保护问题进行磋商。\n 展开全文c",
+    "早上好☀️ 新的一周也要加油鸭[加油][加油] #每日打卡#",
+    "这个奢侈品牌的新款包你们会买吗？价格又涨了，真的有点离谱 [吃瓜]\n\n\n评论区说说看",
+] * 3  # a page of 24 cards
+
+
+def legacy_clean_content(content):
+    content = ''.join(ch for ch in content if ch < '\uE000' or ch > '\uF8FF')
+    return content.replace('#', ' ')
+
+
+def legacy_page():
+    return [legacy_clean_content(post) for post in POSTS]
+
+
+def normalize_page():
+    return [DEFAULT_NORMALIZER.normalize(post) for post in POSTS]
+
+
+def normalize_batch_page():
+    return DEFAULT_NORMALIZER.normalize_batch(POSTS)
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    assert normalize_page() == normalize_batch_page()
+    baseline = None
+    for name, function in (("legacy", legacy_page), ("normalize", normalize_page),
+                           ("normalize_batch", normalize_batch_page)):
+        seconds = min(timeit.repeat(function, number=pages, repeat=3))
+        baseline = baseline or seconds
+        print(f"{name:>16}: {seconds / pages * 1e6:8.1f} us/page, {seconds / pages / len(POSTS) * 1e6:6.2f} us/post, "
+              f"x{baseline / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of the publish time handling of a result page.
+
+legacy: what process_and_send + is_valid_item used to do for every card, i.e. build a "X秒前" / "Y分钟前" timestamp
+string with utcnow(), then strptime it back and compare it with a fresh now() (other formats were dropped).
+pageclock: PageClock, the current time read once per page and every format parsed to an epoch timestamp, compared with
+the page cutoff. The CreatedAt string is only rendered for the cards that are kept.
+
+Usage: python benchmarks/bench_timestamps.py [number of pages]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from wei223be19ab11e891bo.timestamps import PageClock, format_created_at  # noqa: E402
+
+MAX_OLDNESS_SECONDS = 1800
+# a realtime page of 20 cards: mostly fresh, some older ones at the bottom
+PAGE = ["刚刚", "8秒前", "35秒前", "1分钟前", "2分钟前", "4分钟前", "6分钟前", "9分钟前", "12分钟前", "15分钟前",
+        "18分钟前", "21分钟前", "25分钟前", "29分钟前", "33分钟前", "41分钟前", "52分钟前", "1小时前", "今天 10:12",
+        "10月18日 09:30"]
+
+
+def legacy_reconstruct(publish_time):
+    if "秒前" in publish_time:
+        date = datetime.utcnow() - timedelta(seconds=int(publish_time.split("秒前")[0]))
+        return date.strftime("%Y-%m-%dT%H:%M:%S.00Z")
+    elif "分钟前" in publish_time:
+        minutes = int(publish_time.split("分钟前")[0])
+        if minutes > 30:
+            return None
+        date = datetime.utcnow() - timedelta(minutes=minutes)
+        return date.strftime("%Y-%m-%dT%H:%M:%S.00Z")
+    return None
+
+
+def legacy_is_within(created_at, timeframe_sec):
+    dt = datetime.strptime(created_at, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+    return abs(datetime.now(timezone.utc) - dt) <= timedelta(seconds=timeframe_sec)
+
+
+def legacy_page():
+    kept = []
+    for publish_time in PAGE:
+        created_at = legacy_reconstruct(publish_time)
+        if created_at is not None and legacy_is_within(created_at, MAX_OLDNESS_SECONDS):
+            kept.append(created_at)
+    return kept
+
+
+def pageclock_page():
+    clock = PageClock()
+    cutoff = clock.cutoff(MAX_OLDNESS_SECONDS)
+    kept = []
+    for publish_time in PAGE:
+        published_at = clock.parse(publish_time)
+        if published_at is not None and published_at >= cutoff:
+            kept.append(format_created_at(published_at))
+    return kept
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for name, function in (("legacy", legacy_page), ("pageclock", pageclock_page)):
+        seconds = min(timeit.repeat(function, number=pages, repeat=3))
+        print(f"{name:>10}: {seconds / pages * 1e6:8.1f} us/page, {seconds / pages / len(PAGE) * 1e6:6.2f} us/card, "
+              f"{len(function())}/{len(PAGE)} cards kept")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Local mock of the Sina Weibo pages the collector walks through, for the end-to-end benchmark.
+
+    /login.php      landing page, with the input[node-type=searchInput] search bar
+    /weibo?q=       search results, with the div.m-main-nav bar linking to the realtime results
+    /realtime?q=    realtime results: the nav bar, the input.woo-input-main search bar (it opens a new tab, like Weibo),
+                    div.card cards and a .m-page a.next link to the next page
+    /static/...     the stylesheet, web font, pictures and analytics script the pages reference, padded to --asset-kb
+
+The markup follows the real pages closely enough for both engines (Chrome and http). Every request serves new posts
+(the post ids come from a counter), so that repeated runs are not skipped by the seen-post cache. The bytes served are
+counted in app["stats"], to compare the weight of a page load between browser profiles.
+"""
+import asyncio
+import itertools
+import time
+from datetime import datetime, timedelta, timezone
+from html import escape
+from urllib.parse import quote
+
+from aiohttp import web
+
+SHANGHAI = timezone(timedelta(hours=8))
+
+TEXTS = [
+    "#比特币[超话]# 比特币今天又站上了新高，币圈的朋友们怎么看？[哈哈] 我觉得还会继续涨一波，毕竟减半行情还没走完",
+    "【美联储宣布维持利率不变】北京时间周四凌晨，美联储宣布将联邦基金利率目标区间维持在5.25%至5.5%之间，符合市场预期。",
+    "今天的晚霞太好看了吧！！！[心][心] 随手一拍都是壁纸 #我的镜头里的夏天#",
+    "以太坊的手续费最近降了不少，链上活跃度反而上来了，这波升级还是有点东西的 展开全文c",
+]
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<link rel="stylesheet" href="/static/css/weibo.css">
+<script src="/static/beacon.sina.com.cn/analytics.js" async></script>
+</head>
+<body>
+{body}
+</body></html>
+"""
+
+SEARCH_FORM = """<form action="/weibo" method="get"{target}>
+  <input type="text" name="q" {attributes} autocomplete="off">
+</form>"""
+
+NAV = """<div class="m-main-nav">
+  <ul>
+    <li><a href="/weibo?q={q}">综合</a></li>
+    <li><a href="/realtime?q={q}&rd=realtime&tw=realtime&Refer=weibo_realtime">实时</a></li>
+    <li><a href="/user?q={q}">用户</a></li>
+  </ul>
+</div>"""
+
+CARD = """<div class="card-wrap" action-type="feed_list_item" mid="{mid}">
+  <div class="card">
+    <div class="card-feed">
+      <div class="content" node-type="like">
+        <div class="info">
+          <div><a href="//weibo.com/{uid}?refer_flag=1001030103_" class="name" nick-name="{nick}">{nick}</a></div>
+          <img src="/static/pic/{mid}.jpg" alt="">
+        </div>
+        <p class="txt" node-type="feed_list_content" nick-name="{nick}">{text}</p>
+        <div class="from">
+          <a href="//weibo.com/{uid}/{mid}?refer_flag=1001030103_" target="_blank">{time}</a>
+          来自 <a href="//app.weibo.com/t/feed/1" rel="nofollow">iPhone客户端</a>
+        </div>
+      </div>
+    </div>
+  </div>
+</div>"""
+
+
+def publish_time(age_seconds, now=None):
+    """
+    :return: the publish time of a post of that age, as Weibo displays it
+    """
+    if age_seconds < 60:
+        return f"{int(age_seconds)}秒前"
+    if age_seconds < 3600:
+        return f"{int(age_seconds // 60)}分钟前"
+    published_at = datetime.fromtimestamp((now or time.time()) - age_seconds, SHANGHAI)
+    return published_at.strftime("今天 %H:%M") if age_seconds < 86400 else published_at.strftime("%m月%d日 %H:%M")
+
+
+ASSET_TYPES = {".css": "text/css", ".js": "application/javascript", ".jpg": "image/jpeg", ".woff2": "font/woff2"}
+
+
+def make_app(latency=0.0, cards=20, pages=2, ages=None, asset_kb=20):
+    """
+    :param latency: seconds added to every response
+    :param cards: cards per realtime page
+    :param pages: realtime pages per keyword
+    :param ages: the ages (in seconds) of the posts of a keyword, from the first card of the first page on. Evenly spread
+    over 0-30 minutes if None, cards past the end of the list get the last age.
+    :param asset_kb: size of every static asset (stylesheet, font, picture, script)
+    """
+    ages = list(ages or [i * 1800 / (cards * pages) for i in range(cards * pages)])
+    post_ids = itertools.count(1)
+    stats = {"pages": 0, "page_bytes": 0, "assets": 0, "asset_bytes": 0}
+
+    @web.middleware
+    async def slow(request, handler):
+        if latency:
+            await asyncio.sleep(latency)
+        response = await handler(request)
+        size = len(response.body or b"") if isinstance(response, web.Response) else 0
+        if request.path.startswith("/static/"):
+            stats["assets"] += 1
+            stats["asset_bytes"] += size
+        else:
+            stats["pages"] += 1
+            stats["page_bytes"] += size
+        return response
+
+    def html(title, body):
+        return web.Response(text=PAGE.format(title=title, body=body), content_type="text/html")
+
+    async def login(request):
+        search = SEARCH_FORM.format(target="", attributes='node-type="searchInput" class="W_input"')
+        return html("微博-随时随地发现新鲜事", search)
+
+    async def search(request):
+        q = quote(request.query.get("q", ""))
+        search = SEARCH_FORM.format(target=' target="_blank"', attributes='class="woo-input-main"')
+        return html("微博搜索", search + NAV.format(q=q))
+
+    async def realtime(request):
+        keyword = request.query.get("q", "")
+        q = quote(keyword)
+        page = int(request.query.get("page", 1))
+        now = time.time()
+        body = [SEARCH_FORM.format(target=' target="_blank"', attributes='class="woo-input-main"'), NAV.format(q=q),
+                '<div id="pl_feedlist_index">']
+        for i in range(cards):
+            index = (page - 1) * cards + i
+            post_id = next(post_ids)
+            body.append(CARD.format(mid=f"M{post_id}", uid=1000000 + post_id % 5000, nick=f"用户{post_id % 5000}",
+                                    text=escape(f"{keyword} {TEXTS[post_id % len(TEXTS)]}"),
+                                    time=publish_time(ages[min(index, len(ages) - 1)], now)))
+        body.append("</div>")
+        if page < pages:
+            body.append(f'<div class="m-page"><a class="next" href="/realtime?q={q}&rd=realtime&page={page + 1}">'
+                        f'下一页</a></div>')
+        return html(f"{keyword} - 微博搜索", "\n".join(body))
+
+    async def static(request):
+        extension = "." + request.path.rsplit(".", 1)[-1]
+        body = b"/*" + b"x" * (asset_kb * 1024) + b"*/"
+        if extension == ".css":
+            body = b"@font-face{font-family:w;src:url(/static/fonts/weibo.woff2)} body{font-family:w}" + body
+        return web.Response(body=body, content_type=ASSET_TYPES.get(extension, "application/octet-stream"))
+
+    app = web.Application(middlewares=[slow])
+    app["stats"] = stats
+    app.router.add_get("/login.php", login)
+    app.router.add_get("/weibo", search)
+    app.router.add_get("/realtime", realtime)
+    app.router.add_get("/static/{path:.*}", static)
+    return app
+
+
+async def start(app, host="127.0.0.1", port=0):
+    """
+    :return: the AppRunner (to cleanup() once done) and the base url of the site
+    """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner, f"http://{host}:{site._server.sockets[0].getsockname()[1]}"
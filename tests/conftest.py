@@ -0,0 +1,245 @@
+from wei223be19ab11e891bo.extract import CARDS_SCRIPT, SCROLL_STEP_SCRIPT
+from wei223be19ab11e891bo.http_engine import close_client_session
+from wei223be19ab11e891bo.pacing import RateControllers
+from wei223be19ab11e891bo.pool import DriverPool
+from aiohttp import web
+import itertools
+import time
+import pytest
+import pytest_asyncio
+
+POST_IDS = itertools.count(1)
+PARAMETERS = {
+    "max_oldness_seconds": 3000,
+    "min_post_length": 10,
+    "seen_cache_path": None,
+    "keyword_stats_path": None,
+    "metrics_aggregate": False,
+    "near_duplicate_mode": "off",
+    "pacing_min_rate": 1000,
+    "pacing_max_rate": 1000,
+}
+
+
+class FakeElement:
+    def __init__(self, driver, href=None):
+        self.driver = driver
+        self.href = href
+
+    def send_keys(self, key):
+        self.driver.keys.append(key)
+
+    def get_attribute(self, name):
+        return self.href
+
+    def click(self):
+        self.driver.navigate(self.href)
+
+
+class FakeWebDriver:
+    """
+    A browser on Weibo: every result page holds `cards` fresh posts, `cards_per_scroll` of them showing up at every
+    scroll step (all at once if None), and links to the next one up to `pages`. Every call blocks for `latency` seconds,
+    like a chromedriver round trip, page loads raise `error` if set
+    """
+
+    def __init__(self, cards=5, cards_per_scroll=None, pages=3, latency=0.0, error=None):
+        self.cards = cards
+        self.cards_per_scroll = cards_per_scroll
+        self.pages = pages
+        self.latency = latency
+        self.error = error
+        self.healthy = True
+        self.current_url = None
+        self.window_handles = ["main"]
+        self.current_window_handle = "main"
+        self.switch_to = self
+        self.loads = []  # (time.monotonic(), url) of every page load, the clicked links included
+        self.keys = []
+        self.extractions = 0
+        self.scrolls = 0
+        self.quit_calls = 0
+        self.page, self.posts, self.loaded, self.read = 0, [], 0, 0
+
+    def navigate(self, url):
+        time.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        self.loads.append((time.monotonic(), url))
+        self.current_url = url
+        self.page = int(url.split("&page=")[1]) if "&page=" in url else 1
+        self.posts = [{"username": "用户", "text": f"第{post_id}条微博，内容足够长了", "time": "5秒前",
+                       "url": f"https://weibo.com/{post_id}/post?refer_flag=1001030103_"}
+                      for post_id in itertools.islice(POST_IDS, self.cards)]
+        self.loaded, self.read = min(self.cards, self.cards_per_scroll or self.cards), 0
+
+    def get(self, url):
+        self.navigate(url)
+
+    def scroll(self):
+        self.scrolls += 1
+        self.loaded = min(len(self.posts), self.loaded + (self.cards_per_scroll or self.cards))
+
+    def execute_async_script(self, script, xpath, root, timeout_ms, minimum):
+        time.sleep(self.latency)
+        if xpath == "//a[@href]":
+            return [FakeElement(self, "https://s.weibo.com/realtime?q=clicked")]
+        return [FakeElement(self)] if minimum else FakeElement(self)
+
+    def execute_script(self, script, *args):
+        time.sleep(self.latency)
+        if script is CARDS_SCRIPT:
+            self.extractions += 1
+            only_new, share = (args[4], args[5]) if len(args) > 4 else (False, None)
+            if share:
+                self.scroll()
+            result = {"cards": self.posts[self.read if only_new else 0:self.loaded],
+                      "rejected": {"no_url": 0, "no_time": 0, "too_old": 0, "too_short": 0},
+                      "next_page": f"{self.current_url.split('&page=')[0]}&page={self.page + 1}"
+                      if self.page < self.pages else None,
+                      "count": self.loaded}
+            if only_new:
+                self.read = self.loaded
+            if share:
+                result["bottom"] = self.loaded >= len(self.posts)
+            return result
+        if script is SCROLL_STEP_SCRIPT:
+            self.scroll()
+            return [self.loaded, self.loaded >= len(self.posts)]
+        if not self.healthy:
+            raise RuntimeError("chrome not reachable")
+        return "complete"
+
+    def close(self):
+        self.window_handles.remove(self.current_window_handle)
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+class FakeBrowser:
+    """
+    The FakeWebDrivers started by the pool, built with `options`
+    """
+
+    def __init__(self):
+        self.options = {}
+        self.drivers = []
+
+    def __call__(self, **driver_options):
+        self.drivers.append(FakeWebDriver(**self.options))
+        return self.drivers[-1]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+CARD = """
+<div class="card-wrap" action-type="feed_list_item" mid="{mid}">
+  <div class="card">
+    <div class="card-feed">
+      <div class="content" node-type="like">
+        <div class="info">
+          <div><a href="//weibo.com/{uid}?refer_flag=1001030103_" class="name" target="_blank" nick-name="{nick}">{nick}</a></div>
+        </div>
+        <p class="txt" node-type="feed_list_content" nick-name="{nick}">
+          {text}<br/>第二行
+        </p>
+        <p class="txt" node-type="feed_list_content_full" nick-name="{nick}" style="display: none">{text} 全文</p>
+        <div class="from">
+          <a href="//weibo.com/{uid}/{mid}?refer_flag=1001030103_" target="_blank">{time}</a>
+          来自 <a href="//app.weibo.com/t/feed/1" rel="nofollow">iPhone客户端</a>
+        </div>
+      </div>
+    </div>
+  </div>
+</div>
+"""
+
+TEXT = "比特币今天又涨了，市场情绪非常乐观，大家怎么看后续的走势呢"
+
+
+def make_realtime_page(times, first=0, next_page=None, text=TEXT):
+    """
+    :return: a realtime result page of s.weibo.com, with a card per publish time and a next page link if not None
+    """
+    cards = "".join(
+        CARD.format(mid=f"N{i}", uid=1000 + i, nick=f"用户{i}", text=text, time=time)
+        for i, time in enumerate(times, first)
+    )
+    pages = f"<div class='m-page'><div><a class='next' href='{next_page}'>下一页</a></div></div>" if next_page else ""
+    return f"<html><body><div class='m-main-nav'></div><div id='pl_feedlist_index'>{cards}{pages}</div></body></html>"
+
+
+@pytest.fixture
+def parameters():
+    """
+    The query() parameters of the tests: nothing kept on disk, and no pacing to speak of
+    """
+    return dict(PARAMETERS)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def fake_browser():
+    return FakeBrowser()
+
+
+@pytest.fixture
+def browser(fake_browser, monkeypatch):
+    """
+    Runs the Chrome engine on FakeWebDrivers, with a pool and a rate controller of its own
+    """
+    import wei223be19ab11e891bo as weibo
+
+    pacers = RateControllers(rate=1000, max_rate=1000)
+    pool = DriverPool(fake_browser, pacers=pacers)
+    monkeypatch.setattr(weibo, "RATE_CONTROLLERS", pacers)
+    monkeypatch.setattr(weibo, "DRIVER_POOL", pool)
+    yield fake_browser
+    pool.shutdown()
+
+
+@pytest.fixture
+def realtime_page():
+    return make_realtime_page
+
+
+@pytest_asyncio.fixture
+async def stub_weibo():
+    async def realtime(request):
+        if request.query.get("q") == "blocked":
+            raise web.HTTPFound("/visitor")
+        if request.query.get("q") == "限流":
+            raise web.HTTPTooManyRequests(text="<html><body>请求过于频繁</body></html>", content_type="text/html")
+        if request.query.get("q") == "故障":
+            raise web.HTTPBadGateway()
+        if request.query.get("q") == "翻页":  # fresh posts on every page, and always a next one
+            page = int(request.query.get("page", 1))
+            return web.Response(text=make_realtime_page(["5秒前", "6秒前"], 2 * page, f"?q=翻页&page={page + 1}"),
+                                content_type="text/html")
+        return web.Response(text=make_realtime_page(["5秒前", "3分钟前", "45分钟前", "2023年10月18日 10:12"]), content_type="text/html")
+
+    async def visitor(request):
+        return web.Response(text="<html><title>Sina Visitor System</title></html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/realtime", realtime)
+    app.router.add_get("/visitor", visitor)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/realtime"
+    await close_client_session()
+    await runner.cleanup()
@@ -0,0 +1,75 @@
+import wei223be19ab11e891bo as weibo
+from wei223be19ab11e891bo.browser_profile import DEFAULT_BLOCKED_URLS
+from wei223be19ab11e891bo.session import DriverSession
+import pytest
+
+
+class FakeChrome:
+    def __init__(self, options=None, service=None):
+        self.arguments = options.arguments
+        self.commands = []
+        self.current_window_handle = "main"
+        self.switch_to = self
+
+    def window(self, handle):
+        self.current_window_handle = handle
+        self.commands.append(("switch", handle))
+
+    def set_page_load_timeout(self, timeout):
+        pass
+
+    def set_script_timeout(self, timeout):
+        pass
+
+    def execute_cdp_cmd(self, command, parameters):
+        self.commands.append((command, parameters))
+
+
+@pytest.fixture
+def fake_chrome(monkeypatch):
+    monkeypatch.setattr("selenium.webdriver.Chrome", FakeChrome)
+
+
+def test_lean_profile(fake_chrome):
+    driver = weibo.init_driver(renderer_memory_mb=256)
+    for argument in ("--disable-extensions", "--disable-background-networking", "--disable-sync", "--mute-audio",
+                     "--js-flags=--max-old-space-size=256"):
+        assert argument in driver.arguments
+    assert driver.arguments.count("--disable-gpu") == 1
+    assert ("Network.setBlockedURLs", {"urls": DEFAULT_BLOCKED_URLS}) in driver.commands
+
+
+def test_custom_blocklist(fake_chrome):
+    driver = weibo.init_driver(blocked_urls=["*.css"])
+    assert ("Network.setBlockedURLs", {"urls": ["*.css"]}) in driver.commands
+
+
+def test_regular_profile(fake_chrome):
+    driver = weibo.init_driver(lean=False)
+    assert "--disable-extensions" not in driver.arguments
+    assert driver.commands == []
+
+
+@pytest.mark.asyncio
+async def test_blocklist_follows_the_new_tabs(fake_chrome):
+    session = DriverSession(weibo.init_driver(blocked_urls=["*.css"]))
+    await session.switch_to_window("results")  # the tab opened by a search typed in the search bar
+    await session.switch_to_window("results")
+    assert session.driver.commands[2:] == [("switch", "results"), ("Network.enable", {}),
+                                           ("Network.setBlockedURLs", {"urls": ["*.css"]})]
+    session.executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_regular_profile_blocks_nothing_in_new_tabs(fake_chrome):
+    session = DriverSession(weibo.init_driver(lean=False))
+    await session.switch_to_window("results")
+    assert session.driver.commands == [("switch", "results")]
+    session.executor.shutdown()
+
+
+def test_single_proxy_flag(fake_chrome, monkeypatch):
+    monkeypatch.setenv("HTTP_PROXY", "http://10.0.0.1:8080")
+    driver = weibo.init_driver(proxy="http://10.0.0.2:8080")
+    assert [argument for argument in driver.arguments if argument.startswith("--proxy-server")] == \
+        ["--proxy-server=http://10.0.0.2:8080"]
@@ -0,0 +1,125 @@
+from wei223be19ab11e891bo import RejectionStreak, process_and_send, query
+from wei223be19ab11e891bo.http_engine import realtime_url
+from wei223be19ab11e891bo.seen import SeenCache, get_seen_cache, post_key
+import asyncio
+import time
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_posts_are_claimed_as_soon_as_they_are_handed_over():
+    cards = [{"url": f"https://weibo.com/1/{i}?refer_flag=1", "username": "a", "time": "5秒前", "text": "内容" * 10}
+             for i in range(3)]
+    seen, claimed = SeenCache(), set()
+    first = process_and_send(cards, 0, seen, 600, 10, claimed=claimed)
+    await first.__anext__()
+    assert "1/0" in claimed  # before the consumer of the item got to it: another worker meeting the post skips it
+    assert "1/0" not in seen  # but the next runs do not, unless the item is yielded
+    second = [item["url"] async for item in process_and_send(cards, 0, seen, 600, 10, claimed=claimed)]
+    assert second == [card["url"] for card in cards[1:]]
+    await first.aclose()
+
+
+@pytest.mark.asyncio
+async def test_a_keyword_is_left_after_max_consecutive_old_posts():
+    def card(i, time):
+        return {"url": f"https://weibo.com/1/{i}?refer_flag=1", "username": "a", "time": time, "text": "内容" * 10}
+
+    cards = [card(0, "2小时前"), card(1, "2小时前"), card(2, "5秒前"), card(3, "2小时前"), card(4, "2小时前"),
+             card(5, "5秒前")]
+    streak = RejectionStreak(3)
+    items = [item["url"] async for item in process_and_send(cards, 0, None, 600, 10, streak=streak)]
+    assert items == [cards[2]["url"], cards[5]["url"]]  # every fresh post starts the count again
+    streak = RejectionStreak(2)
+    items = [item["url"] async for item in process_and_send(cards, 0, None, 600, 10, streak=streak)]
+    assert items == [] and streak.exhausted()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_workers_share_the_item_cap(browser, parameters):
+    parameters = dict(parameters, keywords=["比特币", "以太坊", "狗狗币"], parallelism=3,
+                      maximum_items_to_collect=7)
+    items = [item async for item in query(parameters)]
+    assert len(items) == 7
+    assert len({item["url"] for item in items}) == 7
+    assert len(browser.drivers) == 3
+
+
+@pytest.mark.asyncio
+async def test_only_the_yielded_posts_are_marked_seen(browser, tmp_path, parameters):
+    path = str(tmp_path / "seen.sqlite")
+    parameters = dict(parameters, keywords=["比特币", "以太坊", "狗狗币"], parallelism=3,
+                      maximum_items_to_collect=7, seen_cache_path=path)
+    items = [item async for item in query(parameters)]
+    assert len(items) == 7
+    assert sorted(get_seen_cache(path).entries) == sorted(post_key(item["url"]) for item in items)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_workers_fail_the_run_when_they_all_fail(browser, parameters):
+    browser.options["error"] = RuntimeError("chrome not reachable")
+    parameters = dict(parameters, keywords=["比特币", "以太坊", "狗狗币"], parallelism=2)
+    with pytest.raises(RuntimeError, match="chrome not reachable"):
+        _ = [item async for item in query(parameters)]
+    assert len(browser.drivers) == 2
+    assert all(driver.quit_calls == 1 for driver in browser.drivers)  # not trusted anymore
+
+
+@pytest.mark.asyncio
+async def test_keyword_jumps_reuse_the_results_page_and_keep_the_pacing_floor(browser, parameters):
+    keywords = ["比特币", "以太坊", "狗狗币"]
+    parameters = dict(parameters, keywords=keywords, max_pages=1, navigation="direct", navigation_pacing_seconds=0.1)
+    items = [item async for item in query(parameters)]
+    assert len(items) == 15
+    assert len(browser.drivers) == 1
+    driver = browser.drivers[0]
+    typed = "".join(driver.keys[:-1])  # the first keyword only, then the return key
+    assert typed in keywords
+    urls = [url for _, url in driver.loads]
+    assert urls[:2] == ["https://weibo.com/login.php", "https://s.weibo.com/realtime?q=clicked"]
+    assert sorted(urls[2:]) == sorted(realtime_url("https://s.weibo.com/realtime", keyword) for keyword in keywords
+                                      if keyword != typed)
+    assert all(later - earlier >= 0.09 for (earlier, _), (later, _) in zip(driver.loads, driver.loads[1:]))
+
+
+@pytest.mark.asyncio
+async def test_query_does_not_block_the_event_loop(browser, parameters):
+    browser.options["latency"] = 0.05  # every WebDriver call blocks its thread, like a chromedriver round trip
+    gaps = []
+
+    async def ticker():
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(0.005)
+            now = time.monotonic()
+            gaps.append(now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    parameters = dict(parameters, keywords=["比特币"], max_pages=2)
+    items = [item async for item in query(parameters)]
+    task.cancel()
+    assert len(items) == 10
+    assert len(gaps) > 20
+    assert max(gaps) < 0.04  # the WebDriver calls ran on the session thread
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("parallelism", [1, 2])
+async def test_a_driver_that_fails_to_start_is_retried(browser, monkeypatch, parallelism, parameters):
+    import wei223be19ab11e891bo as weibo
+
+    failures = [RuntimeError("chromedriver crashed on start")]
+    start = browser.__call__
+
+    def flaky_start(**driver_options):
+        if failures:
+            raise failures.pop()
+        return start(**driver_options)
+
+    monkeypatch.setattr(weibo.DRIVER_POOL, "factory", flaky_start)
+    monkeypatch.setattr(weibo, "ACQUIRE_BACKOFF_SECONDS", 0.01)
+    parameters = dict(parameters, keywords=["比特币", "以太坊"], max_pages=1, parallelism=parallelism)
+    items = [item async for item in query(parameters)]
+    assert len(items) == 10
+    assert not failures
@@ -0,0 +1,192 @@
+from wei223be19ab11e891bo.extract import extract_cards, extract_new_cards
+from wei223be19ab11e891bo.session import DriverSession
+from urllib.parse import urljoin
+import json
+import re
+import shutil
+import subprocess
+import pytest
+
+NODE = shutil.which("node")
+PAGE_URL = "https://s.weibo.com/realtime?q=%E6%AF%94%E7%89%B9%E5%B8%81"
+
+# a minimal DOM for the calls CARDS_SCRIPT makes, built from {tag, attrs, children} trees (text children are strings)
+HARNESS = r"""
+const input = JSON.parse(require("fs").readFileSync(0, "utf-8"));
+
+function element(node, parent) {
+    const children = [];
+    const self = {
+        tagName: node.tag,
+        parent: parent,
+        node: node,
+        getAttribute: name => name in node.attrs ? node.attrs[name] : null,
+        setAttribute: (name, value) => { node.attrs[name] = String(value); },
+        getElementsByTagName: tag => descendants(self).filter(e => e.tagName === tag),
+        querySelectorAll: selector => select(self, selector),
+        querySelector: selector => select(self, selector)[0] || null,
+        get innerText() { return text(node); },
+        get href() { return node.attrs.href === undefined ? "" : new URL(node.attrs.href, input.url).href; },
+    };
+    for (const child of node.children || []) {
+        if (typeof child !== "string") { children.push(element(child, self)); }
+    }
+    self.children = children;
+    return self;
+}
+
+function text(node) {
+    return (node.children || []).map(child => typeof child === "string" ? child : text(child)).join("");
+}
+
+function descendants(root) {
+    return root.children.flatMap(child => [child].concat(descendants(child)));
+}
+
+function matches(e, compound) {
+    const [, tag, cls, attr] = compound.match(/^([a-z]*)(?:\.([\w-]+))?(?:\[([\w-]+)\])?$/);
+    const classes = (e.getAttribute("class") || "").split(" ");
+    return (!tag || e.tagName === tag) && (!cls || classes.includes(cls)) && (!attr || e.getAttribute(attr) !== null);
+}
+
+function select(root, selector) {
+    const compounds = selector.split(" ");
+    return descendants(root).filter(e => {
+        if (!matches(e, compounds[compounds.length - 1])) { return false; }
+        let i = compounds.length - 2;
+        for (let ancestor = e.parent; ancestor && ancestor !== root && i >= 0; ancestor = ancestor.parent) {
+            if (matches(ancestor, compounds[i])) { i--; }
+        }
+        return i < 0;
+    });
+}
+
+const body = element({tag: "body", attrs: {}, children: input.dom}, null);
+globalThis.document = {
+    getElementsByTagName: body.getElementsByTagName,
+    querySelector: body.querySelector,
+    documentElement: {scrollHeight: 1000},
+};
+globalThis.window = {innerHeight: 1000, scrollY: 0, scrollBy: (x, y) => {}};
+const result = new Function(input.script).apply(null, input.args);
+process.stdout.write(JSON.stringify({result: result, dom: input.dom}));
+"""
+
+
+def card(nick, text, time, post_href="//weibo.com/1000/N0abcdEFg?refer_flag=1001030103_"):
+    """
+    :return: the markup of a result card, like the ones served by s.weibo.com
+    """
+    return {"tag": "div", "attrs": {"class": "card"}, "children": [
+        {"tag": "div", "attrs": {"class": "info"}, "children": [
+            {"tag": "a", "attrs": {"href": "//weibo.com/1000?refer_flag=1001030103_", "class": "name",
+                                   "nick-name": nick}, "children": [nick]},
+        ]},
+        {"tag": "p", "attrs": {"class": "txt", "node-type": "feed_list_content"}, "children": [text]},
+        {"tag": "div", "attrs": {"class": "from"}, "children": [
+            {"tag": "a", "attrs": {"href": post_href}, "children": [time]},
+            " 来自 ",
+            {"tag": "a", "attrs": {"href": "//app.weibo.com/t/feed/1"}, "children": ["iPhone客户端"]},
+        ]},
+    ]}
+
+
+NEXT_PAGE = {"tag": "div", "attrs": {"class": "m-page"}, "children": [
+    {"tag": "a", "attrs": {"class": "next", "href": "/realtime?q=%E6%AF%94%E7%89%B9%E5%B8%81&page=2"},
+     "children": ["下一页"]},
+]}
+
+
+class NodeDriver:
+    """
+    Runs the scripts on a fake DOM with node, keeping the attributes they set between two calls
+    """
+
+    def __init__(self, dom):
+        self.dom = dom
+
+    def execute_script(self, script, *args):
+        payload = json.dumps({"script": script, "args": args, "dom": self.dom, "url": PAGE_URL})
+        output = subprocess.run([NODE, "-e", HARNESS], input=payload, capture_output=True, text=True, check=True)
+        answer = json.loads(output.stdout)
+        self.dom = answer["dom"]
+        return answer["result"]
+
+
+class SeleniumElement:
+    """
+    The element API read_card used, on the same trees
+    """
+
+    def __init__(self, node):
+        self.node = node
+
+    @property
+    def text(self):
+        return "".join(child if isinstance(child, str) else SeleniumElement(child).text
+                       for child in self.node["children"]).strip()
+
+    def get_attribute(self, name):
+        value = self.node["attrs"].get(name)
+        return urljoin(PAGE_URL, value) if name == "href" and value is not None else value
+
+    def find_elements(self, by, xpath):
+        tag, attribute, value = re.match(r"\.//(\w+)\[@([\w-]+)(?:='([^']*)')?]", xpath).groups()
+        found = []
+        for child in self.node["children"]:
+            if isinstance(child, str):
+                continue
+            if child["tag"] == tag and attribute in child["attrs"] and value in (None, child["attrs"][attribute]):
+                found.append(SeleniumElement(child))
+            found += SeleniumElement(child).find_elements(by, xpath)
+        return found
+
+    def find_element(self, by, xpath):
+        return self.find_elements(by, xpath)[0]
+
+
+def read_card(card):
+    """
+    The fields the collector used to read from a card with one WebDriver call each, before CARDS_SCRIPT
+    """
+    username = card.find_element("xpath", ".//a[@nick-name]").text
+    content = card.find_element("xpath", ".//p[@class='txt']").text
+    container = card.find_element("xpath", ".//div[@class='from']")
+    for element in container.find_elements("xpath", ".//a[@href]"):
+        ref = element.get_attribute("href")
+        if "refer_flag" in ref:
+            return {"username": username, "text": content, "url": ref, "time": element.text}
+    return {"username": username, "text": content, "url": None, "time": None}
+
+
+KEPT = card("币圈老王", "比特币今天又涨了，市场情绪非常乐观，大家怎么看后续的走势呢", "5分钟前")
+PAGE = [
+    KEPT,
+    card("路人甲", "没有原文链接的卡片，内容也足够长了吧", "3分钟前", post_href="//weibo.com/1000"),
+    card("路人乙", "太短", "1分钟前"),
+    card("路人丙", "两个小时之前的微博，已经超出了时间窗口", "2小时前"),
+    NEXT_PAGE,
+]
+
+
+@pytest.mark.skipif(NODE is None, reason="runs CARDS_SCRIPT with node")
+@pytest.mark.asyncio
+async def test_cards_script_reads_the_fields_read_card_did():
+    result = await extract_cards(DriverSession(NodeDriver(PAGE)), 10, 30)
+    assert result["cards"] == [read_card(SeleniumElement(KEPT))]
+    assert result["cards"][0]["url"] == "https://weibo.com/1000/N0abcdEFg?refer_flag=1001030103_"
+    assert result["rejected"] == {"no_url": 1, "no_time": 0, "too_old": 1, "too_short": 1}
+    assert result["next_page"] == "https://s.weibo.com/realtime?q=%E6%AF%94%E7%89%B9%E5%B8%81&page=2"
+
+
+@pytest.mark.skipif(NODE is None, reason="runs CARDS_SCRIPT with node")
+@pytest.mark.asyncio
+async def test_cards_script_reads_each_card_once_in_incremental_mode():
+    session = DriverSession(NodeDriver(PAGE))
+    first = await extract_new_cards(session, 10, 30)
+    assert first["cards"] == [read_card(SeleniumElement(KEPT))]
+    assert first["count"] == 4
+    second = await extract_new_cards(session, 10, 30, scroll_share=0.8)
+    assert second["cards"] == []
+    assert sum(second["rejected"].values()) == 0
+    assert second["bottom"] is True
@@ -0,0 +1,136 @@
+from wei223be19ab11e891bo import query
+from wei223be19ab11e891bo.http_engine import (CLIENT_SESSIONS, LoginWallError, ThrottledError, fetch_cards, parse_cards,
+                                              parse_page)
+from exorde_data.models import Item
+from aiohttp import ClientResponseError
+import asyncio
+import pytest
+
+
+def test_parse_cards(realtime_page):
+    text = "比特币今天又涨了，市场情绪非常乐观，大家怎么看后续的走势呢"
+    cards = parse_cards(realtime_page(["5秒前"], text=text), "https://s.weibo.com/realtime?q=x")
+    assert cards == [{
+        "username": "用户0",
+        "text": text + "\n第二行",
+        "url": "https://weibo.com/1000/N0?refer_flag=1001030103_",
+        "time": "5秒前",
+    }]
+
+
+def test_parse_page_reads_the_next_page_link(realtime_page):
+    cards, next_page = parse_page(realtime_page(["5秒前"], next_page="/realtime?q=x&page=2"),
+                                  "https://s.weibo.com/realtime?q=x")
+    assert len(cards) == 1
+    assert next_page == "https://s.weibo.com/realtime?q=x&page=2"
+    assert parse_page(realtime_page(["5秒前"]), "https://s.weibo.com/realtime?q=x")[1] is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_cards_filters(stub_weibo):
+    cards = await fetch_cards("比特币", stub_weibo, 10, 30 * 60)
+    assert [card["time"] for card in cards] == ["5秒前", "3分钟前"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_cards_login_wall(stub_weibo):
+    with pytest.raises(LoginWallError):
+        await fetch_cards("blocked", stub_weibo, 10, 30 * 60)
+
+
+@pytest.mark.asyncio
+async def test_fetch_cards_error_statuses(stub_weibo):
+    with pytest.raises(ThrottledError, match="429"):
+        await fetch_cards("限流", stub_weibo, 10, 30 * 60)
+    with pytest.raises(ClientResponseError):  # not a page without results
+        await fetch_cards("故障", stub_weibo, 10, 30 * 60)
+
+
+@pytest.mark.asyncio
+async def test_query_http_engine(stub_weibo):
+    received = []
+    parameters = {
+        "engine": "http",
+        "search_url": stub_weibo,
+        "max_oldness_seconds": 3000,
+        "min_post_length": 10,
+        "keywords": ["比特币"],
+        "url": "https://weibo.com/login.php",
+        "seen_cache_path": None,
+        "keyword_stats_path": None,
+        "metrics_callback": received.append,
+        "metrics_aggregate": False,
+    }
+    items = [item async for item in query(parameters)]
+    assert len(items) == 3  # 5秒前, 3分钟前 and 45分钟前 are within 3000 seconds
+    for item in items:
+        assert isinstance(item, Item)
+        assert item["url"].startswith("http://weibo.com/")  # protocol relative links follow the stub scheme
+
+    counters = received[0].as_dict()["counters"]
+    assert counters["cards_seen"] == 4
+    assert counters["items_yielded"] == 3
+    assert received[0].as_dict()["rejected"] == {"too_old": 1}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_keep_their_own_limits(stub_weibo, tmp_path):
+    def parameters(name, maximum_items):
+        return {
+            "engine": "http",
+            "search_url": stub_weibo,
+            "max_oldness_seconds": 3000,
+            "min_post_length": 10,
+            "maximum_items_to_collect": maximum_items,
+            "keywords": ["比特币"],
+            "url": "https://weibo.com/login.php",
+            "seen_cache_path": str(tmp_path / f"{name}.sqlite"),
+            "keyword_stats_path": None,
+            "metrics_aggregate": False,
+        }
+
+    async def collect(parameters):
+        return [item async for item in query(parameters)]
+
+    one, three = await asyncio.gather(collect(parameters("one", 1)), collect(parameters("three", 3)))
+    assert len(one) == 1
+    assert len(three) == 3
+
+
+@pytest.mark.asyncio
+async def test_login_wall_visits_are_left_to_the_chrome_engine(stub_weibo, browser, parameters):
+    from wei223be19ab11e891bo import get_keyword_scheduler
+
+    parameters = dict(parameters, engine="http", search_url=stub_weibo, keywords=["blocked"])
+    items = [item async for item in query(parameters)]
+    assert len(items) == 15  # the three result pages of the fake browser
+    assert get_keyword_scheduler(None).stats["blocked"]["visits"] == 1  # the Chrome visit only
+
+
+@pytest.mark.asyncio
+async def test_throttled_http_engine_falls_back_to_chrome(stub_weibo, browser, parameters):
+    received = []
+    parameters = dict(parameters, engine="http", search_url=stub_weibo, keywords=["限流"],
+                      metrics_callback=received.append)
+    items = [item async for item in query(parameters)]
+    assert len(items) == 15  # the three result pages of the fake browser
+    assert received[0].as_dict()["counters"].get("cards_seen", 0) == 15  # nothing counted for the throttled page
+
+
+@pytest.mark.asyncio
+async def test_query_http_engine_follows_max_pages(stub_weibo, tmp_path):
+    parameters = {
+        "engine": "http",
+        "search_url": stub_weibo,
+        "max_oldness_seconds": 3000,
+        "min_post_length": 10,
+        "keywords": ["翻页"],
+        "max_pages": 2,
+        "url": "https://weibo.com/login.php",
+        "seen_cache_path": str(tmp_path / "seen.sqlite"),
+        "keyword_stats_path": None,
+        "metrics_aggregate": False,
+    }
+    items = [item async for item in query(parameters)]
+    assert len({item["url"] for item in items}) == 4
+    assert asyncio.get_running_loop() not in CLIENT_SESSIONS  # closed at the end of the run
@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+# measured: about 30 ms and 2 MB (it was about 350 ms with Selenium and aiohttp loaded eagerly). The budget leaves room for slower CI machines.
+IMPORT_SECONDS_BUDGET = 0.5
+IMPORT_MEGABYTES_BUDGET = 8
+
+SCRIPT = """
+import json, logging, sys, time, tracemalloc
+import asyncio, exorde_data  # loaded by every exorde module anyway, not part of our budget
+levels = {name: logging.getLogger(name).level for name in ("selenium.webdriver.remote.remote_connection", "urllib3")}
+if sys.argv[1] == "memory":
+    tracemalloc.start()
+started = time.perf_counter()
+import wei223be19ab11e891bo
+seconds = time.perf_counter() - started
+print(json.dumps({
+    "seconds": seconds,
+    "megabytes": tracemalloc.get_traced_memory()[1] / 2 ** 20,
+    "heavy": sorted(name for name in ("selenium", "aiohttp", "dotenv") if name in sys.modules),
+    "levels_changed": levels != {name: logging.getLogger(name).level for name in levels},
+}))
+"""
+
+
+def import_measures(mode):
+    """
+    Import the module in a fresh interpreter
+    :param mode: "time", or "memory" to trace the allocations (which slows the import down)
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + sys.path))
+    completed = subprocess.run([sys.executable, "-c", SCRIPT, mode], capture_output=True, text=True, cwd=root,
+                               env=environment, check=True)
+    lines = completed.stdout.strip().splitlines()
+    assert len(lines) == 1, f"importing the module printed: {lines[:-1]}"
+    return json.loads(lines[0])
+
+
+def test_import_is_silent_and_lazy():
+    measures = import_measures("time")
+    assert measures["heavy"] == []
+    assert not measures["levels_changed"]
+
+
+def test_import_budget():
+    assert import_measures("time")["seconds"] < IMPORT_SECONDS_BUDGET
+    assert import_measures("memory")["megabytes"] < IMPORT_MEGABYTES_BUDGET
@@ -0,0 +1,51 @@
+from wei223be19ab11e891bo.keywords import KeywordScheduler, dedupe
+import os
+
+
+def test_dedupe_keeps_order():
+    assert dedupe(["DeFi", "加密", "DeFi", " ", "市场", "加密"]) == ["DeFi", "加密", "市场"]
+
+
+def test_pick_returns_distinct_keywords():
+    scheduler = KeywordScheduler()
+    picked = scheduler.pick(["DeFi", "DeFi", "加密", "市场"], 3)
+    assert sorted(picked) == sorted(["DeFi", "加密", "市场"])
+
+
+def test_pick_tries_unknown_keywords_first():
+    scheduler = KeywordScheduler()
+    scheduler.record("比特币", fresh=10, rejected=0, seconds=60)
+    assert scheduler.pick(["比特币", "以太坊"], 1) == ["以太坊"]
+
+
+def test_pick_exploits_the_best_yield():
+    scheduler = KeywordScheduler(exploration=0)
+    for _ in range(5):
+        scheduler.record("比特币", fresh=10, rejected=0, seconds=60)
+        scheduler.record("以太坊", fresh=1, rejected=9, seconds=60)
+    assert scheduler.pick(["以太坊", "比特币"], 1) == ["比特币"]
+    assert scheduler.rejection_rate("以太坊") == 0.9
+
+
+def test_statistics_survive_a_restart(tmp_path):
+    path = str(tmp_path / "keyword_stats.json")
+    scheduler = KeywordScheduler(path)
+    scheduler.record("比特币", fresh=3, rejected=1, seconds=30)
+    scheduler.save()
+    assert KeywordScheduler(path).rate("比特币") == 6
+
+
+def test_shard_statistics_are_exported_and_merged_back(tmp_path):
+    path = str(tmp_path / "shard0.json")
+    scheduler = KeywordScheduler()
+    scheduler.record("比特币", fresh=3, rejected=1, seconds=30)
+    scheduler.record("以太坊", fresh=1, rejected=0, seconds=30)
+    scheduler.export(path, ["比特币", "狗狗币"])
+    shard = KeywordScheduler(path)
+    assert list(shard.stats) == ["比特币"]
+    shard.record("狗狗币", fresh=2, rejected=0, seconds=60)
+    shard.save()
+    assert scheduler.merge(path) == 2
+    assert scheduler.rate("狗狗币") == 2
+    assert scheduler.rate("以太坊") is not None
+    assert not os.path.exists(path)
@@ -0,0 +1,43 @@
+from wei223be19ab11e891bo.metrics import QueryMetrics, publish_metrics
+
+
+def test_metrics():
+    metrics = QueryMetrics()
+    with metrics.phase("scroll"):
+        pass
+    with metrics.phase("scroll"):
+        pass
+    metrics.count("cards_seen", 10)
+    metrics.count("webdriver_calls")
+    metrics.reject("too_old", 3)
+    snapshot = metrics.as_dict()
+    assert snapshot["phases"]["scroll"][0] == 2
+    assert snapshot["counters"] == {"cards_seen": 10, "webdriver_calls": 1}
+    assert snapshot["rejected"] == {"too_old": 3}
+
+
+def test_merge_and_prometheus():
+    total = QueryMetrics()
+    for _ in range(2):
+        metrics = QueryMetrics()
+        metrics.queries = 1
+        metrics.add_time("extraction", 0.5)
+        metrics.count("items_yielded", 2)
+        metrics.reject("too_short")
+        total.merge(metrics)
+    text = total.to_prometheus()
+    assert "weibo_queries_total 2\n" in text
+    assert 'weibo_phase_seconds_total{phase="extraction"} 1.000000\n' in text
+    assert 'weibo_phase_runs_total{phase="extraction"} 2\n' in text
+    assert "weibo_items_yielded_total 4\n" in text
+    assert 'weibo_cards_rejected_total{reason="too_short"} 2\n' in text
+
+
+def test_publish_metrics(tmp_path):
+    received = []
+    metrics = QueryMetrics()
+    metrics.count("items_yielded", 3)
+    path = tmp_path / "weibo.prom"
+    publish_metrics(metrics, received.append, str(path), aggregate=False)
+    assert received == [metrics]
+    assert "weibo_items_yielded_total 3\n" in path.read_text()
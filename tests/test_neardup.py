@@ -0,0 +1,58 @@
+from wei223be19ab11e891bo import process_and_send
+from wei223be19ab11e891bo.metrics import QueryMetrics
+from wei223be19ab11e891bo.neardup import NearDuplicateIndex, band_rows, signature, similarity
+import pytest
+
+POST = ("【#美联储宣布维持利率不变#】北京时间周四凌晨，美联储宣布将联邦基金利率目标区间维持在5.25%至5.5%之间，"
+        "符合市场预期。声明称，近几个月通胀有所缓解但仍处于高位。")
+REPOST = POST.replace("周四", "周三") + "转发抽奖"
+OTHER = "今天的晚霞太好看了吧！随手一拍都是壁纸，我的镜头里的夏天，你们那边的天空是什么样的呢"
+
+
+def test_similarity_estimates():
+    assert similarity(signature(POST), signature(POST)) == 1.0
+    assert similarity(signature(POST), signature(REPOST)) > 0.7
+    assert similarity(signature(POST), signature(OTHER)) < 0.3
+
+
+def test_band_rows_follow_the_threshold():
+    assert band_rows(0.9) == 8
+    assert band_rows(0.7) == 4
+    assert band_rows(0.3) == 2
+
+
+def test_reposts_join_the_cluster_of_the_first_post():
+    index = NearDuplicateIndex()
+    assert index.check(POST, "https://weibo.com/1/a") is None
+    assert index.check(OTHER, "https://weibo.com/2/b") is None
+    assert index.check(REPOST, "https://weibo.com/3/c") == "https://weibo.com/1/a"
+    assert index.check(REPOST + "！", "https://weibo.com/4/d") == "https://weibo.com/1/a"
+    assert index.check(POST, "https://weibo.com/1/a") is None  # the same post, met again
+
+
+def test_entries_expire(clock):
+    index = NearDuplicateIndex(window_seconds=60, max_entries=2, clock=clock)
+    index.check(POST, "https://weibo.com/1/a")
+    clock.now = 61
+    assert index.check(REPOST, "https://weibo.com/3/c") is None
+    index.check("第三条", "https://weibo.com/5/e")
+    index.check("第四条", "https://weibo.com/6/f")
+    assert len(index) == 2
+    assert all(len(buckets) <= 2 for buckets in index.buckets)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode, expected", [("drop", 2), ("count", 3)])
+async def test_process_and_send_modes(mode, expected):
+    cards = [{"url": f"https://weibo.com/{i}/post", "username": "a", "time": "5秒前", "text": text}
+             for i, text in enumerate([POST, REPOST, OTHER])]
+    metrics = QueryMetrics()
+    items = [item async for item in process_and_send(cards, 0, None, 600, 10, None, metrics, None,
+                                                     NearDuplicateIndex(), mode)]
+    assert len(items) == expected
+    if mode == "drop":
+        assert metrics.rejected == {"near_duplicate": 1}
+    else:
+        assert metrics.counters["near_duplicates"] == 1
+        assert metrics.as_dict()["clusters"] == {"https://weibo.com/1/post": "https://weibo.com/0/post"}
+    assert all(item.get("external_parent_id") is None for item in items)
@@ -0,0 +1,34 @@
+from wei223be19ab11e891bo.normalize import DEFAULT_NORMALIZER, TextNormalizer, get_normalizer
+import pytest
+
+RAW = " #比特币#今天又涨了\u200b[哈哈][doge]  大家怎么看？\n\n \n 第二行\ufeff 展开全文c"
+
+
+def test_normalize():
+    assert DEFAULT_NORMALIZER.normalize(RAW) == "比特币 今天又涨了 大家怎么看？\n第二行"
+
+
+def test_normalize_options():
+    normalizer = TextNormalizer(strip_emoji_placeholders=False, strip_ui_text=False, keep_newlines=False)
+    assert normalizer.normalize(RAW) == "比特币 今天又涨了[哈哈][doge] 大家怎么看？ 第二行 展开全文c"
+
+
+def test_normalize_steps():
+    normalizer = TextNormalizer(steps=[str.upper])
+    assert normalizer.normalize("  [doge] ok  ") == "OK"
+    assert normalizer.normalize_batch(["a", "b"]) == ["A", "B"]
+
+
+@pytest.mark.parametrize("texts", [
+    [RAW, "", None, "收起全文d\n短", "  \n  "],
+    ["含有\x00分隔符的内容", RAW],
+    [RAW],
+])
+def test_normalize_batch_matches_normalize(texts):
+    assert DEFAULT_NORMALIZER.normalize_batch(texts) == [DEFAULT_NORMALIZER.normalize(text) for text in texts]
+
+
+def test_get_normalizer():
+    assert get_normalizer(None) is DEFAULT_NORMALIZER
+    assert get_normalizer(DEFAULT_NORMALIZER) is DEFAULT_NORMALIZER
+    assert not get_normalizer({"keep_newlines": False}).keep_newlines
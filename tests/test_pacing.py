@@ -0,0 +1,55 @@
+from wei223be19ab11e891bo import pacing
+from wei223be19ab11e891bo.pacing import RateController, RateControllers
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(pacing, "JITTER", 0)
+
+
+def test_bucket_spaces_the_actions(clock):
+    controller = RateController(rate=5, clock=clock)
+    assert controller.reserve(1) == 0  # the burst credit
+    assert controller.reserve(1) == pytest.approx(0.2)
+    assert controller.reserve(10) == pytest.approx(2.2)  # queued behind the previous action
+    clock.now += 60
+    assert controller.reserve(2) == pytest.approx(0.2)  # an idle bucket only keeps BURST_TOKENS
+
+
+def test_rate_rises_additively_and_falls_multiplicatively(clock):
+    controller = RateController(rate=5, min_rate=1, max_rate=6, target_latency_seconds=3, clock=clock)
+    controller.loaded(0.5)
+    assert controller.rate == 5.5
+    controller.loaded(0.5)
+    controller.loaded(0.5)
+    assert controller.rate == 6  # capped
+    controller.throttled("no nav bar")
+    assert controller.rate == 3
+    controller.throttled("no nav bar")  # the other drivers hitting the same wall
+    assert controller.rate == 3
+    clock.now += pacing.DECREASE_COOLDOWN_SECONDS
+    controller.loaded(10)
+    assert controller.rate == pytest.approx(2.4)
+    assert controller.summary()["decreases"] == 2
+
+
+def test_configure_clamps_the_rate():
+    controller = RateController(rate=5)
+    controller.configure(min_rate=10, max_rate=1)
+    assert controller.rate == 10
+    controller.configure(min_rate=0.5, max_rate=2)
+    assert controller.rate == 2
+
+
+def test_each_proxy_has_its_own_pace():
+    controllers = RateControllers(rate=5)
+    controllers.get("http://a:8080").throttled("login page")
+    assert controllers.get("http://a:8080").rate == 2.5
+    assert controllers.get("http://b:8080").rate == 5  # not slowed down by the wall of another address
+    assert controllers.get(None) is controllers.get(None)
+    assert controllers.rate == 2.5
+    controllers.configure(min_rate=4)
+    assert controllers.get("http://a:8080").rate == 4
+    assert controllers.get("http://c:8080").rate == 5
+    assert controllers.get("http://c:8080").min_rate == 4
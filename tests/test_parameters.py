@@ -0,0 +1,27 @@
+import wei223be19ab11e891bo
+from wei223be19ab11e891bo import DEFAULT_MAXIMUM_ITEMS, WeiboCollector, read_parameters
+import pytest
+
+
+@pytest.mark.parametrize("parameters, expected", [
+    ({"maximum_items_to_collect": 5}, 5),
+    ({"MAXIMUM_ITEMS_TO_COLLECT": 7}, 7),
+    ({"min_post_length": 10}, DEFAULT_MAXIMUM_ITEMS),
+])
+def test_maximum_items_to_collect(parameters, expected):
+    assert read_parameters(parameters)[1] == expected
+
+
+def test_collectors_do_not_share_their_limits():
+    first = WeiboCollector({"maximum_items_to_collect": 5, "max_consecutive_old_posts": 2, "seen_cache_path": None,
+                            "keyword_stats_path": None})
+    second = WeiboCollector({"maximum_items_to_collect": 9, "max_oldness_seconds": 60, "seen_cache_path": None,
+                             "keyword_stats_path": None})
+    assert (first.maximum_items, first.max_consecutive_old_posts) == (5, 2)
+    assert (second.maximum_items, second.max_oldness_seconds) == (9, 60)
+    assert not hasattr(wei223be19ab11e891bo, "MAXIMUM_ITEMS_TO_COLLECT")
+
+
+def test_collector_rejects_other_sites():
+    with pytest.raises(ValueError):
+        WeiboCollector({"url": "https://example.com", "seen_cache_path": None, "keyword_stats_path": None})
@@ -0,0 +1,50 @@
+from wei223be19ab11e891bo.keywords import KeywordScheduler
+from wei223be19ab11e891bo.planner import CollectionPlanner
+
+
+def test_keeps_visiting_until_the_target(clock):
+    planner = CollectionPlanner(KeywordScheduler(), ["比特币", "以太坊", "狗狗币"], 10, 120, clock)
+    visited = []
+    collected = 0
+    while True:
+        keyword = planner.next_keyword(collected)
+        if keyword is None:
+            break
+        visited.append(keyword)
+        clock.now += 10
+        collected += 4
+        planner.record(keyword, 4, 10)
+    assert len(visited) == 3  # a single keyword is not enough anymore
+    report = planner.report()
+    assert report["stop_reason"] == "target_reached"
+    assert report["keywords_visited"] == 3
+    assert report["elapsed_seconds"] == 30
+    assert report["budget_used"] == 0.25
+
+
+def test_stops_on_the_deadline(clock):
+    planner = CollectionPlanner(KeywordScheduler(), ["比特币", "以太坊"], 100, 60, clock)
+    planner.record(planner.next_keyword(0), 1, 61)
+    clock.now += 61
+    assert planner.next_keyword(1) is None
+    assert planner.report()["stop_reason"] == "deadline"
+
+
+def test_skips_keywords_that_do_not_fit_in_the_time_left(clock):
+    scheduler = KeywordScheduler(exploration=0)
+    scheduler.record("慢", fresh=100, rejected=0, seconds=50)  # the best yield per minute
+    scheduler.record("快", fresh=5, rejected=0, seconds=5)
+    planner = CollectionPlanner(scheduler, ["慢", "快"], 100, 30, clock)
+    assert planner.next_keyword(0) == "快"
+    planner.record("快", 5, 5)
+    assert planner.next_keyword(5) is None
+    assert planner.report()["stop_reason"] == "no_fitting_keyword"
+
+
+def test_low_yield_keywords_come_last(clock):
+    scheduler = KeywordScheduler(exploration=0)
+    scheduler.record("冷门", fresh=0.2, rejected=10, seconds=1)  # fast, so the best yield per minute
+    scheduler.record("热门", fresh=1, rejected=0, seconds=10)
+    planner = CollectionPlanner(scheduler, ["冷门", "热门"], 100, 60, clock)
+    assert planner.next_keyword(0) == "热门"
+    assert planner.next_keyword(0) == "冷门"
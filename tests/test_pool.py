@@ -0,0 +1,46 @@
+from wei223be19ab11e891bo.pool import DriverPool
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_released_session_is_reused(fake_browser):
+    pool = DriverPool(fake_browser)
+    session = await pool.acquire()
+    await pool.release(session)
+    assert await pool.acquire() is session
+    assert len(fake_browser.drivers) == 1
+    assert session.uses == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_session_is_quit_and_replaced(fake_browser):
+    pool = DriverPool(fake_browser, max_uses=2)
+    session = await pool.acquire()
+    await pool.release(session)
+    assert await pool.acquire() is session
+    await pool.release(session)  # its second run
+    assert pool.idle == []
+    assert fake_browser.drivers[0].quit_calls == 1
+    assert await pool.acquire() is not session
+    assert len(fake_browser.drivers) == 2
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_session_is_quit_and_replaced(fake_browser):
+    pool = DriverPool(fake_browser)
+    session = await pool.acquire()
+    await pool.release(session)
+    fake_browser.drivers[0].healthy = False  # chromedriver died while the session was parked
+    replacement = await pool.acquire()
+    assert replacement is not session
+    assert fake_browser.drivers[0].quit_calls == 1
+    assert replacement.driver is fake_browser.drivers[1]
+
+
+@pytest.mark.asyncio
+async def test_untrusted_session_is_not_kept(fake_browser):
+    pool = DriverPool(fake_browser)
+    session = await pool.acquire()
+    await pool.release(session, reusable=False)
+    assert pool.idle == []
+    assert fake_browser.drivers[0].quit_calls == 1
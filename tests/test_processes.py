@@ -0,0 +1,75 @@
+from wei223be19ab11e891bo.pool import DriverPool
+from wei223be19ab11e891bo.processes import kill_tree, process_tree, tree_rss_bytes
+from wei223be19ab11e891bo.session import DriverSession
+import os
+import subprocess
+import time
+import pytest
+
+linux_only = pytest.mark.skipif(not os.path.isdir("/proc"), reason="reads /proc")
+
+
+class FakeService:
+    def __init__(self, process):
+        self.process = process
+
+
+class FakeDriver:
+    """
+    A browser with tabs, whose processes are a shell and its sleeping children
+    """
+
+    def __init__(self, handles):
+        self.window_handles = list(handles)
+        self.current_window_handle = self.window_handles[-1]
+        self.switch_to = self
+        self.service = FakeService(subprocess.Popen(["sh", "-c", "sleep 60 & sleep 60 & wait"]))
+        self.quit_calls = 0
+
+    def window(self, handle):
+        self.current_window_handle = handle
+
+    def close(self):
+        self.window_handles.remove(self.current_window_handle)
+
+    def quit(self):
+        self.quit_calls += 1  # a browser that does not answer: its processes stay
+
+
+def wait_for_children(pid, count):
+    for _ in range(100):
+        tree = process_tree(pid)
+        if len(tree) >= count:
+            return tree
+        time.sleep(0.02)
+    return process_tree(pid)
+
+
+@linux_only
+def test_tree_memory_and_cleanup():
+    process = subprocess.Popen(["sh", "-c", "sleep 60 & sleep 60 & wait"])
+    tree = wait_for_children(process.pid, 3)
+    assert len(tree) == 3
+    assert tree_rss_bytes(tree) > 0
+    assert kill_tree(tree) == 3
+    process.wait(timeout=5)
+    assert process_tree(process.pid) == {}
+
+
+@linux_only
+@pytest.mark.asyncio
+async def test_maintain_closes_stale_tabs_and_recycles_heavy_drivers():
+    session = DriverSession(FakeDriver(["first", "second", "third"]))
+    wait_for_children(session.driver.service.process.pid, 3)
+    pool = DriverPool(lambda: None, max_rss_mb=100000)
+    assert await pool.maintain(session)
+    assert session.driver.window_handles == ["third"]
+    assert session.driver.current_window_handle == "third"
+    assert session.metrics.counters["stale_tabs_closed"] == 2
+    pool.configure(max_rss_mb=0.001)
+    assert not await pool.maintain(session)
+    tree = session.process_tree()
+    await pool.release(session)
+    assert pool.idle == []
+    assert session.driver.quit_calls == 1
+    assert all(process_tree(pid) == {} for pid in tree)  # what survived quit() was killed
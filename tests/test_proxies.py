@@ -0,0 +1,39 @@
+from wei223be19ab11e891bo.proxies import BASE_QUARANTINE_SECONDS, ProxyPool, parse_proxies
+
+
+def test_parse_proxies():
+    assert parse_proxies("http://a:1, http://b:2\nhttp://c:3") == ["http://a:1", "http://b:2", "http://c:3"]
+    assert parse_proxies(None) == []
+
+
+def test_fastest_healthy_proxy_is_chosen(clock):
+    pool = ProxyPool(["http://slow:1", "http://fast:1"], clock=clock)
+    pool.report("http://slow:1", 8.0)
+    assert pool.choose() == "http://fast:1"  # never measured, tried first
+    pool.report("http://fast:1", 1.0)
+    assert {pool.choose() for _ in range(20)} == {"http://fast:1"}
+
+
+def test_failing_proxy_is_quarantined_with_backoff(clock):
+    pool = ProxyPool(["http://a:1", "http://b:1"], clock=clock)
+    pool.report("http://a:1", 0.5)
+    pool.report("http://b:1", 2.0)
+    pool.report("http://a:1", success=False)
+    assert pool.choose() == "http://b:1"
+    clock.now += BASE_QUARANTINE_SECONDS
+    assert not pool.is_quarantined("http://a:1")
+    pool.report("http://a:1", success=False)  # still failing once on probation, twice as long
+    clock.now += BASE_QUARANTINE_SECONDS
+    assert pool.is_quarantined("http://a:1")
+    clock.now += BASE_QUARANTINE_SECONDS
+    pool.report("http://a:1", 0.5)
+    assert pool.proxies["http://a:1"].consecutive_failures == 0
+
+
+def test_all_quarantined_falls_back_on_the_first_to_recover(clock):
+    pool = ProxyPool(["http://a:1", "http://b:1"], clock=clock)
+    pool.report("http://a:1", success=False)
+    pool.report("http://a:1", success=False)
+    pool.report("http://b:1", success=False)
+    assert pool.choose() == "http://b:1"
+    assert ProxyPool().choose() is None
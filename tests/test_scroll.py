@@ -0,0 +1,49 @@
+from wei223be19ab11e891bo import STABLE_SCROLL_STEPS, scroll_collect, scroll_stream
+from wei223be19ab11e891bo.session import DriverSession
+import pytest
+
+
+def session_on_results(browser, **options):
+    browser.options.update(options)
+    session = DriverSession(browser())
+    session.driver.get("https://s.weibo.com/realtime?q=比特币")
+    return session
+
+
+async def stream(session, max_pages, incremental=True):
+    batches = [batch async for batch in scroll_stream(session, 10, 3000, max_pages, incremental=incremental)]
+    return [card for batch in batches for card in batch]
+
+
+@pytest.mark.asyncio
+async def test_scroll_stream_stops_once_the_page_is_stable(browser):
+    session = session_on_results(browser, cards=12, cards_per_scroll=4, pages=1)
+    assert len(await stream(session, 1)) == 12
+    # the cards already there, two steps loading new ones, then STABLE_SCROLL_STEPS steps without any
+    assert session.driver.extractions == 3 + STABLE_SCROLL_STEPS
+    assert session.driver.scrolls == 2 + STABLE_SCROLL_STEPS
+
+
+@pytest.mark.asyncio
+async def test_scroll_collect_stops_once_the_page_is_stable(browser):
+    session = session_on_results(browser, cards=12, cards_per_scroll=4, pages=1)
+    assert len(await scroll_collect(session, 10, 3000, 1)) == 12
+    assert session.driver.scrolls == 2 + STABLE_SCROLL_STEPS
+    assert session.driver.extractions == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("incremental", [True, False])
+async def test_pagination_stops_at_max_pages(browser, incremental):
+    session = session_on_results(browser, cards=5, pages=5)
+    cards = await stream(session, 2, incremental)
+    assert len({card["url"] for card in cards}) == 10
+    assert [url for _, url in session.driver.loads] == ["https://s.weibo.com/realtime?q=比特币",
+                                                        "https://s.weibo.com/realtime?q=比特币&page=2"]
+
+
+@pytest.mark.asyncio
+async def test_pagination_stops_on_the_last_page(browser):
+    session = session_on_results(browser, cards=5, pages=2)
+    assert len(await stream(session, 3)) == 10
+    assert len(session.driver.loads) == 2
@@ -0,0 +1,31 @@
+from wei223be19ab11e891bo.seen import SeenCache, post_key
+
+
+def test_post_key_ignores_scheme_and_tracking():
+    assert post_key("https://weibo.com/1234567/N0abcdEFg?refer_flag=1001030103_") == "1234567/N0abcdEFg"
+    assert post_key("http://weibo.com/1234567/N0abcdEFg") == "1234567/N0abcdEFg"
+
+
+def test_entries_expire():
+    cache = SeenCache()
+    cache.add("1/a", ttl=60)
+    cache.add("1/b", ttl=-1)
+    assert "1/a" in cache
+    assert "1/b" not in cache
+    assert "1/c" not in cache
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "seen.sqlite")
+    cache = SeenCache(path)
+    cache.add("1/a", ttl=60)
+    cache.close()
+    assert "1/a" in SeenCache(path)
+
+
+def test_size_is_bounded():
+    cache = SeenCache(max_entries=10)
+    for i in range(25):
+        cache.add(f"1/{i}", ttl=60 + i)
+    assert len(cache.entries) == 10
+    assert "1/24" in cache and "1/0" not in cache
@@ -0,0 +1,58 @@
+from wei223be19ab11e891bo import sharded_query
+from wei223be19ab11e891bo.sharded import split_keywords, worker_parameters
+import json
+import pytest
+
+
+def test_split_keywords():
+    assert split_keywords(["a", "b", "c", "d", "e"], 2) == [["a", "c", "e"], ["b", "d"]]
+    assert split_keywords(["a"], 4) == [["a"]]
+
+
+def test_worker_parameters():
+    parameters = worker_parameters({"keywords": ["a", "b"], "metrics_callback": print, "metrics_path": "run.prom",
+                                    "keyword_stats_path": "stats.json"}, ["b"], 1)
+    assert parameters == {"keywords": ["b"], "metrics_path": None, "metrics_aggregate": False,
+                          "keyword_stats_path": "stats.json.shard1"}
+
+
+@pytest.mark.asyncio
+async def test_sharded_query_deduplicates_across_workers(stub_weibo, tmp_path):
+    received = []
+    parameters = {
+        "engine": "http",
+        "search_url": stub_weibo,
+        "max_oldness_seconds": 3000,
+        "min_post_length": 10,
+        "keywords": ["比特币", "以太坊"],  # the stub returns the same posts for every keyword
+        "url": "https://weibo.com/login.php",
+        "seen_cache_path": str(tmp_path / "seen.sqlite"),
+        "keyword_stats_path": None,
+        "metrics_aggregate": False,
+        "metrics_callback": received.append,
+        "shards": 2,
+    }
+    items = [item async for item in sharded_query(parameters)]
+    assert len(items) == 3
+    assert len({item["url"] for item in items}) == 3
+    assert received[0].counters["items_yielded"] == 3
+
+
+@pytest.mark.asyncio
+async def test_sharded_query_merges_the_keyword_statistics(stub_weibo, tmp_path):
+    path = tmp_path / "keyword_stats.json"
+    parameters = {
+        "engine": "http",
+        "search_url": stub_weibo,
+        "max_oldness_seconds": 3000,
+        "min_post_length": 10,
+        "keywords": ["比特币", "以太坊"],
+        "url": "https://weibo.com/login.php",
+        "seen_cache_path": str(tmp_path / "seen.sqlite"),
+        "keyword_stats_path": str(path),
+        "metrics_aggregate": False,
+        "shards": 2,
+    }
+    _ = [item async for item in sharded_query(parameters)]
+    assert sorted(json.loads(path.read_text(encoding="utf-8"))) == sorted(["比特币", "以太坊"])
+    assert list(tmp_path.glob("keyword_stats.json.shard*")) == []
@@ -0,0 +1,62 @@
+import wei223be19ab11e891bo as weibo
+from wei223be19ab11e891bo.metrics import QueryMetrics
+import pytest
+
+NO_REJECTION = {"no_url": 0, "no_time": 0, "too_old": 0, "too_short": 0}
+
+
+def card(i, time="5秒前"):
+    return {"username": f"用户{i}", "text": "内容" * 20, "url": f"https://weibo.com/{i}?refer_flag=1", "time": time}
+
+
+class FakeSession:
+    """
+    Answers the incremental extraction calls with the given deltas, one per call
+    """
+
+    def __init__(self, deltas):
+        self.deltas = list(deltas)
+        self.calls = []
+        self.metrics = QueryMetrics()
+        self.last_navigation_at = None
+
+    async def execute_script(self, script, *args):
+        self.calls.append(args)
+        cards, rejected = self.deltas.pop(0)
+        count = len(self.calls) * 10  # the page keeps growing
+        return {"cards": cards, "rejected": dict(NO_REJECTION, **rejected), "next_page": None, "count": count,
+                "bottom": False}
+
+
+@pytest.fixture(autouse=True)
+def no_waits(monkeypatch):
+    async def nothing(*args, **kwargs):
+        return True
+
+    monkeypatch.setattr(weibo, "wait_random", nothing)
+    monkeypatch.setattr(weibo, "wait_for_elements", nothing)
+
+
+@pytest.mark.asyncio
+async def test_cards_are_handed_over_after_every_step():
+    session = FakeSession([([card(1), card(2)], {}), ([card(3)], {}), ([card(4)], {"too_old": 1})])
+    batches = [batch async for batch in weibo.scroll_stream(session, 10, 600, 1)]
+    assert [[c["url"] for c in batch] for batch in batches] == [
+        ["https://weibo.com/1?refer_flag=1", "https://weibo.com/2?refer_flag=1"],
+        ["https://weibo.com/3?refer_flag=1"],
+        ["https://weibo.com/4?refer_flag=1"],
+    ]
+    assert session.calls[0][-2:] == (True, None)  # the cards already there are read before the first scroll
+    assert session.calls[1][-1] is not None
+    assert session.metrics.as_dict()["counters"]["cards_seen"] == 5
+    assert not session.deltas  # stopped on the first post older than the cutoff
+
+
+@pytest.mark.asyncio
+async def test_scrolling_stops_with_the_consumer():
+    session = FakeSession([([card(i)], {}) for i in range(10)])
+    batches = weibo.scroll_stream(session, 10, 600, 1)
+    async for _ in batches:
+        break
+    await batches.aclose()
+    assert len(session.calls) == 1
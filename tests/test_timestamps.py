@@ -0,0 +1,42 @@
+from datetime import datetime
+from wei223be19ab11e891bo.timestamps import SHANGHAI, PageClock, format_created_at
+import pytest
+
+# 2024-01-01 08:30:00 in Shanghai, 2024-01-01 00:30:00 UTC
+NOW = datetime(2024, 1, 1, 8, 30, tzinfo=SHANGHAI).timestamp()
+
+
+def shanghai(*args):
+    return datetime(*args, tzinfo=SHANGHAI).timestamp()
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("刚刚", NOW),
+    ("12秒前", NOW - 12),
+    ("5分钟前", NOW - 300),
+    ("2小时前", NOW - 7200),
+    ("今天 08:05", shanghai(2024, 1, 1, 8, 5)),
+    ("昨天 23:59", shanghai(2023, 12, 31, 23, 59)),
+    ("12月31日 22:10", shanghai(2023, 12, 31, 22, 10)),  # no year, read on January 1st
+    ("1月1日 07:00", shanghai(2024, 1, 1, 7, 0)),
+    ("2022年03月04日 05:06", shanghai(2022, 3, 4, 5, 6)),
+    ("2022-03-04 05:06", shanghai(2022, 3, 4, 5, 6)),
+    (" 5分钟前 转赞人数超过100", NOW - 300),
+])
+def test_parse(text, expected):
+    assert PageClock(NOW).parse(text) == expected
+
+
+@pytest.mark.parametrize("text", [None, "", "来自 iPhone客户端", "2月30日 10:00"])
+def test_parse_unknown(text):
+    assert PageClock(NOW).parse(text) is None
+
+
+def test_cutoff():
+    clock = PageClock(NOW)
+    assert clock.parse("29分钟前") >= clock.cutoff(1800)
+    assert clock.parse("31分钟前") < clock.cutoff(1800)
+
+
+def test_format_created_at():
+    assert format_created_at(NOW - 300) == "2024-01-01T00:25:00.00Z"
@@ -0,0 +1,62 @@
+from wei223be19ab11e891bo import waits
+from wei223be19ab11e891bo.session import DriverSession
+from wei223be19ab11e891bo.waits import wait_for_element, wait_for_elements, wait_until
+from selenium.common.exceptions import StaleElementReferenceException
+import time
+import pytest
+
+
+class ScriptedDriver:
+    """
+    Answers execute_async_script with the next of `answers`: a value, or an exception to raise. Once they are all used,
+    it waits out the time slot it was given, like the in-page observer, and answers None
+    """
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.slices = []  # the timeout (ms) of every call
+
+    def execute_async_script(self, script, xpath, root, timeout_ms, minimum):
+        self.slices.append(timeout_ms)
+        if not self.answers:
+            time.sleep(timeout_ms / 1000)
+            return None
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.mark.asyncio
+async def test_wait_returns_once_the_element_shows_up():
+    driver = ScriptedDriver(None, "nav bar")
+    assert await wait_for_element(DriverSession(driver), "//div[@class='m-main-nav']", 5) == "nav bar"
+    assert len(driver.slices) == 2
+
+
+@pytest.mark.asyncio
+async def test_wait_gives_up_after_the_timeout_in_observer_slices(monkeypatch):
+    monkeypatch.setattr(waits, "OBSERVER_SLICE_SECONDS", 0.05)
+    driver = ScriptedDriver()
+    started = time.monotonic()
+    assert await wait_for_elements(DriverSession(driver), "//div[@class='card']", 0.2) is None
+    assert 0.2 <= time.monotonic() - started < 0.5
+    assert len(driver.slices) >= 4
+    assert all(timeout_ms <= 50 for timeout_ms in driver.slices)
+    assert sum(driver.slices) <= 200  # the last slices only get what is left of the timeout
+
+
+@pytest.mark.asyncio
+async def test_wait_retries_the_expected_exceptions_only():
+    driver = ScriptedDriver(StaleElementReferenceException("navigated"), ["card"])
+    assert await wait_for_elements(DriverSession(driver), "//div[@class='card']", 5) == ["card"]
+    driver = ScriptedDriver(RuntimeError("chrome not reachable"))
+    with pytest.raises(RuntimeError):
+        await wait_for_element(DriverSession(driver), "//input", 5)
+
+
+@pytest.mark.asyncio
+async def test_wait_until_polls_the_condition():
+    answers = [None, [], ["main", "new tab"]]
+    assert await wait_until(DriverSession(), lambda: answers.pop(0), 5, poll_interval=0.01) == ["main", "new tab"]
+    assert await wait_until(DriverSession(), lambda: None, 0.05, poll_interval=0.01) is None
@@ -0,0 +1,75 @@
+from wei223be19ab11e891bo import watch
+from wei223be19ab11e891bo.timestamps import PageClock
+from wei223be19ab11e891bo.watch import KeywordWatch
+import asyncio
+import pytest
+
+
+def test_watermark_lets_only_newer_posts_through():
+    keyword = KeywordWatch("比特币")
+    assert keyword.is_new("a", 1000)
+    keyword.add("a", 1000)
+    assert not keyword.is_new("a", 1000)  # same post, seen already
+    assert keyword.is_new("b", 990)  # same minute as the watermark, told apart by its url
+    assert not keyword.is_new("c", 900)  # older than the watermark
+    assert keyword.is_new("d", 1100)
+    assert keyword.max_oldness_seconds(1800, now=1300) == 360
+
+
+def test_select_compares_with_the_watermark_of_the_previous_refresh():
+    keyword = KeywordWatch("比特币")
+    clock = PageClock(now=10000)
+    cards = [{"url": url, "time": time} for url, time in [("a", "5秒前"), ("b", "3分钟前"), ("c", None)]]
+    assert [card["url"] for card in keyword.select(cards, clock)] == ["a", "b"]
+    assert keyword.watermark == 9995
+    cards.insert(0, {"url": "d", "time": "1秒前"})
+    assert [card["url"] for card in keyword.select(cards, clock)] == ["d"]
+
+
+def test_refresh_interval_follows_the_activity(clock):
+    keyword = KeywordWatch("比特币", min_refresh_seconds=10, max_refresh_seconds=40, clock=clock)
+    assert keyword.refreshed(0) == 15
+    assert keyword.refreshed(0) == 22.5
+    assert keyword.refreshed(0) == 33.75
+    assert keyword.refreshed(0) == 40
+    assert keyword.refreshed(3) == 20
+    assert keyword.refreshed(1) == 10
+    assert 9 <= keyword.due_at <= 11
+
+
+@pytest.mark.asyncio
+async def test_watch_yields_each_post_once(stub_weibo, tmp_path):
+    parameters = {
+        "engine": "http",
+        "search_url": stub_weibo,
+        "max_oldness_seconds": 3000,
+        "min_post_length": 10,
+        "keywords": ["比特币"],
+        "url": "https://weibo.com/login.php",
+        "seen_cache_path": str(tmp_path / "seen.sqlite"),
+        "keyword_stats_path": None,
+        "metrics_aggregate": False,
+        "watch_min_refresh_seconds": 0.05,
+        "watch_max_refresh_seconds": 0.05,
+    }
+    stream = watch(parameters)
+    items = [await stream.__anext__() for _ in range(3)]
+    assert len({item["url"] for item in items}) == 3
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(stream.__anext__(), 0.3)  # later refreshes bring the same posts, nothing new
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_watch_fails_when_no_driver_starts(monkeypatch):
+    import wei223be19ab11e891bo as weibo
+
+    async def broken_acquire(metrics=None):
+        raise RuntimeError("chromedriver is missing")
+
+    monkeypatch.setattr(weibo.DRIVER_POOL, "acquire", broken_acquire)
+    monkeypatch.setattr(weibo, "ACQUIRE_BACKOFF_SECONDS", 0.01)
+    stream = watch({"keywords": ["比特币"], "keyword_stats_path": None, "metrics_aggregate": False,
+                    "seen_cache_path": None})
+    with pytest.raises(RuntimeError, match="chromedriver is missing"):
+        await asyncio.wait_for(stream.__anext__(), 3)
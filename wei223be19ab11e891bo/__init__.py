@@ -26,20 +26,13 @@ So we can loop over those to collect the latest posts. The strategy follows this
 </div>
 
 """
+import asyncio
+import atexit
+import math
 import os
 import random
 import time
-from selenium.webdriver.common.keys import Keys
-from time import sleep
-from datetime import datetime as datett
-from datetime import timedelta, timezone
-import dotenv
 from pathlib import Path
-from datetime import datetime, timedelta
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
 from typing import AsyncGenerator
 import hashlib
 from exorde_data import (
@@ -53,14 +46,28 @@ from exorde_data import (
     ExternalId,
 )
 import logging
-
-loggers = logging.Logger.manager.loggerDict
-
-# Print the names of all the loggers
-for name in loggers:
-    print(name)
-logging.getLogger('urllib3.connectionpool').setLevel(logging.WARNING)
-logging.getLogger('selenium.webdriver.remote.remote_connection').setLevel(logging.WARNING)
+from .browser_profile import DEFAULT_BLOCKED_URLS, DEFAULT_RENDERER_MEMORY_MB, block_urls, lean_arguments
+from .extract import SCROLL_STEP_SCRIPT, extract_cards, extract_new_cards
+from .http_engine import LoginWallError, fetch_results, realtime_url, release_client_session, use_client_session
+from .keywords import dedupe, get_keyword_scheduler
+from .metrics import QueryMetrics, publish_metrics
+from .neardup import DEFAULT_THRESHOLD, DEFAULT_WINDOW_SECONDS, get_near_duplicate_index
+from .normalize import DEFAULT_NORMALIZER, get_normalizer
+from .pacing import (DEFAULT_MAX_RATE, DEFAULT_MIN_RATE, DEFAULT_TARGET_LATENCY_SECONDS, KEYSTROKE_TOKENS, LONG_TOKENS,
+                     MEDIUM_TOKENS, PAGE_LOAD_TOKENS, SHORT_TOKENS, RateControllers)
+from .planner import CollectionPlanner
+from .pool import DriverPool
+from .proxies import ProxyPool, parse_proxies
+from .seen import get_seen_cache, post_key
+from .sharded import DEFAULT_MAX_RESTARTS, ShardedRun, default_shards
+from .timestamps import PageClock, format_created_at
+from .waits import OBSERVER_SLICE_SECONDS, wait_for_element, wait_for_elements, wait_until
+from .watch import (DEFAULT_MAX_REFRESH_SECONDS, DEFAULT_METRICS_INTERVAL_SECONDS, DEFAULT_MIN_REFRESH_SECONDS,
+                    DEFAULT_QUEUE_SIZE, KeywordWatch)
+
+# Selenium, dotenv and aiohttp are only imported once a driver (or an http session) is needed: importing the module stays
+# cheap for the processes that never schedule Sina Weibo. Importing it has no side effect either (no output, no logging
+# configuration).
 
 # GLOBAL VARIABLES
 CURRENT_DIR = Path(__file__).parent.absolute()
@@ -75,33 +82,23 @@ USER_AGENTS = [
     'Mozilla/5.0 (Macintosh; Intel Mac OS X 13_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.1 Safari/605.1.15'
 ]
 
-# global MAX_NUMBER_CONSECUTIVE_OLD_COMMENTS # max number of consecutive old comments to make us break the loop
-# global CONSECUTIVE_OLD_COMMENTS_COUNT # current count of the consecutive old comments we encounter(ed)
-# global MAXIMUM_ITEMS_TO_COLLECT # maximum number of items to collect
-# global YIELDED_ITEMS # how many items we collected so far in the session
-
 SCROLL_SPEED_ACCELERATION = 1.15  # the scroll speed multiplier, very sensitive, modify with care
+MAX_SCROLL_STEPS = 30  # safety net, we normally stop as soon as the page stops growing
+STABLE_SCROLL_STEPS = 2  # steps at the bottom of the page without any new card before we consider it fully loaded
 
-# Wait timers to conduct various actions, modify with care
-SHORT_WAIT_TIME_MIN = 0.1
-SHORT_WAIT_TIME_MAX = 0.3
-MEDIUM_WAIT_TIME_MIN = 0.2
-MEDIUM_WAIT_TIME_MAX = 0.5
-LONG_WAIT_TIME_MIN = 0.5
-LONG_WAIT_TIME_MAX = 2
+# The waits between the actions (and the typing speed) follow the RateController of the proxy, see pacing.py
 
-# Typing params
-TYPE_SLOW_MIN = 0.05
-TYPE_SLOW_MAX = 0.3
+# Deadlines (in seconds) of the page transitions, we move on as soon as the element is there
+SEARCH_BAR_TIMEOUT = 20
+NAV_BAR_TIMEOUT = 10
+CATEGORIES_TIMEOUT = 10
+NEW_TAB_TIMEOUT = 5
+CARDS_TIMEOUT = 10
 
-# Posts aged over this amount of minutes will be skipped
-MAX_POST_AGE_IN_MINUTES = 30 # handled below by parameters, 30min is the default.
+# Drivers that fail to start are retried this many times, waiting ACQUIRE_BACKOFF_SECONDS, then twice as long, etc.
+ACQUIRE_ATTEMPTS = 4
+ACQUIRE_BACKOFF_SECONDS = 2
 
-SECONDS_AGO = "秒前"  # how many seconds since the post was put online
-MINUTES_AGO = "分钟前"  # how many minutes since the post was put online
-
-logger = logging.getLogger('selenium.webdriver.remote.remote_connection')
-logger.setLevel(logging.WARNING)  # or any variant from ERROR, CRITICAL or NOTSET
 
 #############################################################################
 #############################################################################
@@ -110,12 +107,35 @@ logger.setLevel(logging.WARNING)  # or any variant from ERROR, CRITICAL or NOTSE
 #############################################################################
 
 
-def get_proxy(env):
+LOADED_ENVS = set()  # the env files loaded so far, each one is only read once
+PROXY_ENVS = set()  # the env files whose proxies are in PROXY_POOL
+PROXY_POOL = ProxyPool()  # the proxies of the process, shared by every run, see proxies.py
+RATE_CONTROLLERS = RateControllers()  # the pace of the drivers and http fetches of each proxy, see pacing.py
+
+
+def load_env(env):
     """
-    Has not been tested
+    Load the variables of an env file into the environment, once per process
     """
+    if env in LOADED_ENVS:
+        return
+    import dotenv
+
     dotenv.load_dotenv(env, verbose=True)
-    return load_env_variable("HTTP_PROXY", none_allowed=True)
+    LOADED_ENVS.add(env)
+
+
+def get_proxy_pool(env=".weibo_env"):
+    """
+    :return: the ProxyPool of the process, holding the proxies of the HTTP_PROXIES (a list) and HTTP_PROXY variables of
+    the env file
+    """
+    if env not in PROXY_ENVS:
+        load_env(env)
+        PROXY_POOL.add(parse_proxies(load_env_variable("HTTP_PROXIES", none_allowed=True)) +
+                       parse_proxies(load_env_variable("HTTP_PROXY", none_allowed=True)))
+        PROXY_ENVS.add(env)
+    return PROXY_POOL
 
 
 def load_env_variable(key, default_value=None, none_allowed=False):
@@ -140,12 +160,22 @@ def get_chrome_path():
     else:
         return None
 
-def init_driver(headless=True, proxy=None, show_images=False, option=None, env=".weibo_env"):
+def init_driver(headless=True, proxy=None, show_images=False, option=None, env=".weibo_env", lean=True,
+                blocked_urls=None, renderer_memory_mb=DEFAULT_RENDERER_MEMORY_MB):
     """ initiate a chromedriver instance
+        --proxy : the proxy server of the browser, one from the proxy pool of the env file if None (str)
         --option : other option to add (str)
+        --lean : use the lean profile, see browser_profile.py (bool)
+        --blocked_urls : URL patterns blocked by the lean profile, DEFAULT_BLOCKED_URLS if None (list)
+        --renderer_memory_mb : V8 heap limit of the renderer in the lean profile (int)
     """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+    from selenium.webdriver.chrome.service import Service
+
     logging.info("Initializing new driver instance")
-    http_proxy = get_proxy(env)
+    if proxy is None:
+        proxy = get_proxy_pool(env).choose()
 
     binary_path = get_chrome_path()
     logging.info(f"[Sina Weibo Init Driver] Selected Chrome executable path = {binary_path}")
@@ -165,23 +195,25 @@ def init_driver(headless=True, proxy=None, show_images=False, option=None, env="
     options.add_argument("--log-level=3")
     options.add_experimental_option("excludeSwitches", ["enable-logging"])
 
-    # add proxy if available
-    if http_proxy is not None:
-        logging.info("[Sina Weibo Init Driver]\tAdding a HTTP Proxy server to ChromeDriver: %s", http_proxy)
-        options.add_argument('--proxy-server=%s' % http_proxy)
+    # add proxy if available, a single --proxy-server flag
+    if proxy is not None:
+        logging.info("[Sina Weibo Init Driver]\tAdding a HTTP Proxy server to ChromeDriver: %s", proxy)
+        options.add_argument('--proxy-server=%s' % proxy)
     if headless is True:
         logging.info("[Sina Weibo Init Driver]\tScraping on headless mode.")
         options.add_argument('--disable-gpu')
         options.add_argument('--headless')  # Ensure GUI is off. Essential for Docker.
     options.add_argument('log-level=3')
-    if proxy is not None:
-        options.add_argument('--proxy-server=%s' % proxy)
-        logging.info("[Sina Weibo Init Driver]\tusing proxy :  %s", proxy)
     if not show_images:
         prefs = {"profile.managed_default_content_settings.images": 2}
         options.add_experimental_option("prefs", prefs)
     if option is not None:
         options.add_argument(option)
+    if lean is True:
+        logging.info("[Sina Weibo Init Driver]\tUsing the lean profile.")
+        for argument in lean_arguments(renderer_memory_mb):
+            if argument not in options.arguments:
+                options.add_argument(argument)
 
     driver_path = '/usr/local/bin/chromedriver'
     logging.info(f"Opening driver from path = {driver_path}")
@@ -190,163 +222,181 @@ def init_driver(headless=True, proxy=None, show_images=False, option=None, env="
     logging.info("[Sina Weibo Init Driver] Chrome driver initialized =  %s", DRIVER)
 
     DRIVER.set_page_load_timeout(123)
+    DRIVER.set_script_timeout(OBSERVER_SLICE_SECONDS * 2)  # in-page waits (see waits.py) must not hit this timeout
+    if lean is True:
+        block_urls(DRIVER, DEFAULT_BLOCKED_URLS if blocked_urls is None else blocked_urls)
     return DRIVER
 
 
-def type_slow(string, element):
-    for character in str(string):
-        element.send_keys(character)
-        sleep(random.uniform(TYPE_SLOW_MIN, TYPE_SLOW_MAX))
-
+def pacer(session):
+    """
+    :return: the RateController pacing the session, the one of its proxy
+    """
+    return session.pacer or RATE_CONTROLLERS.get(session.proxy)
 
-def wait_random():
-    sleep(random.uniform(MEDIUM_WAIT_TIME_MIN, MEDIUM_WAIT_TIME_MAX))
 
+async def type_slow(string, element, session):
+    for character in str(string):
+        await pacer(session).acquire(KEYSTROKE_TOKENS)
+        await session.run(element.send_keys, character)
 
-def wait_random_long():
-    sleep(random.uniform(LONG_WAIT_TIME_MIN, LONG_WAIT_TIME_MAX))
 
+async def wait_random(session):
+    await pacer(session).acquire(MEDIUM_TOKENS)
 
-def wait_random_short():
-    sleep(random.uniform(SHORT_WAIT_TIME_MIN, SHORT_WAIT_TIME_MAX))
 
+async def wait_random_long(session):
+    await pacer(session).acquire(LONG_TOKENS)
 
-def smooth_scrolling(DRIVER):
-    desired_scroll_height = int(DRIVER.execute_script("return document.body.scrollHeight"))
 
-    for i in range(int(random.uniform(25, desired_scroll_height * 0.10)), desired_scroll_height,
-                   int(desired_scroll_height * 0.20 * SCROLL_SPEED_ACCELERATION)):
-        i += int(random.uniform(-desired_scroll_height * 0.05,
-                                desired_scroll_height * 0.05 * SCROLL_SPEED_ACCELERATION))  # change step size every iteration
-        DRIVER.execute_script("window.scrollTo(0, {});".format(i))
-        wait_random()
+async def wait_random_short(session):
+    await pacer(session).acquire(SHORT_TOKENS)
 
-    if int(DRIVER.execute_script("return document.body.scrollHeight")) >= desired_scroll_height:
-        return
 
-
-def find_element_with_timeout(_element, _timeout, _element_query):
+async def scroll_until_stable(session):
     """
-    Find a single element of the same type within the page with a timeout (in case they cannot be located/loaded)
-    :param _element: the parent element we will be looking into to find what we want
-    :param _timeout: the timeout counter (in seconds)
-    :param _element_query: the element type we are looking for
-    :return: the element we have requested, if it could be found, none otherwise
+    Scroll down step by step until we reach the bottom of the page and no new card shows up anymore
+    :param session: the DriverSession to drive
+    :return: the number of cards on the page
     """
-    while _timeout >= 0:
-        try:
-            return _element.find_element(By.XPATH, _element_query)
-        except:
-            _timeout -= 1
-            time.sleep(1)
-            pass
-    return None
+    count, stable_steps = -1, 0
+    for step in range(MAX_SCROLL_STEPS):
+        share = random.uniform(0.6, 1.0) * SCROLL_SPEED_ACCELERATION  # change step size every iteration
+        new_count, at_bottom = await session.execute_script(SCROLL_STEP_SCRIPT, share)
+        stable_steps = stable_steps + 1 if new_count <= count else 0
+        count = new_count
+        if at_bottom and stable_steps >= STABLE_SCROLL_STEPS:
+            break
+        await wait_random(session)
+    return count
 
 
-def find_elements_with_timeout(_element, _timeout, _elements_query):
+def selenium_keys():
     """
-    Find multiple elements of the same type within the page with a timeout (in case they cannot be located/loaded)
-    :param _element: the parent element we will be looking into to find what we want
-    :param _timeout: the timeout counter (in seconds)
-    :param _elements_query: the element type we are looking for
-    :return: the elements we have requested, if they could be found, none otherwise
+    :return: the Keys of Selenium, imported off the event loop: the first import of selenium.webdriver takes a while
     """
-    while _timeout >= 0:
-        try:
-            return _element.find_elements(By.XPATH, _elements_query)
-        except:
-            _timeout -= 1
-            time.sleep(1)
-            pass
-    return None
+    from selenium.webdriver.common.keys import Keys
 
+    return Keys
 
-def start_search(_url, _query, DRIVER):
+
+async def start_search(_url, _query, session, _pacing_seconds=0):
     """
     Start the inital search on a query. As there is a user path to follow to be able to access the latest tweets without
     being logged in on Sina Weibo, the first search will require accessing different objects, therefore justifying the
     existence of this function.
     :param _url: the url of the landing page from which we will perform our initial search
     :param _query: the query (or keyword) we wish to research
+    :param session: the DriverSession to drive
+    :param _pacing_seconds: minimum time between two page loads of this session, the realtime link click included
     :return: False if the initial search was unsuccessful (elements could not be accessed for example), true otherwise
     """
-    DRIVER.get(_url)
-    logging.info(f"\t Looking at {_url}")
+    Keys = await asyncio.get_running_loop().run_in_executor(None, selenium_keys)
+
+    with session.metrics.phase("landing"):
+        await pacer(session).acquire(PAGE_LOAD_TOKENS)
+        await session.get(_url)
+        logging.info(f"\t Looking at {_url}")
 
-    wait_random_long()
+        await wait_random_long(session)
 
-    search_bar = find_element_with_timeout(DRIVER, 20,
-                                           "//input[@node-type='searchInput']")  # this is NOT the same input bar we will look for after
+        search_bar = await wait_for_element(session, "//input[@node-type='searchInput']",
+                                            SEARCH_BAR_TIMEOUT)  # this is NOT the same input bar we will look for after
 
     if search_bar is None:
         logging.info("Could not encounter the search bar on landing page, exiting...")
+        session.report_load(success=False, reason="no search bar on the landing page")  # blocked, or a login / captcha page
         return False
 
-    wait_random()
-    type_slow(_query, search_bar)
-    search_bar.send_keys(Keys.RETURN)  # hit it!
+    await wait_random(session)
+    with session.metrics.phase("typing"):
+        await type_slow(_query, search_bar, session)
+        await session.run(search_bar.send_keys, Keys.RETURN)  # hit it!
 
-    nav_bar = find_element_with_timeout(DRIVER, 10, "//div[@class='m-main-nav']")
+    with session.metrics.phase("nav_wait"):
+        nav_bar = await wait_for_element(session, "//div[@class='m-main-nav']", NAV_BAR_TIMEOUT)
 
     if nav_bar is None:
         logging.info("Could not encounter the nav bar after entering query, exiting...")
+        session.report_load(success=False, reason="no nav bar after the search")  # blocked, or a login / captcha page
         return False
 
-    categories = find_elements_with_timeout(nav_bar, 10, "//a[@href]")
+    categories = await wait_for_elements(session, "//a[@href]", CATEGORIES_TIMEOUT, root=nav_bar)
 
     if categories is None:
         logging.info("Could not encounter the latest search bar after entering query, exiting...")
         return False
 
     for element in categories:
-        href = element.get_attribute("href")
+        href = await session.run(element.get_attribute, "href")
         if "realtime" in href:  # this is what we are looking for
+            await pace_navigation(session, _pacing_seconds)
+            session.last_navigation_at = time.monotonic()
             logging.info(f"Navigating to new query: {href}")
-            element.click()
+            await session.run(element.click)
             break
 
+    session.last_keyword = _query
     return True
 
 
-def proceed_to_next_keyword(_query, _chars_in_last_keyword, DRIVER, YIELDED_ITEMS):
+async def proceed_to_next_keyword(_query, _chars_in_last_keyword, session, YIELDED_ITEMS, maximum_items=None):
     """
     Once the initial search complete, navigating to the next keyword we wish to search is far simpler. This function can
     be called multiple times once the initial search is done to pass the next keyword.
     :param _query: the keyword that we are looking for
     :param _chars_in_last_keyword: the number of characters in the last keyword we searched (the number of times we will
     need to hit "backspace" to remove these characters organically in our search bar)
+    :param session: the DriverSession to drive
+    :param YIELDED_ITEMS: how many items the query already yielded
+    :param maximum_items: the item cap of the query, we do not search anymore once it is reached (None for no cap)
     :return: False if the search was unsuccessful (elements could not be accessed for example), true otherwise
     """
-    search_bar = find_element_with_timeout(DRIVER, 20,
-                                           "//input[@class='woo-input-main']")  # the bar we will be looking for AFTER the first search
+    Keys = await asyncio.get_running_loop().run_in_executor(None, selenium_keys)
+
+    search_bar = await wait_for_element(session, "//input[@class='woo-input-main']",
+                                        SEARCH_BAR_TIMEOUT)  # the bar we will be looking for AFTER the first search
 
     max_iterations = 4
-    if YIELDED_ITEMS >= MAXIMUM_ITEMS_TO_COLLECT:
+    if maximum_items is not None and YIELDED_ITEMS >= maximum_items:
         logging.info(f"[Sina Weibo] proceed_to_next_keyword - Stopping.")      
         return False  # Stop the generator if the maximum number of items has been reached
     if search_bar is None:
         logging.info("Could not navigate to proper URL, exiting...")
+        session.report_load(success=False, reason="no search input on the result page")
+        session.last_keyword = None
         return False
 
-    wait_random()
-    for i in range(0, _chars_in_last_keyword):
-        search_bar.send_keys(Keys.BACKSPACE)  # delete last keyword
-        wait_random_short()
+    await wait_random(session)
+    session.last_keyword = None  # the search bar is being edited, we are not parked on a result page anymore
+    with session.metrics.phase("typing"):
+        for i in range(0, _chars_in_last_keyword):
+            await session.run(search_bar.send_keys, Keys.BACKSPACE)  # delete last keyword
+            await wait_random_short(session)
 
-    wait_random()
-    type_slow(_query, search_bar)
-    search_bar.send_keys(Keys.RETURN)  # hit it!
+        await wait_random(session)
+        await type_slow(_query, search_bar, session)
+        previous_handles = await session.run(lambda: session.driver.window_handles)
+        await pacer(session).acquire(PAGE_LOAD_TOKENS)
+        await session.run(search_bar.send_keys, Keys.RETURN)  # hit it!
 
-    DRIVER.switch_to.window(DRIVER.window_handles[
-                                len(DRIVER.window_handles) - 1])  # inputing a new request in sina's search bar creates a new tab
+    def new_tab_handles():
+        handles = session.driver.window_handles
+        return handles if len(handles) > len(previous_handles) else None
 
-    nav_bar = find_element_with_timeout(DRIVER, 10, "//div[@class='m-main-nav']")
+    with session.metrics.phase("nav_wait"):
+        # inputing a new request in sina's search bar creates a new tab
+        window_handles = await wait_until(session, new_tab_handles, NEW_TAB_TIMEOUT) or previous_handles
+        await session.switch_to_window(window_handles[len(window_handles) - 1])
+
+        nav_bar = await wait_for_element(session, "//div[@class='m-main-nav']", NAV_BAR_TIMEOUT)
 
     if nav_bar is None:
         logging.info("[Sina Weibo process] Could not encounter the nav bar after entering query, exiting...")
+        session.report_load(success=False, reason="no nav bar after the search")  # blocked, or a login / captcha page
         return False
 
-    categories = find_elements_with_timeout(nav_bar, 10, "//a[@href]")
+    categories = await wait_for_elements(session, "//a[@href]", CATEGORIES_TIMEOUT, root=nav_bar)
 
     if categories is None:
         logging.info("[Sina Weibo process] Could not encounter the latest search bar after entering query, exiting...")
@@ -355,56 +405,188 @@ def proceed_to_next_keyword(_query, _chars_in_last_keyword, DRIVER, YIELDED_ITEM
     for ie, element in enumerate(categories):        
         if ie >= max_iterations:
             break
-        if YIELDED_ITEMS >= MAXIMUM_ITEMS_TO_COLLECT:
+        if maximum_items is not None and YIELDED_ITEMS >= maximum_items:
             logging.info(f"[Sina Weibo] proceed_to_next_keyword loop - Stopping.")      
             break  # Stop the generator if the maximum number of items has been reached
-        href = element.get_attribute("href")
+        href = await session.run(element.get_attribute, "href")
         if "realtime" in href:  # this is what we are looking for
             logging.info(f"[Sina Weibo process] Navigating to new query: {href}")
-            element.click()
+            await session.run(element.click)
             break
 
+    session.last_keyword = _query
     return True
 
 
-def scroll_collect(DRIVER):
+async def pace_navigation(session, _pacing_seconds):
     """
-    Scroll down the page, up to 10 elements will be displayed without being logged in on Sina Weibo
-    :return: the card elements (up to 10) that were loaded on the page after scrolling
+    Stay polite: take the tokens of a page load from the pacer of the session, then leave at least _pacing_seconds (give
+    or take a random part) between two page loads of a session
     """
-    smooth_scrolling(DRIVER)  # scroll smoothly all the way to the end of the page
+    await pacer(session).acquire(PAGE_LOAD_TOKENS)
+    if session.last_navigation_at is None or not _pacing_seconds:
+        return
+    delay = random.uniform(_pacing_seconds, _pacing_seconds * 1.5) - (time.monotonic() - session.last_navigation_at)
+    if delay > 0:
+        await asyncio.sleep(delay)
 
-    all_cards = DRIVER.find_elements(By.XPATH, "//div[@class='card']")  # get all the cards
+
+async def jump_to_keyword(_query, session, _search_url, _pacing_seconds):
+    """
+    Fast alternative to proceed_to_next_keyword: load the realtime results of the keyword directly in the current tab,
+    instead of erasing and typing in the search bar and following the new tab it opens
+    :param _query: the keyword that we are looking for
+    :param session: the DriverSession to drive
+    :param _search_url: the realtime search url, see realtime_url
+    :param _pacing_seconds: minimum time between two page loads of this session
+    :return: False if the results could not be reached, true otherwise
+    """
+    await pace_navigation(session, _pacing_seconds)
+    session.last_keyword = None
+    session.last_navigation_at = time.monotonic()
+    url = realtime_url(_search_url, _query)
+    logging.info(f"[Sina Weibo process] Navigating to new query: {url}")
+    with session.metrics.phase("navigation"):
+        await session.get(url)
+
+    with session.metrics.phase("nav_wait"):
+        nav_bar = await wait_for_element(session, "//div[@class='m-main-nav']", NAV_BAR_TIMEOUT)
+
+    if nav_bar is None:
+        logging.info("[Sina Weibo process] Could not encounter the nav bar after loading the results, exiting...")
+        session.report_load(success=False, reason="no nav bar on the results")  # blocked, or a login / captcha page
+        return False
+
+    session.last_keyword = _query
+    return True
+
+
+async def scroll_collect(session, min_post_length=0, max_oldness_seconds=None, max_pages=1, _pacing_seconds=0):
+    """
+    Scroll down the page until no new card loads, then follow the next page links. Without being logged in on Sina Weibo,
+    up to 10 elements are displayed per page.
+    :param session: the DriverSession to drive
+    :param min_post_length: cards with a shorter content are dropped during the extraction
+    :param max_oldness_seconds: cards older than this are dropped during the extraction, and a page holding such a card
+    is the last one we visit, DEFAULT_OLDNESS_SECONDS if None (results are sorted from the newest to the oldest)
+    :param max_pages: how many result pages we visit at most
+    :param _pacing_seconds: minimum time between two page loads of this session
+    :return: the data of the cards that were loaded on the pages after scrolling, see extract_cards
+    """
+    if max_oldness_seconds is None:
+        max_oldness_seconds = DEFAULT_OLDNESS_SECONDS
+    max_age_minutes = math.ceil(max_oldness_seconds / 60)
+
+    all_cards = []
+    for page in range(max_pages):
+        if await wait_for_elements(session, "//div[@class='card']", CARDS_TIMEOUT) is None:
+            logging.info("[Sina Weibo process] No card showed up on the result page")
+            break
+
+        with session.metrics.phase("scroll"):
+            await scroll_until_stable(session)  # scroll until every card of the page is loaded
+
+        # read all the cards at once
+        with session.metrics.phase("extraction"):
+            result = await extract_cards(session, min_post_length, max_age_minutes)
+        all_cards += result["cards"]
+        count_cards(session.metrics, result)
+
+        if result["rejected"]["too_old"]:
+            logging.info(f"[Sina Weibo process] Reached posts older than {max_age_minutes} minutes on page {page + 1}")
+            break
+        if result["next_page"] is None or page + 1 >= max_pages:
+            break
+        await pace_navigation(session, _pacing_seconds)
+        session.last_navigation_at = time.monotonic()
+        logging.info(f"[Sina Weibo process] Following the next result page: {result['next_page']}")
+        with session.metrics.phase("navigation"):
+            await session.get(result["next_page"])
 
     return all_cards
 
 
-def reconstruct_time_stamp(_publish_time: str):
+async def scroll_stream(session, min_post_length=0, max_oldness_seconds=None, max_pages=1, _pacing_seconds=0,
+                        incremental=True):
     """
-    Reconstruct a standard timestamp from the chinese structure proposed by Sina Weibo
-    :param _publish_time: the publish time, normally under the form of "X seconds ago" or "Y minutes ago"
-    :return: a standard datetime format if the post was <= MAX_POST_AGE_IN_MINUTES and None otherwise
+    Incremental scroll_collect: read the new cards after every scroll step and hand them over right away, instead of
+    once the page is fully loaded. The cards of a page are read once, see extract_new_cards. We stop scrolling on the
+    first card older than the cutoff, or as soon as the caller stops iterating (once it has enough items).
+    :param incremental: False to scroll every page first and yield all the cards at once, like scroll_collect
+    :return: asynchronously yields lists of card data, see extract_cards
     """
-    if SECONDS_AGO in _publish_time:
-        seconds_since_post = int(_publish_time.split(SECONDS_AGO)[0])
-        date = datetime.utcnow() - timedelta(hours=0, minutes=0, seconds=seconds_since_post)
-        return date.strftime("%Y-%m-%dT%H:%M:%S.00Z")
-    elif MINUTES_AGO in _publish_time:
-        minutes_since_post = int(_publish_time.split(MINUTES_AGO)[0])
-        if minutes_since_post > MAX_POST_AGE_IN_MINUTES:  # post is too old, skip it
-            return None
-        date = datetime.utcnow() - timedelta(hours=0, minutes=minutes_since_post)
-        return date.strftime("%Y-%m-%dT%H:%M:%S.00Z")
-    return None
+    if not incremental:
+        yield await scroll_collect(session, min_post_length, max_oldness_seconds, max_pages, _pacing_seconds)
+        return
+    if max_oldness_seconds is None:
+        max_oldness_seconds = DEFAULT_OLDNESS_SECONDS
+    max_age_minutes = math.ceil(max_oldness_seconds / 60)
+
+    for page in range(max_pages):
+        if await wait_for_elements(session, "//div[@class='card']", CARDS_TIMEOUT) is None:
+            logging.info("[Sina Weibo process] No card showed up on the result page")
+            return
+
+        count, stable_steps, result = -1, 0, None
+        for step in range(MAX_SCROLL_STEPS + 1):
+            # the cards already on the page first, then scroll and read the ones that loaded since the previous step
+            share = random.uniform(0.6, 1.0) * SCROLL_SPEED_ACCELERATION if step else None
+            with session.metrics.phase("extraction"):
+                result = await extract_new_cards(session, min_post_length, max_age_minutes, share)
+            count_cards(session.metrics, result)
+            if result["cards"]:
+                yield result["cards"]
+            if result["rejected"]["too_old"]:
+                logging.info(f"[Sina Weibo process] Reached posts older than {max_age_minutes} minutes on page {page + 1}")
+                return
+            stable_steps = stable_steps + 1 if result["count"] <= count else 0
+            count = result["count"]
+            if result.get("bottom") and stable_steps >= STABLE_SCROLL_STEPS:
+                break
+            with session.metrics.phase("scroll"):
+                await wait_random(session)
+
+        if result["next_page"] is None or page + 1 >= max_pages:
+            return
+        await pace_navigation(session, _pacing_seconds)
+        session.last_navigation_at = time.monotonic()
+        logging.info(f"[Sina Weibo process] Following the next result page: {result['next_page']}")
+        with session.metrics.phase("navigation"):
+            await session.get(result["next_page"])
+
+
+def count_cards(metrics, result):
+    """
+    Count the cards of an extract_cards result in the metrics of the query
+    """
+    metrics.count("cards_seen", len(result["cards"]) + sum(result["rejected"].values()))
+    for reason, count in result["rejected"].items():
+        if count:
+            metrics.reject(reason, count)
+
 
 def clean_content(content):
-    content = ''.join(ch for ch in content if ch < '\uE000' or ch > '\uF8FF')
-    return content.replace('#', ' ')
+    return DEFAULT_NORMALIZER.normalize(content)
 
-async def process_and_send(_all_cards, YIELDED_ITEMS):
+async def process_and_send(_all_cards, YIELDED_ITEMS, seen=None, max_oldness_seconds=None, min_post_length=0,
+                           normalizer=None, metrics=None, maximum_items=None, near_duplicates=None,
+                           near_duplicate_mode=None, claimed=None, streak=None):
     """
     Asynchronous function to process every card and output data
-    :param _all_cards: the cards containing all the items for the specified keyword
+    :param _all_cards: the data of the cards containing all the items for the specified keyword, see extract_cards
+    :param seen: the SeenCache of the posts already collected by previous runs, they are skipped
+    :param YIELDED_ITEMS: how many items the query already yielded
+    :param max_oldness_seconds: cards published before that are skipped, DEFAULT_OLDNESS_SECONDS if None
+    :param min_post_length: cards whose normalized content is shorter than this are skipped
+    :param normalizer: the TextNormalizer applied to the contents, the default pipeline if None
+    :param metrics: the QueryMetrics counting the skipped cards per reason
+    :param maximum_items: the item cap of the query, nothing is yielded once YIELDED_ITEMS reached it (None for no cap)
+    :param near_duplicates: the NearDuplicateIndex the contents are looked up in, None to skip the lookup
+    :param near_duplicate_mode: "drop" skips the near-duplicates of a recent post, "count" yields them and records their
+    cluster in the metrics (QueryMetrics.clusters)
+    :param claimed: the keys of the posts already handed over during this run, they are skipped. The posts yielded are
+    added to it right away, so that the concurrent workers of a run do not yield the same post twice
+    :param streak: the RejectionStreak of the keyword, we stop once it is exhausted (None to go through every card)
     :return:yield an item with all the relevant information
     """
 
@@ -417,56 +599,79 @@ async def process_and_send(_all_cards, YIELDED_ITEMS):
         <p class="txt"/> : content of the post
     </div>
     """
-    logging.info("process and send")
+    logging.debug("process and send")
+    metrics = metrics or QueryMetrics()
+    clock = PageClock()  # the current time is read once for all the cards of the page
+    if max_oldness_seconds is None:
+        max_oldness_seconds = DEFAULT_OLDNESS_SECONDS
+    cutoff = clock.cutoff(max_oldness_seconds)
+    # filtering weird chars, for all the cards at once
+    contents = (normalizer or DEFAULT_NORMALIZER).normalize_batch([card["text"] for card in _all_cards])
 
-    for card in _all_cards:
+    for card, content in zip(_all_cards, contents):
         try:
-     
-            if YIELDED_ITEMS >= MAXIMUM_ITEMS_TO_COLLECT:
+            if maximum_items is not None and YIELDED_ITEMS >= maximum_items:
                 logging.debug(f"[Sina Weibo] process_and_send - Stopping.")      
                 break  # Stop the generator if the maximum number of items has been reached
+            if streak is not None and streak.exhausted():
+                logging.debug(f"[Sina Weibo] process_and_send - {streak.count} old posts in a row, stopping.")
+                break
+
+            post_url = card["url"]
+            key = post_key(post_url) if post_url is not None else None
+            if key is not None and (seen is not None and key in seen or claimed is not None and key in claimed):
+                logging.debug(" (!) Skipping item because it was already collected.")
+                metrics.reject("already_seen")
+                if streak is not None:
+                    streak.rejected("already_seen")
+                continue
 
-            username = card.find_element(By.XPATH, ".//a[@nick-name]").text
-            content = card.find_element(By.XPATH, ".//p[@class='txt']").text
-
-            container = card.find_element(By.XPATH, ".//div[@class='from']")
-            container2 = container.find_elements(By.XPATH, ".//a[@href]")
-
-            post_url = None
-            publish_time = None
-
-            for element in container2:
-                ref = element.get_attribute("href")
-                if "refer_flag" in ref:
-                    post_url = ref
-                    publish_time = reconstruct_time_stamp(element.text)
-                    break
+            username = card["username"]
+            published_at = clock.parse(card["time"])
 
-            if publish_time is None:
-                logging.info(" (!) Skipping item because there is no publish_time.")
+            if published_at is None:
+                logging.debug(" (!) Skipping item because there is no publish_time.")
+                metrics.reject("no_time")
+                continue
+            if published_at < cutoff:
+                logging.debug(" (!) Skipping item because it is too old.")
+                metrics.reject("too_old")
+                if streak is not None:
+                    streak.rejected("too_old")
                 continue
             if post_url is None:
-                logging.info(" (!) Skipping item because there is no post_url.")
+                logging.debug(" (!) Skipping item because there is no post_url.")
+                metrics.reject("no_url")
+                continue
+            if len(content) < min_post_length:
+                logging.debug(" (!) Skipping item because its content is too short once normalized.")
+                metrics.reject("too_short")
+                continue
+            cluster = near_duplicates.check(content, post_url) if near_duplicates is not None else None
+            if cluster is not None and near_duplicate_mode == "drop":
+                logging.debug(f" (!) Skipping item because it is a near-duplicate of {cluster}.")
+                metrics.reject("near_duplicate")
                 continue
-
-
-            content = clean_content(content) # filtering weird chars
 
             ##### Forge item
             ## start with hash of author
             sha1 = hashlib.sha1()
             # Update the hash with the author string encoded to bytest
-            author = "anonymous"
-            try:
-                author = username
-            except:
-                pass
+            author = username or "anonymous"
             sha1.update(author.encode())
             author_sha1_hex = sha1.hexdigest()
-            logging.info(f"[Sina Weibo data] Author: {author_sha1_hex}")
-            logging.info(f"[Sina Weibo data] Content (chinese): {content}")
-            logging.info(f"[Sina Weibo data] Post URL: {post_url}")
-            logging.info(f"[Sina Weibo data] Post creation time: {publish_time}")
+            publish_time = format_created_at(published_at)
+            logging.debug(f"[Sina Weibo data] Author: {author_sha1_hex}")
+            logging.debug(f"[Sina Weibo data] Content (chinese): {content}")
+            logging.debug(f"[Sina Weibo data] Post URL: {post_url}")
+            logging.debug(f"[Sina Weibo data] Post creation time: {publish_time}")
+            if cluster is not None:
+                logging.info(f"[Sina Weibo near-duplicates] {post_url} joins the cluster of {cluster}")
+                metrics.near_duplicate(post_url, cluster)
+            if claimed is not None:
+                claimed.add(key)
+            if streak is not None:
+                streak.kept()
             yield Item(
                 content=Content(content),
                 author=Author(author_sha1_hex),
@@ -490,20 +695,45 @@ DEFAULT_MAXIMUM_ITEMS = 40
 DEFAULT_MIN_POST_LENGTH = 25
 DEFAULT_KEYWORDS = ["比特币", "以太坊", "ETH", "crypto", "BTC", "USDT", "加密货币", "索拉纳", "狗狗币", "卡尔达诺", 
         "门罗币", "波卡", "瑞波币", "XRP", "稳定币", "DeFi", "中央银行数字货币", "纳斯达克", 
-        "标普500", "标普500", "BNB", "交易所交易基金", "现货ETF", "比特币ETF", "加密", "山寨币", 
-        "DeFi", "GameFi", "NFT", "NFTs", "加密货币", "加密", "Twitter限制", "数字", "空投", 
-        "金融", "流动性","代币", "经济", "市场", "股票", "危机", "俄罗斯", "战争", "乌克兰" "奢侈", 
+        "标普500", "BNB", "交易所交易基金", "现货ETF", "比特币ETF", "加密", "山寨币", 
+        "GameFi", "NFT", "NFTs", "Twitter限制", "数字", "空投", 
+        "金融", "流动性","代币", "经济", "市场", "股票", "危机", "俄罗斯", "战争", "乌克兰", "奢侈", 
         "LVMH", "埃隆·马斯克", "冲突", "银行", "詹斯勒", "骚乱", "FaceID", "暴乱", "法国暴乱", "法国", "Louis Vuitton", "Ralph Lauren",
-         "Dior", "Channel",   "美国", "USA", "中国", "德国", "欧洲", "欧洲联盟(EU)", "加拿大", "墨西哥", "巴西", "价格", "市场", 
-        "纽约证券交易所","纳斯达克", "CAC", "CAC40", "G20", "石油价格", "富时", "纽约证券交易所",
-         "华尔街", "货币", "外汇", "交易", "货币", "美元", "沃伦·巴菲特", "黑石", "伯克希尔", "首次公开募股", "苹果", "特斯拉","Alphabet (GOOG)", "FB股票","债务",
-         "比特幣", "俄罗斯", "中国", "以太坊", "美国", "法國", "德國", "英國", "加密貨幣", "代幣", "日本", "烏克蘭", "習近平",
-                    "拜登", "普京", "金融", "馬克龍", "穩定幣", "泰達幣", "幣安"]
+         "Dior", "Channel",   "美国", "USA", "中国", "德国", "欧洲", "欧洲联盟(EU)", "加拿大", "墨西哥", "巴西", "价格", 
+        "纽约证券交易所", "CAC", "CAC40", "G20", "石油价格", "富时",
+         "华尔街", "货币", "外汇", "交易", "美元", "沃伦·巴菲特", "黑石", "伯克希尔", "首次公开募股", "苹果", "特斯拉","Alphabet (GOOG)", "FB股票","债务",
+         "比特幣", "法國", "德國", "英國", "加密貨幣", "代幣", "日本", "烏克蘭", "習近平",
+                    "拜登", "普京", "馬克龍", "穩定幣", "泰達幣", "幣安"]
 DEFAULT_URL = "https://weibo.com/login.php"
 DEFAULT_NUMBER_CONSECUTIVE_OLD_COMMENTS = 8
+DEFAULT_DRIVER_POOL_SIZE = 1  # warm drivers kept alive between two queries
+DEFAULT_DRIVER_MAX_AGE_SECONDS = 1800  # drivers older than this are quit and replaced
+DEFAULT_DRIVER_MAX_USES = 25  # drivers that served this many queries are quit and replaced
+DEFAULT_DRIVER_MAX_RSS_MB = 1536  # drivers whose processes hold more resident memory than this are quit and replaced
+DEFAULT_LEAN_PROFILE = True  # block the resources we do not read and disable the Chrome features we do not use
+DEFAULT_PARALLELISM = 1  # number of keywords searched at the same time, each one on its own driver
+DEFAULT_ENGINE = "chrome"  # "chrome" drives a headless browser, "http" fetches the result pages directly
+DEFAULT_SEARCH_URL = "https://s.weibo.com/realtime"  # realtime results, used by the http engine
+DEFAULT_NAVIGATION = "direct"  # how a warm session moves to the next keyword, see read_navigation_parameters
+DEFAULT_NAVIGATION_PACING_SECONDS = 0  # minimum time between two page loads of a driver, on top of RATE_CONTROLLERS
+DEFAULT_MAX_PAGES = 3  # result pages visited per keyword at most, we stop earlier on posts older than the cutoff
+DEFAULT_INCREMENTAL_EXTRACTION = True  # hand the cards over after every scroll step, see scroll_stream
+DEFAULT_NEAR_DUPLICATE_MODE = "off"  # what to do with the near-duplicates of a recent post, see read_near_duplicate_parameters
+DEFAULT_METRICS_PATH = None  # e.g. a .prom file read by the node_exporter textfile collector
+DEFAULT_DEADLINE_SECONDS = 120  # time slot of a run, we visit keywords until it is over or we have enough items
+# per-keyword yield statistics are kept in this file between runs (see keywords.py), None keeps them in memory only
+DEFAULT_KEYWORD_STATS_PATH = os.path.join(Path.home(), ".cache", "wei223be19ab11e891bo", "keyword_stats.json")
+# posts we already collected are remembered in this file between runs (see seen.py), None keeps them in memory only
+DEFAULT_SEEN_CACHE_PATH = os.path.join(Path.home(), ".cache", "wei223be19ab11e891bo", "seen_posts.sqlite")
+
+DRIVER_POOL = DriverPool(init_driver, DEFAULT_DRIVER_POOL_SIZE, DEFAULT_DRIVER_MAX_AGE_SECONDS, DEFAULT_DRIVER_MAX_USES,
+                         proxies=PROXY_POOL, pacers=RATE_CONTROLLERS, max_rss_mb=DEFAULT_DRIVER_MAX_RSS_MB)
+atexit.register(DRIVER_POOL.shutdown)
 
 def read_parameters(parameters):
-    global MAX_NUMBER_CONSECUTIVE_OLD_COMMENTS, CONSECUTIVE_OLD_COMMENTS_COUNT, MAXIMUM_ITEMS_TO_COLLECT
+    """
+    :return: max_oldness_seconds, maximum_items, min_post_length, keywords, url, max_consecutive_old_posts
+    """
     # Check if parameters is not empty or None
     if parameters and isinstance(parameters, dict):
         try:
@@ -512,9 +742,11 @@ def read_parameters(parameters):
             max_oldness_seconds = DEFAULT_OLDNESS_SECONDS
 
         try:
-            MAXIMUM_ITEMS_TO_COLLECT = parameters.get("MAXIMUM_ITEMS_TO_COLLECT", DEFAULT_MAXIMUM_ITEMS)
+            # both spellings are in use, the lowercase one is consistent with the other parameters
+            maximum_items = parameters.get("maximum_items_to_collect",
+                                           parameters.get("MAXIMUM_ITEMS_TO_COLLECT", DEFAULT_MAXIMUM_ITEMS))
         except KeyError:
-            MAXIMUM_ITEMS_TO_COLLECT = DEFAULT_MAXIMUM_ITEMS
+            maximum_items = DEFAULT_MAXIMUM_ITEMS
 
         try:
             min_post_length = parameters.get("min_post_length", DEFAULT_MIN_POST_LENGTH)
@@ -530,111 +762,800 @@ def read_parameters(parameters):
         except KeyError:
             url = DEFAULT_URL
         try:
-            MAX_NUMBER_CONSECUTIVE_OLD_COMMENTS = parameters.get("max_consecutive_old_posts", DEFAULT_NUMBER_CONSECUTIVE_OLD_COMMENTS)
+            max_consecutive_old_posts = parameters.get("max_consecutive_old_posts", DEFAULT_NUMBER_CONSECUTIVE_OLD_COMMENTS)
         except KeyError:
-            MAX_NUMBER_CONSECUTIVE_OLD_COMMENTS = DEFAULT_NUMBER_CONSECUTIVE_OLD_COMMENTS
+            max_consecutive_old_posts = DEFAULT_NUMBER_CONSECUTIVE_OLD_COMMENTS
     else:
         # Assign default values if parameters is empty or None
         max_oldness_seconds = DEFAULT_OLDNESS_SECONDS
-        MAXIMUM_ITEMS_TO_COLLECT = DEFAULT_MAXIMUM_ITEMS
+        maximum_items = DEFAULT_MAXIMUM_ITEMS
         min_post_length = DEFAULT_MIN_POST_LENGTH
         keywords = DEFAULT_KEYWORDS
         url = DEFAULT_URL
-        MAX_NUMBER_CONSECUTIVE_OLD_COMMENTS = DEFAULT_NUMBER_CONSECUTIVE_OLD_COMMENTS
+        max_consecutive_old_posts = DEFAULT_NUMBER_CONSECUTIVE_OLD_COMMENTS
 
-    return max_oldness_seconds, MAXIMUM_ITEMS_TO_COLLECT, min_post_length, keywords, url
+    return max_oldness_seconds, maximum_items, min_post_length, keywords, url, max_consecutive_old_posts
 
 
-############################################################################################################################
+def read_http_parameters(parameters):
+    """
+    Read the settings of the browserless engine
+    :return: engine, search_url, proxy (an extra proxy for the pool, see read_proxies), cookies
+    """
+    if not parameters or not isinstance(parameters, dict):
+        parameters = {}
+    engine = parameters.get("engine", DEFAULT_ENGINE)
+    search_url = parameters.get("search_url", DEFAULT_SEARCH_URL)
+    proxy = parameters.get("proxy")
+    cookies = parameters.get("cookies")
+    if engine == "http" and cookies is None:
+        load_env(".weibo_env")
+        cookies = load_env_variable("WEIBO_COOKIES", none_allowed=True)
+    return engine, search_url, proxy, cookies
+
+
+def read_proxies(parameters):
+    """
+    :return: the proxies of the "proxy" and "proxies" (a list, or a comma separated string) parameters, they join the
+    proxy pool of the process
+    """
+    if not parameters or not isinstance(parameters, dict):
+        return []
+    proxies = parameters.get("proxies") or []
+    if isinstance(proxies, str):
+        proxies = parse_proxies(proxies)
+    return ([parameters["proxy"]] if parameters.get("proxy") else []) + list(proxies)
 
-def is_within_timeframe_seconds(dt_str : str, timeframe_sec: int):
-    # Convert the datetime string to a datetime object
-    dt = datett.strptime(dt_str, "%Y-%m-%dT%H:%M:%S.%fZ")
 
-    # Make it aware about timezone (UTC)
-    dt = dt.replace(tzinfo=timezone.utc)
+def read_seen_cache_path(parameters):
+    if parameters and isinstance(parameters, dict):
+        return parameters.get("seen_cache_path", DEFAULT_SEEN_CACHE_PATH)
+    return DEFAULT_SEEN_CACHE_PATH
 
-    # Get the current datetime in UTC
-    current_dt = datett.now(timezone.utc)
 
-    # Calculate the time difference between the two datetimes
-    time_diff = current_dt - dt
+def read_keyword_stats_path(parameters):
+    if parameters and isinstance(parameters, dict):
+        return parameters.get("keyword_stats_path", DEFAULT_KEYWORD_STATS_PATH)
+    return DEFAULT_KEYWORD_STATS_PATH
+
 
-    # Check if the time difference is within the specified timeframe in seconds
-    if abs(time_diff) <= timedelta(seconds=timeframe_sec):
-        return True
+def read_navigation_parameters(parameters, search_url):
+    """
+    :return: (mode, search_url, pacing_seconds) where mode is "direct" (load the results url of the next keyword) or
+    "type" (erase and type the next keyword in the search bar, like a person would)
+    """
+    if parameters and isinstance(parameters, dict):
+        mode = parameters.get("navigation", DEFAULT_NAVIGATION)
+        pacing_seconds = parameters.get("navigation_pacing_seconds", DEFAULT_NAVIGATION_PACING_SECONDS)
     else:
-        return False
+        mode, pacing_seconds = DEFAULT_NAVIGATION, DEFAULT_NAVIGATION_PACING_SECONDS
+    return mode, search_url, pacing_seconds
 
-async def query(parameters: dict) -> AsyncGenerator[Item, None]:
+
+def read_normalizer(parameters):
     """
-    Perform asynchronous queries on the specified list of keywords one at a time and yield results as soon as they are collected
-    :param _url: the initial url from which we will begin our user journey
-    :param _keywords: the list of keywords we wish to itereate through
-    :return: asynchronously yields the results per keyword. Starts with an initial search than moves on to the next keywords automatically
+    :return: the TextNormalizer set up by the "normalization" parameter, see normalize.get_normalizer
+    """
+    if parameters and isinstance(parameters, dict):
+        return get_normalizer(parameters.get("normalization"))
+    return DEFAULT_NORMALIZER
+
+
+def read_metrics_parameters(parameters):
+    """
+    :return: metrics_callback (called with the QueryMetrics of the run), metrics_path (Prometheus text file),
+    metrics_aggregate (merge the run into the process-wide metrics), see metrics.publish_metrics
+    """
+    if parameters and isinstance(parameters, dict):
+        return parameters.get("metrics_callback"), parameters.get("metrics_path", DEFAULT_METRICS_PATH), \
+            parameters.get("metrics_aggregate", True)
+    return None, DEFAULT_METRICS_PATH, True
+
+
+def read_near_duplicate_parameters(parameters):
+    """
+    :return: near_duplicate_mode ("drop", "count" or "off"), the NearDuplicateIndex shared by the runs with the same
+    near_duplicate_threshold and near_duplicate_window_seconds (None when off), see neardup.py
     """
-    logging.info("")
-    logging.info("")
-    logging.info("== NEW QUERY INSTANCE ==")
+    if not parameters or not isinstance(parameters, dict):
+        parameters = {}
+    mode = parameters.get("near_duplicate_mode", DEFAULT_NEAR_DUPLICATE_MODE) or "off"
+    if mode not in ("drop", "count", "off"):
+        raise ValueError(f"Unknown near_duplicate_mode: {mode}")
+    if mode == "off":
+        return mode, None
+    return mode, get_near_duplicate_index(float(parameters.get("near_duplicate_threshold", DEFAULT_THRESHOLD)),
+                                          float(parameters.get("near_duplicate_window_seconds", DEFAULT_WINDOW_SECONDS)))
+
+
+def read_max_pages(parameters):
+    if parameters and isinstance(parameters, dict):
+        return max(1, int(parameters.get("max_pages", DEFAULT_MAX_PAGES)))
+    return DEFAULT_MAX_PAGES
 
 
-    max_oldness_seconds, MAXIMUM_ITEMS_TO_COLLECT, min_post_length, _keywords, _url = read_parameters(parameters)
-    YIELDED_ITEMS = 0  # Counter for the number of yielded items
-    consecutive_rejected_items = 8
+def read_incremental_extraction(parameters):
+    if parameters and isinstance(parameters, dict):
+        return bool(parameters.get("incremental_extraction", DEFAULT_INCREMENTAL_EXTRACTION))
+    return DEFAULT_INCREMENTAL_EXTRACTION
 
-    if "weibo.com" not in _url:
-        raise ValueError("Not a Sina Weibo URL")
 
-    DRIVER = init_driver()  # init the driver
-    logging.info("Driver initialized")
-    try:
-        # navigate through the landing page to the first element that interests us (different layout)
-        if start_search(_url, _keywords[0], DRIVER):
-            logging.info("starting scroll & collect")
-            async for item in process_and_send(
-                scroll_collect(DRIVER), YIELDED_ITEMS
-            ):  # scroll through the page to collect all the elements relevant to us                 
-                if YIELDED_ITEMS >= MAXIMUM_ITEMS_TO_COLLECT:
-                    logging.info(f"Stopping now because YIELDED_ITEMS reached maximum ({YIELDED_ITEMS} / {MAXIMUM_ITEMS_TO_COLLECT})")
-                    break  # Stop the generator if the maximum number of items has been reached
-                ### YIELDED ITEM                                                
-                if  is_within_timeframe_seconds(dt_str=item['created_at'], timeframe_sec=max_oldness_seconds) \
-                    and item['content'] is not None and len(item['content']) >= min_post_length:
-                    YIELDED_ITEMS += 1  # Increment the counter for yielded items          
-                    logging.info(f"Found {YIELDED_ITEMS} new posts for this query instance")      
+def read_deadline_seconds(parameters):
+    """
+    :return: the time budget of the run in seconds, from the "deadline" parameter (a time.time() timestamp) if set, from
+    "deadline_seconds" otherwise
+    """
+    if parameters and isinstance(parameters, dict):
+        if parameters.get("deadline") is not None:
+            return max(0.0, float(parameters["deadline"]) - time.time())
+        return float(parameters.get("deadline_seconds", DEFAULT_DEADLINE_SECONDS))
+    return float(DEFAULT_DEADLINE_SECONDS)
+
+
+def read_watch_parameters(parameters):
+    """
+    :return: min_refresh_seconds, max_refresh_seconds, queue_size, metrics_interval_seconds of the watch mode
+    """
+    if not parameters or not isinstance(parameters, dict):
+        parameters = {}
+    min_refresh_seconds = float(parameters.get("watch_min_refresh_seconds", DEFAULT_MIN_REFRESH_SECONDS))
+    max_refresh_seconds = max(min_refresh_seconds,
+                              float(parameters.get("watch_max_refresh_seconds", DEFAULT_MAX_REFRESH_SECONDS)))
+    return min_refresh_seconds, max_refresh_seconds, max(1, int(parameters.get("watch_queue_size", DEFAULT_QUEUE_SIZE))), \
+        float(parameters.get("watch_metrics_interval_seconds", DEFAULT_METRICS_INTERVAL_SECONDS))
+
+
+def read_shard_parameters(parameters):
+    """
+    :return: shards (worker processes of sharded_query, by default one per core up to 4), max_restarts (of a crashed
+    worker)
+    """
+    if not parameters or not isinstance(parameters, dict):
+        parameters = {}
+    shards = parameters.get("shards")
+    return max(1, int(shards)) if shards else default_shards(), \
+        max(0, int(parameters.get("max_restarts", DEFAULT_MAX_RESTARTS)))
+
+
+def read_pacing_parameters(parameters):
+    """
+    Read the bounds of the rate controllers, they are shared by all the queries of the process the last query wins
+    :return: keyword arguments for RateControllers.configure
+    """
+    if not parameters or not isinstance(parameters, dict):
+        parameters = {}
+    return {
+        "min_rate": float(parameters.get("pacing_min_rate", DEFAULT_MIN_RATE)),
+        "max_rate": float(parameters.get("pacing_max_rate", DEFAULT_MAX_RATE)),
+        "target_latency_seconds": float(parameters.get("pacing_target_latency_seconds",
+                                                       DEFAULT_TARGET_LATENCY_SECONDS)),
+    }
+
+
+def read_parallelism(parameters):
+    if parameters and isinstance(parameters, dict):
+        return max(1, int(parameters.get("parallelism", DEFAULT_PARALLELISM)))
+    return DEFAULT_PARALLELISM
+
+
+def read_pool_parameters(parameters):
+    """
+    Read the driver pool settings, the pool being shared by all the queries of the process the last query wins
+    :return: keyword arguments for DriverPool.configure
+    """
+    if not parameters or not isinstance(parameters, dict):
+        parameters = {}
+    return {
+        "size": parameters.get("driver_pool_size", DEFAULT_DRIVER_POOL_SIZE),
+        "max_age_seconds": parameters.get("driver_max_age_seconds", DEFAULT_DRIVER_MAX_AGE_SECONDS),
+        "max_uses": parameters.get("driver_max_uses", DEFAULT_DRIVER_MAX_USES),
+        "max_rss_mb": parameters.get("driver_max_rss_mb", DEFAULT_DRIVER_MAX_RSS_MB),
+        "driver_options": {
+            "lean": parameters.get("lean_profile", DEFAULT_LEAN_PROFILE),
+            "blocked_urls": parameters.get("blocked_urls"),
+            "renderer_memory_mb": parameters.get("renderer_memory_mb", DEFAULT_RENDERER_MEMORY_MB),
+        },
+    }
+
+
+############################################################################################################################
+
+class RejectionStreak:
+    """
+    The cards of a keyword skipped in a row because they are too old or already collected. The results being sorted by
+    publish time, past max_consecutive_old_posts of them the rest of the results is older still, and we leave the keyword
+    """
+
+    REASONS = ("too_old", "already_seen")
+
+    def __init__(self, limit):
+        """
+        :param limit: max_consecutive_old_posts
+        """
+        self.limit = limit
+        self.count = 0
+
+    def rejected(self, reason):
+        if reason in self.REASONS:
+            self.count += 1
+
+    def kept(self):
+        self.count = 0
+
+    def exhausted(self):
+        return self.count >= self.limit
+
+
+async def navigate_to_keyword(session, _url, _keyword, YIELDED_ITEMS, navigation, maximum_items=None):
+    """
+    Bring a session on the realtime results of a keyword. A fresh session goes through the landing page. A warm one, already
+    on a result page, either loads the results url directly or types in the search bar, depending on the navigation mode.
+    :param navigation: (mode, search_url, pacing_seconds), see read_navigation_parameters
+    :param maximum_items: the item cap of the query, see proceed_to_next_keyword
+    :return: True if we landed on the results
+    """
+    mode, search_url, pacing_seconds = navigation
+    if session.last_keyword is None:
+        session.last_navigation_at = time.monotonic()
+        return await start_search(_url, _keyword, session, pacing_seconds)
+    if mode == "direct":
+        return await jump_to_keyword(_keyword, session, search_url, pacing_seconds)
+    session.last_navigation_at = time.monotonic()
+    return await proceed_to_next_keyword(_keyword, len(session.last_keyword), session, YIELDED_ITEMS, maximum_items)
+
+
+class WeiboCollector:
+    """
+    A single query() run: its configuration, read once from the parameters, and its state (items yielded, metrics).
+    Nothing is shared between two collectors but the driver pool and the caches kept on disk, so that several queries
+    can run at once in the same process without overwriting each other's limits.
+    """
+
+    def __init__(self, parameters):
+        """
+        :param parameters: the query() parameters
+        :raise ValueError: if the url is not a Sina Weibo one
+        """
+        self.max_oldness_seconds, self.maximum_items, self.min_post_length, self.keywords, self.url, \
+            self.max_consecutive_old_posts = read_parameters(parameters)
+        if "weibo.com" not in self.url:
+            raise ValueError("Not a Sina Weibo URL")
+
+        self.seen = get_seen_cache(read_seen_cache_path(parameters))
+        self.scheduler = get_keyword_scheduler(read_keyword_stats_path(parameters))
+        self.engine, self.search_url, self.proxy, self.cookies = read_http_parameters(parameters)
+        self.proxies = get_proxy_pool()
+        self.proxies.add(read_proxies(parameters))
+        self.user_agent = random.choice(USER_AGENTS)
+        self.navigation = read_navigation_parameters(parameters, self.search_url)
+        self.max_pages = read_max_pages(parameters)
+        self.incremental = read_incremental_extraction(parameters)
+        self.deadline_seconds = read_deadline_seconds(parameters)
+        self.normalizer = read_normalizer(parameters)
+        self.near_duplicate_mode, self.near_duplicates = read_near_duplicate_parameters(parameters)
+        self.metrics_callback, self.metrics_path, self.metrics_aggregate = read_metrics_parameters(parameters)
+        self.parallelism = read_parallelism(parameters)
+        self.pool_parameters = read_pool_parameters(parameters)
+        self.pacing_parameters = read_pacing_parameters(parameters)
+        self.pool_parameters["size"] = max(self.pool_parameters["size"], self.parallelism)  # keep every parallel driver warm
+
+        self.metrics = QueryMetrics()
+        self.yielded = 0  # items yielded so far by this run
+        self.claimed = set()  # post keys handed over by the workers but not yielded yet, see process_and_send
+        self.planner = None  # the CollectionPlanner of the run, set up when it starts
+
+    async def acquire_session(self):
+        """
+        DRIVER_POOL.acquire, retried with an exponential backoff
+        :raise Exception: the error of the last attempt, once ACQUIRE_ATTEMPTS attempts failed
+        :return: a DriverSession, to give back through DRIVER_POOL.release
+        """
+        for attempt in range(ACQUIRE_ATTEMPTS):
+            try:
+                return await DRIVER_POOL.acquire(self.metrics)
+            except Exception as e:
+                if attempt + 1 >= ACQUIRE_ATTEMPTS:
+                    raise
+                delay = ACQUIRE_BACKOFF_SECONDS * 2 ** attempt
+                logging.info(f"[Sina Weibo pool] Could not start a driver ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    def items(self, cards, streak=None):
+        """
+        :param cards: the data of the cards of a keyword, see extract_cards
+        :param streak: the RejectionStreak of the keyword, None to go through every card
+        :return: asynchronously yields the items of the cards that pass the filters
+        """
+        return process_and_send(cards, self.yielded, self.seen, self.max_oldness_seconds, self.min_post_length,
+                                self.normalizer, self.metrics, self.maximum_items, self.near_duplicates,
+                                self.near_duplicate_mode, self.claimed, streak)
+
+    def mark_seen(self, item):
+        """
+        Remember a post in the seen cache right before it is yielded: the posts handed over by the workers but never
+        yielded (the run stopped at maximum_items, or its consumer closed it) are left to the next runs
+        """
+        key = post_key(item['url'])
+        self.seen.add(key, self.max_oldness_seconds)
+        self.claimed.discard(key)  # the seen cache skips it from now on
+
+    def card_batches(self, session):
+        """
+        :param session: the DriverSession parked on the results of a keyword
+        :return: asynchronously yields the cards of the keyword, after every scroll step in incremental mode and once
+        every page is loaded otherwise, see scroll_stream
+        """
+        return scroll_stream(session, self.min_post_length, self.max_oldness_seconds, self.max_pages, self.navigation[2],
+                             self.incremental)
+
+    def record_visit(self, keyword, fresh, cards, started):
+        """
+        Record a visit of a keyword in the scheduler statistics and in the budget of the run
+        :param fresh: the items it yielded
+        :param cards: the cards it returned
+        :param started: time.monotonic() at the start of the visit
+        """
+        seconds = time.monotonic() - started
+        self.scheduler.record(keyword, fresh, len(cards) - fresh, seconds)
+        self.planner.record(keyword, fresh, seconds)
+
+    def enough(self, streak=None):
+        """
+        :param streak: the RejectionStreak of the current keyword
+        :return: True if we should stop scrolling the current keyword
+        """
+        return self.yielded >= self.maximum_items or streak is not None and streak.exhausted() or self.planner.expired()
+
+    async def fetch(self, keyword, max_oldness_seconds, max_pages=None):
+        """
+        Fetch the realtime results of a keyword, following the next page links like scroll_stream does
+        :param max_pages: how many result pages we fetch at most, self.max_pages if None
+        :return: the data of the cards, see extract_cards
+        """
+        cards, url = [], realtime_url(self.search_url, keyword)
+        for page in range(max_pages or self.max_pages):
+            result = await self.fetch_results(url, max_oldness_seconds)
+            cards += result["cards"]
+            if result["rejected"]["too_old"] or result["next_page"] is None:
+                break
+            url = result["next_page"]
+        logging.info(f"[Sina Weibo http] {keyword}: {len(cards)} cards kept from {page + 1} pages")
+        return cards
+
+    async def fetch_results(self, url, max_oldness_seconds):
+        """
+        fetch_results through a proxy of the pool, paced by the RateController of that proxy. Both get the outcome.
+        :return: the cards of the page and its next page link, see extract_cards
+        """
+        proxy = self.proxies.choose()
+        controller = RATE_CONTROLLERS.get(proxy)
+        await controller.acquire(PAGE_LOAD_TOKENS)
+        started = time.monotonic()
+        try:
+            result = await fetch_results(url, self.min_post_length, max_oldness_seconds, user_agent=self.user_agent,
+                                         proxy=proxy, cookies=self.cookies, metrics=self.metrics)
+        except Exception as e:
+            self.proxies.report(proxy, success=False)  # the login wall included
+            controller.throttled(str(e) if isinstance(e, LoginWallError) else "fetch failed")
+            raise
+        self.proxies.report(proxy, time.monotonic() - started)
+        controller.loaded(time.monotonic() - started)
+        return result
+
+    async def collect_http(self):
+        """
+        Collect the keywords handed over by the planner without any browser, fetching the realtime result pages directly
+        :raise LoginWallError: when Weibo wants us to log in, so that run() can fall back to Chrome
+        :return: asynchronously yields the valid items of every keyword
+        """
+        while True:
+            keyword = self.planner.next_keyword(self.yielded)
+            if keyword is None:
+                break
+            logging.info(f"[Sina Weibo http] Fetching realtime results of {keyword}")
+            started, fresh, cards, requeued = time.monotonic(), 0, [], False
+            try:
+                cards = await self.fetch(keyword, self.max_oldness_seconds)
+                async for item in self.items(cards):
+                    fresh += 1
                     yield item
-                else:                                
-                    consecutive_rejected_items -= 1
-                    if consecutive_rejected_items <= 0:
-                        break
-            
-            keywords = random.choices(_keywords, k = 3)
-            if len(keywords) > 1:
-                for i in range(1, len(keywords)):
-                    if consecutive_rejected_items <= 0 or YIELDED_ITEMS:
-                        break
-                    if proceed_to_next_keyword(keywords[i], len(
-                            keywords[i - 1]), DRIVER, YIELDED_ITEMS
-                    ):
-                        # navigate to the next keyword using the existing search bar
-                        async for item in process_and_send(scroll_collect(DRIVER), YIELDED_ITEMS):  # append the following items to the list   
-                            ####                                         
-                            if YIELDED_ITEMS >= MAXIMUM_ITEMS_TO_COLLECT:
-                                logging.info(f"Stopping now because YIELDED_ITEMS reached maximum ({YIELDED_ITEMS} / {MAXIMUM_ITEMS_TO_COLLECT})")
-                                break  # Stop the generator if the maximum number of items has been reached
-                            ### YIELDED ITEM                                                
-                            if  is_within_timeframe_seconds(dt_str=item['created_at'], timeframe_sec=max_oldness_seconds) \
-                                and item['content'] is not None and len(item['content']) >= min_post_length:
-                                YIELDED_ITEMS += 1  # Increment the counter for yielded items
-                                logging.info(f"Found {YIELDED_ITEMS} new posts..")     
-                                yield item
-                            else:                                
-                                consecutive_rejected_items -= 1
+            except LoginWallError:
+                self.planner.requeue(keyword)  # the Chrome engine will visit it
+                requeued = True
+                raise
+            finally:
+                if not requeued:  # a visit stopped by the login wall says nothing about the keyword
+                    self.record_visit(keyword, fresh, cards, started)
+
+    async def collect_sequentially(self):
+        """
+        Search the keywords handed over by the planner one after the other on a single driver
+        :return: asynchronously yields the valid items of every keyword
+        """
+        session = await self.acquire_session()  # warm driver if one is parked, fresh one otherwise
+        reusable = True
+        logging.info("Driver initialized")
+        visited = 0
+        try:
+            while True:
+                keyword = self.planner.next_keyword(self.yielded)
+                if keyword is None:
+                    break
+                visited += 1
+                started, fresh, cards = time.monotonic(), 0, []
+                streak = RejectionStreak(self.max_consecutive_old_posts)
+                try:
+                    # warm sessions go straight to the keyword, fresh ones navigate through the landing page first
+                    if not await navigate_to_keyword(session, self.url, keyword, self.yielded, self.navigation,
+                                                     self.maximum_items):
+                        if visited == 1:
+                            break
+                        continue
+                    logging.info("starting scroll & collect")
+                    # scroll through the page to collect all the elements relevant to us
+                    batches = self.card_batches(session)
+                    try:
+                        async for batch in batches:
+                            cards += batch
+                            async for item in self.items(batch, streak):
+                                if self.yielded >= self.maximum_items:
+                                    logging.info(f"Stopping now because YIELDED_ITEMS reached maximum ({self.yielded} / {self.maximum_items})")
+                                    break  # Stop the generator if the maximum number of items has been reached
+                                ### YIELDED ITEM
+                                fresh += 1
+                                yield item  # run() counts it in self.yielded
+                            if self.enough(streak):
+                                break  # no need to scroll any further
+                    finally:
+                        await batches.aclose()
+                finally:
+                    self.record_visit(keyword, fresh, cards, started)
+                if not await DRIVER_POOL.maintain(session):  # too much memory: go on with a fresh driver
+                    await DRIVER_POOL.release(session, reusable=False)
+                    session = None
+                    session = await self.acquire_session()
+        except Exception as e:
+            reusable = False
+            logging.exception(f"An error occured")
+        finally:
+            if session is not None:
+                logging.info("Releasing driver")
+                await DRIVER_POOL.release(session, reusable=reusable)
+
+    async def keyword_worker(self, queue):
+        """
+        Collect the keywords handed over by the planner on a driver of its own, and push their valid items to the queue
+        shared with collect_concurrently. The queue being bounded, a worker waits for the consumer when it falls behind.
+        A None is pushed last, to signal that this worker is done, preceded by the error that stopped the worker if any.
+        Nothing is pushed once collect_concurrently cancelled the worker, it does not read the queue anymore
+        """
+        session = None
+        reusable = True
+        error = None
+        signal = True
+        try:
+            while reusable:
+                keyword = self.planner.next_keyword(self.yielded)
+                if keyword is None:
+                    break
+                if session is None:
+                    session = await self.acquire_session()
+                started, fresh, cards = time.monotonic(), 0, []
+                try:
+                    if await navigate_to_keyword(session, self.url, keyword, self.yielded, self.navigation,
+                                                 self.maximum_items):
+                        streak = RejectionStreak(self.max_consecutive_old_posts)
+                        batches = self.card_batches(session)
+                        try:
+                            async for batch in batches:
+                                cards += batch
+                                async for item in self.items(batch, streak):
+                                    fresh += 1
+                                    await queue.put(item)
+                                if self.enough(streak):
+                                    break  # no need to scroll any further
+                        finally:
+                            await batches.aclose()
+                except Exception as e:
+                    reusable, error = False, e  # this driver is done, the other workers go on with the next keywords
+                    logging.exception(f"[Sina Weibo] An error occured while collecting {keyword}")
+                finally:
+                    self.record_visit(keyword, fresh, cards, started)
+                if reusable and not await DRIVER_POOL.maintain(session):  # too much memory: the next keyword gets a
+                    await DRIVER_POOL.release(session, reusable=False)  # fresh driver
+                    session = None
+        except asyncio.CancelledError:
+            signal = False
+            raise
+        except Exception as e:
+            error = e
+            logging.exception("[Sina Weibo] A keyword worker failed")
+        finally:
+            if session is not None:
+                await DRIVER_POOL.release(session, reusable=reusable)
+            if signal:
+                if error is not None:
+                    await queue.put(error)
+                await queue.put(None)
+
+    async def collect_concurrently(self):
+        """
+        Search several keywords at once, each worker on its own driver, and merge their items into a single stream.
+        `parallelism` workers take the keywords handed over by the planner, until it says stop.
+        :return: asynchronously yields the valid items of all the keywords, in the order they are collected
+        :raise Exception: the error of the first worker, when every worker failed before a single item was collected
+        """
+        logging.info(f"[Sina Weibo] Searching {self.parallelism} keywords concurrently")
+        queue = asyncio.Queue(maxsize=self.parallelism)  # the workers do not scrape far ahead of what run() yields
+        tasks = [asyncio.create_task(self.keyword_worker(queue)) for _ in range(self.parallelism)]
+        running = len(tasks)
+        errors, collected = [], 0
+        try:
+            while running:
+                item = await queue.get()
+                if item is None:
+                    running -= 1
+                    continue
+                if isinstance(item, Exception):
+                    errors.append(item)
+                    continue
+                collected += 1
+                yield item
+            if len(errors) == len(tasks) and not collected:
+                raise errors[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self) -> AsyncGenerator[Item, None]:
+        """
+        Collect the keywords with the configured engine, falling back to Chrome if the http engine hits the login wall.
+        Keywords are visited until the deadline of the run or until we have maximum_items, see CollectionPlanner.
+        :return: asynchronously yields the new items, up to maximum_items
+        """
         logging.info("")
-        logging.info("== END OF QUERY PROCEDURE ==")
         logging.info("")
-    except Exception as e:
-        logging.exception(f"An error occured")
+        logging.info("== NEW QUERY INSTANCE ==")
+        DRIVER_POOL.configure(**self.pool_parameters)
+        RATE_CONTROLLERS.configure(**self.pacing_parameters)
+        self.planner = CollectionPlanner(self.scheduler, self.keywords, self.maximum_items, self.deadline_seconds)
+
+        use_http = self.engine == "http"
+        use_client_session()
+        try:
+            while True:
+                if use_http:
+                    stream = self.collect_http()
+                elif self.parallelism > 1:
+                    stream = self.collect_concurrently()
+                else:
+                    stream = self.collect_sequentially()
+                try:
+                    async for item in stream:
+                        self.yielded += 1
+                        self.metrics.count("items_yielded")
+                        logging.debug(f"Found {self.yielded} new posts for this query instance")
+                        self.mark_seen(item)
+                        yield item
+                        if self.yielded >= self.maximum_items:
+                            logging.info(f"Stopping now because YIELDED_ITEMS reached maximum ({self.yielded} / {self.maximum_items})")
+                            break
+                    break
+                except LoginWallError as e:
+                    logging.info(f"[Sina Weibo http] {e}, falling back to the Chrome engine")
+                    use_http = False
+                finally:
+                    await stream.aclose()  # stops what is still running and gives the drivers back to the pool
+            logging.info("")
+            logging.info("== END OF QUERY PROCEDURE ==")
+            logging.info("")
+        finally:
+            await release_client_session()
+            self.seen.flush()
+            self.scheduler.save()
+            self.metrics.budget = self.planner.log_report()
+            self.metrics.pacing_rate = RATE_CONTROLLERS.rate
+            if len(self.proxies):
+                logging.info(f"[Sina Weibo proxies] {self.proxies.summary()}")
+            publish_metrics(self.metrics, self.metrics_callback, self.metrics_path, self.metrics_aggregate)
+
+
+async def query(parameters: dict) -> AsyncGenerator[Item, None]:
+    """
+    Perform asynchronous queries on the specified list of keywords and yield results as soon as they are collected.
+    Every call runs its own WeiboCollector, several queries can run at once in the same process.
+    :param parameters: the settings of the run, see the read_*parameters functions
+    :return: asynchronously yields the results per keyword. Starts with an initial search than moves on to the next keywords automatically
+    """
+    async for item in WeiboCollector(parameters).run():
+        yield item
+
+
+class WeiboWatcher(WeiboCollector):
+    """
+    Watch mode: keep the drivers on the realtime results of the keywords and refresh them on an adaptive interval, see
+    watch.py. The keywords are spread over `parallelism` workers, each one with its own driver (none with the http
+    engine). maximum_items_to_collect and the deadline do not apply, the stream only ends when the consumer closes it.
+    """
+
+    def __init__(self, parameters):
+        super().__init__(parameters)
+        self.min_refresh_seconds, self.max_refresh_seconds, self.queue_size, self.metrics_interval = \
+            read_watch_parameters(parameters)
+        self.watches = [KeywordWatch(keyword, self.min_refresh_seconds, self.max_refresh_seconds)
+                        for keyword in dedupe(self.keywords)]
+
+    async def refresh(self, session, watch):
+        """
+        Load the realtime results of a keyword again, down to its watermark
+        :param session: the DriverSession of the worker, None with the http engine
+        :return: the data of the cards, see extract_cards
+        """
+        max_oldness_seconds = watch.max_oldness_seconds(self.max_oldness_seconds)
+        if session is None:
+            return await self.fetch(watch.keyword, max_oldness_seconds, max_pages=1)
+        session.metrics = self.metrics  # replaced every time the metrics are published
+        # a warm session loads the results url, which refreshes the page when it is already on it
+        if not await navigate_to_keyword(session, self.url, watch.keyword, 0, ("direct",) + self.navigation[1:]):
+            return []
+        cards = []
+        batches = scroll_stream(session, self.min_post_length, max_oldness_seconds, 1, self.navigation[2])
+        try:
+            async for batch in batches:
+                cards += batch
+        finally:
+            await batches.aclose()
+        return cards
+
+    async def watch_worker(self, watches, queue):
+        """
+        Refresh the keywords of this worker forever, each one when it is due, and push the new items to the queue shared
+        with run(). The queue being bounded, a worker waits for the consumer when it falls behind. A worker that cannot
+        go on (no driver would start) pushes its error instead, run() raises it.
+        """
+        session = None
+        try:
+            while True:
+                watch = min(watches, key=lambda watch: watch.due_at)
+                delay = watch.due_at - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if session is None and self.engine != "http":
+                    session = await self.acquire_session()
+                new_posts = 0
+                try:
+                    new_cards = watch.select(await self.refresh(session, watch), PageClock())
+                    async for item in process_and_send(new_cards, 0, self.seen, self.max_oldness_seconds,
+                                                       self.min_post_length, self.normalizer, self.metrics, None,
+                                                       self.near_duplicates, self.near_duplicate_mode, self.claimed):
+                        new_posts += 1
+                        await queue.put(item)
+                except LoginWallError as e:
+                    logging.info(f"[Sina Weibo http] {e}, falling back to the Chrome engine")
+                    self.engine = "chrome"
+                except Exception:
+                    logging.exception(f"[Sina Weibo watch] An error occured while refreshing {watch.keyword}")
+                    if session is not None:
+                        await DRIVER_POOL.release(session, reusable=False)
+                        session = None
+                finally:
+                    interval = watch.refreshed(new_posts)
+                    logging.info(f"[Sina Weibo watch] {watch.keyword}: {new_posts} new posts, next refresh in "
+                                 f"{interval:.0f}s")
+                if session is not None and not await DRIVER_POOL.maintain(session):
+                    await DRIVER_POOL.release(session, reusable=False)
+                    session = None
+        except Exception as e:
+            logging.exception("[Sina Weibo watch] A watch worker failed")
+            await queue.put(e)
+        finally:
+            if session is not None:
+                await DRIVER_POOL.release(session)
+
+    def publish(self):
+        self.seen.flush()
+        self.metrics.pacing_rate = RATE_CONTROLLERS.rate
+        publish_metrics(self.metrics, self.metrics_callback, self.metrics_path, self.metrics_aggregate)
+        self.metrics = QueryMetrics()
+
+    async def run(self) -> AsyncGenerator[Item, None]:
+        """
+        :return: asynchronously yields the new posts of the keywords, forever
+        :raise Exception: the error of a worker that could not go on
+        """
+        logging.info("== NEW WATCH INSTANCE ==")
+        if not self.watches:
+            return
+        DRIVER_POOL.configure(**self.pool_parameters)
+        RATE_CONTROLLERS.configure(**self.pacing_parameters)
+        workers = min(self.parallelism, len(self.watches))
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        use_client_session()
+        tasks = [asyncio.create_task(self.watch_worker(self.watches[i::workers], queue)) for i in range(workers)]
+        published_at = time.monotonic()
+        try:
+            while True:
+                item = await queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                self.yielded += 1
+                self.metrics.count("items_yielded")
+                self.mark_seen(item)
+                yield item
+                if time.monotonic() - published_at >= self.metrics_interval:
+                    self.publish()
+                    published_at = time.monotonic()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await release_client_session()
+            self.publish()
+            logging.info("== END OF WATCH PROCEDURE ==")
+
+
+async def watch(parameters: dict) -> AsyncGenerator[Item, None]:
+    """
+    Follow the keywords continuously: the same parameters as query(), plus watch_min_refresh_seconds,
+    watch_max_refresh_seconds, watch_queue_size and watch_metrics_interval_seconds
+    :return: asynchronously yields the posts as they are published, until the consumer stops iterating
+    """
+    async for item in WeiboWatcher(parameters).run():
+        yield item
+
+
+async def sharded_query(parameters: dict) -> AsyncGenerator[Item, None]:
+    """
+    Split the keywords across `shards` worker processes, each one running query() on its share with its own drivers,
+    see sharded.py. Their items are merged into a single stream: a post met by several workers is yielded once, and
+    maximum_items_to_collect applies to the merged stream. The metrics of the workers are merged and published as the
+    metrics of this run.
+    :param parameters: the same parameters as query(), plus shards and max_restarts
+    :return: asynchronously yields the results of every worker, as they come
+    """
+    logging.info("== NEW SHARDED QUERY INSTANCE ==")
+    max_oldness_seconds, maximum_items, _, keywords, url, _ = read_parameters(parameters)
+    if "weibo.com" not in url:
+        raise ValueError("Not a Sina Weibo URL")
+    shards, max_restarts = read_shard_parameters(parameters)
+    metrics_callback, metrics_path, metrics_aggregate = read_metrics_parameters(parameters)
+    seen = get_seen_cache(read_seen_cache_path(parameters))
+    keyword_stats_path = read_keyword_stats_path(parameters)
+    run = ShardedRun(dict(parameters or {}, keywords=dedupe(keywords), keyword_stats_path=keyword_stats_path), shards,
+                     max_restarts)
+    scheduler = get_keyword_scheduler(keyword_stats_path) if keyword_stats_path else None
+    if scheduler is not None:  # every shard starts from the statistics of its keywords, and they are merged back
+        for shard_parameters in run.shard_parameters:
+            scheduler.export(shard_parameters["keyword_stats_path"], shard_parameters["keywords"])
+    metrics = QueryMetrics()
+    yielded = set()  # post keys of the items yielded so far
+    messages = run.messages_stream()
+    try:
+        async for kind, shard, payload in messages:
+            if kind == "metrics":
+                if payload:
+                    metrics.merge(payload)
+                continue
+            key = post_key(payload['url'])
+            if key in yielded:
+                metrics.reject("already_seen")
+                continue
+            yielded.add(key)
+            seen.add(key, max_oldness_seconds)
+            yield payload
+            if len(yielded) >= maximum_items:
+                logging.info(f"[Sina Weibo shards] Reached {maximum_items} items, stopping the workers")
+                break
     finally:
-        logging.info("Closing driver")
-        DRIVER.close()
+        await messages.aclose()
+        seen.flush()
+        if scheduler is not None:
+            for shard_parameters in run.shard_parameters:
+                scheduler.merge(shard_parameters["keyword_stats_path"])
+            scheduler.save()
+        metrics.counters["items_yielded"] = len(yielded)  # the workers count the duplicates too
+        logging.info(f"[Sina Weibo shards] {len(yielded)} items from {len(run.shard_parameters)} shards, "
+                     f"{sum(run.restarts.values())} restarts")
+        publish_metrics(metrics, metrics_callback, metrics_path, metrics_aggregate)
+        logging.info("== END OF SHARDED QUERY PROCEDURE ==")
@@ -0,0 +1,78 @@
+"""
+Lean browser profile for the Sina Weibo collector.
+
+All we read on a Weibo page is the text of its div.card elements, yet Chromium downloads and runs everything the page
+references: stylesheets, web fonts, pictures, videos, ads and analytics scripts. The lean profile:
+
+    - blocks the requests matching a configurable list of URL patterns, through the DevTools protocol
+      (Network.setBlockedURLs). The patterns cover the resource types we do not need by their extension, and the known
+      ad / analytics hosts. The command only applies to the tab that is current when it is sent: the search bar of a
+      result page opens the results in a new tab, DriverSession.switch_to_window sends it again there. The first load
+      of that tab happens before we can reach it, only the loads that follow in it are lean;
+    - turns off the Chrome features a scraper has no use for (extensions, background networking, sync, component
+      updates, audio, GPU), and caps the number and the JavaScript heap of the renderer processes.
+"""
+import logging
+
+DEFAULT_RENDERER_MEMORY_MB = 512  # V8 heap limit of a renderer process
+
+DEFAULT_BLOCKED_URLS = [
+    # stylesheets and web fonts, the cards are in the DOM without them
+    "*.css", "*.css?*", "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    # pictures, videos and sounds
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg", "*.ico", "*.mp4", "*.m3u8", "*.ts", "*.webm", "*.mp3",
+    "*.sinaimg.cn/*", "*video.weibocdn.com/*",
+    # ads and analytics
+    "*beacon.sina.com.cn/*", "*sax.sina.com.cn/*", "*d1.sina.com.cn/*", "*adbox.sina.com.cn/*",
+    "*google-analytics.com/*", "*googletagmanager.com/*", "*doubleclick.net/*", "*hm.baidu.com/*", "*cnzz.com/*",
+]
+
+LEAN_ARGUMENTS = [
+    "--disable-extensions",
+    "--disable-component-extensions-with-background-pages",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-domain-reliability",
+    "--disable-client-side-phishing-detection",
+    "--disable-breakpad",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--disable-features=AudioServiceOutOfProcess,MediaRouter,OptimizationHints,Translate",
+    "--disable-gpu",
+    "--disable-software-rasterizer",
+    "--blink-settings=imagesEnabled=false",
+    "--renderer-process-limit=1",
+]
+
+
+def lean_arguments(renderer_memory_mb=DEFAULT_RENDERER_MEMORY_MB):
+    """
+    :param renderer_memory_mb: the V8 heap limit of the renderer, None to keep Chrome's default
+    :return: the Chrome command line arguments of the lean profile
+    """
+    arguments = list(LEAN_ARGUMENTS)
+    if renderer_memory_mb:
+        arguments.append(f"--js-flags=--max-old-space-size={int(renderer_memory_mb)}")
+    return arguments
+
+
+def block_urls(driver, patterns):
+    """
+    Make the current tab of the browser fail every request matching one of the patterns, before it is sent. The patterns
+    are kept on the driver (blocked_urls), to be sent again to the tabs it switches to
+    :param driver: a Chrome WebDriver
+    :param patterns: URL patterns, "*" matching any sequence of characters
+    """
+    if not patterns:
+        return
+    driver.blocked_urls = list(patterns)
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+        logging.info(f"[Sina Weibo Init Driver]\tBlocking {len(patterns)} URL patterns")
+    except Exception as e:
+        logging.info(f"[Sina Weibo Init Driver]\tCould not block URLs through the DevTools protocol: {e}")
@@ -0,0 +1,127 @@
+"""
+Bulk card extraction for the Sina Weibo collector.
+
+Reading a card through WebDriver element calls costs 5+N round trips to chromedriver (username, content, the "from"
+container, its links, then href + text for every link). A result page holds all its cards in the DOM already, so we read
+every card in a single execute_script call instead and get plain data back.
+
+The cheap field-level filters (content length, publish time clearly older than the cutoff) also run inside that call, so
+cards we would drop anyway are never sent back. The same call also returns the link to the next result page, if there is one.
+
+In incremental mode (extract_new_cards) the call first scrolls, then reads the cards that showed up since the previous
+call only: every card it reads is marked with a data-collected attribute and skipped afterwards. The collector can then
+hand the items of a page over after every scroll step instead of once the whole page is loaded.
+"""
+import logging
+
+from .timestamps import JUST_NOW, RELATIVE_UNITS
+
+CARDS_SCRIPT = """
+var minLength = arguments[0];
+var maxAgeMinutes = arguments[1];
+var RELATIVE_UNITS = arguments[2];  // {"秒前": 1, "分钟前": 60, "小时前": 3600}
+var JUST_NOW = arguments[3];
+var onlyNew = arguments[4];  // skip (and mark) the cards read by a previous call
+var scrollShare = arguments[5];  // scroll down by this share of the viewport first, if set
+var result = {cards: [], rejected: {no_url: 0, no_time: 0, too_old: 0, too_short: 0}, next_page: null, count: 0};
+
+if (scrollShare) { window.scrollBy(0, Math.round(window.innerHeight * scrollShare)); }
+
+// lower bound of the age of a post in minutes: exact for relative times, absolute dates are only shown after an hour
+function minimumAgeMinutes(time) {
+    if (time.indexOf(JUST_NOW) === 0) { return 0; }
+    for (var unit in RELATIVE_UNITS) {
+        if (time.indexOf(unit) !== -1) { return parseInt(time, 10) * RELATIVE_UNITS[unit] / 60; }
+    }
+    return 60;
+}
+
+function firstWithClass(root, tag, className) {
+    var nodes = root.getElementsByTagName(tag);
+    for (var i = 0; i < nodes.length; i++) {
+        if (nodes[i].getAttribute('class') === className) { return nodes[i]; }
+    }
+    return null;
+}
+
+var cards = document.getElementsByTagName('div');
+for (var i = 0; i < cards.length; i++) {
+    var card = cards[i];
+    if (card.getAttribute('class') !== 'card') { continue; }
+    result.count++;
+    if (onlyNew) {
+        if (card.getAttribute('data-collected') !== null) { continue; }
+        card.setAttribute('data-collected', '1');
+    }
+
+    var from = firstWithClass(card, 'div', 'from');
+    var url = null, time = null;
+    if (from !== null) {
+        var links = from.querySelectorAll('a[href]');
+        for (var j = 0; j < links.length; j++) {
+            if (links[j].href.indexOf('refer_flag') !== -1) {
+                url = links[j].href;
+                time = links[j].innerText.trim();
+                break;
+            }
+        }
+    }
+    if (url === null) { result.rejected.no_url++; continue; }
+
+    if (time === '') { result.rejected.no_time++; continue; }
+    if (minimumAgeMinutes(time) > maxAgeMinutes) { result.rejected.too_old++; continue; }
+
+    var txt = firstWithClass(card, 'p', 'txt');
+    var text = txt === null ? '' : txt.innerText;
+    if (text.length < minLength) { result.rejected.too_short++; continue; }
+
+    var nick = card.querySelector('a[nick-name]');
+    result.cards.push({
+        username: nick === null ? null : nick.innerText,
+        text: text,
+        url: url,
+        time: time
+    });
+}
+var next = document.querySelector('.m-page a.next');
+if (next !== null && next.href) { result.next_page = next.href; }
+if (scrollShare) { result.bottom = window.innerHeight + window.scrollY >= document.documentElement.scrollHeight - 2; }
+return result;
+"""
+
+# one scroll step: scroll down by a share of the viewport, then report the number of cards and whether we hit the bottom
+SCROLL_STEP_SCRIPT = """
+window.scrollBy(0, Math.round(window.innerHeight * arguments[0]));
+var count = document.evaluate("count(//div[@class='card'])", document, null, XPathResult.NUMBER_TYPE, null).numberValue;
+var bottom = window.innerHeight + window.scrollY >= document.documentElement.scrollHeight - 2;
+return [count, bottom];
+"""
+
+
+async def extract_cards(session, min_post_length, max_age_minutes):
+    """
+    Read every card of the current page in one WebDriver round trip
+    :param session: the DriverSession parked on a result page
+    :param min_post_length: cards whose content is shorter than this are dropped
+    :param max_age_minutes: cards that were surely published more than this amount of minutes ago are dropped, the exact
+    check is left to PageClock
+    :return: {"cards": a list of {username, text, url, time} dicts, one per card that passed the filters,
+              "rejected": the number of cards dropped per reason,
+              "next_page": the url of the next result page, None on the last page}
+    """
+    result = await session.execute_script(CARDS_SCRIPT, min_post_length, max_age_minutes, RELATIVE_UNITS, JUST_NOW)
+    logging.info(f"[Sina Weibo extract] {len(result['cards'])} cards kept, rejected: {result['rejected']}")
+    return result
+
+
+async def extract_new_cards(session, min_post_length, max_age_minutes, scroll_share=None):
+    """
+    Incremental variant of extract_cards: read the cards that were not read by a previous call on the same page
+    :param scroll_share: scroll down by this share of the viewport before reading the cards, None to stay in place
+    :return: the extract_cards result, plus "count" (the number of cards on the page) and, after a scroll, "bottom"
+    (True if we reached the bottom of the page)
+    """
+    result = await session.execute_script(CARDS_SCRIPT, min_post_length, max_age_minutes, RELATIVE_UNITS, JUST_NOW, True,
+                                          scroll_share)
+    logging.debug(f"[Sina Weibo extract] {len(result['cards'])} new cards kept, rejected: {result['rejected']}")
+    return result
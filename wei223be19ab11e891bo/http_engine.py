@@ -0,0 +1,323 @@
+"""
+Browserless collection engine for the Sina Weibo collector.
+
+Everything we read on a realtime result page is already in the card markup served by s.weibo.com:
+
+<div class="card">
+    <a nick-name="..."/> : username
+    <p class="txt"/> : content of the post
+    <div class="from">
+        <a href=[link]?refer_flag=.../> : publish time of the post (time since the post was released)
+    </div>
+</div>
+
+So instead of driving a headless Chrome we can fetch the result pages directly through a pooled aiohttp session and
+parse the cards ourselves. The output is the same card data as extract_cards, so process_and_send works unchanged, and
+the link to the next result page (.m-page a.next) is read the same way, so that the http engine follows max_pages too.
+
+When Weibo answers with its login / visitor wall instead of results, a LoginWallError is raised so that query() can fall
+back to the Chrome engine. So does a throttling status (ThrottledError), any other error status raises as is: neither is
+parsed as a page without results.
+"""
+import asyncio
+import logging
+import re
+import weakref
+from html.parser import HTMLParser
+from urllib.parse import quote, urljoin
+
+from .metrics import QueryMetrics
+from .timestamps import PageClock
+
+REQUEST_TIMEOUT_SECONDS = 30
+MAX_CONNECTIONS = 8
+
+# markers of the pages Weibo serves instead of the results when it wants us to log in
+LOGIN_WALL_URL_MARKERS = ("passport.weibo.com", "login.php", "login.sina.com.cn")
+LOGIN_WALL_PAGE_MARKERS = ("Sina Visitor System", "passport.weibo.com/visitor")
+THROTTLING_STATUSES = (403, 418, 429)  # what Weibo answers a client it rate limits
+
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track",
+                 "wbr"}
+WHITESPACES = re.compile(r"[ \t\r\f\v]*\n[ \t\r\f\v\n]*|[ \t\r\f\v]+")
+
+CLIENT_SESSIONS = weakref.WeakKeyDictionary()  # one pooled aiohttp session per running event loop
+CLIENT_USERS = weakref.WeakKeyDictionary()  # the runs using the session of each loop, the last one closes it
+
+
+class LoginWallError(Exception):
+    """
+    Raised when Weibo serves a login / visitor page instead of the realtime results
+    """
+
+
+class ThrottledError(LoginWallError):
+    """
+    Raised when Weibo answers with a throttling status, the http engine is not welcome anymore either
+    """
+
+
+class CardParser(HTMLParser):
+    """
+    Collect the raw fields of every <div class="card"> of a result page, following the same rules as the Chrome
+    extraction: first a[nick-name], first p.txt, first div.from and its first link containing refer_flag. The link to the
+    next result page is the first a.next within .m-page
+    """
+
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.cards = []
+        self.next_page = None
+        self.pages_depth = None  # depth of the .m-page element, while we are inside of it
+        self.depth = 0
+        self.card = None  # the card being parsed
+        self.card_depth = None
+        self.from_depth = None  # depth of the div.from of the current card, while we are inside of it
+        self.captures = []  # (field, depth) of the fields whose text is being collected
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            if tag == "br":
+                self.handle_data("\n")
+            return
+        self.depth += 1
+        attributes = dict(attrs)
+        css_class = attributes.get("class")
+
+        classes = (css_class or "").split()
+        if "m-page" in classes and self.pages_depth is None:
+            self.pages_depth = self.depth
+        elif tag == "a" and "next" in classes and self.pages_depth is not None and self.next_page is None:
+            if attributes.get("href"):
+                self.next_page = urljoin(self.base_url, attributes["href"])
+
+        if self.card is None:
+            if tag == "div" and css_class == "card":
+                self.card = {"username": None, "text": None, "url": None, "time": None, "has_from": False}
+                self.card_depth = self.depth
+            return
+
+        if tag == "a" and "nick-name" in attributes and self.card["username"] is None:
+            self.start_capture("username")
+        elif tag == "p" and css_class == "txt" and self.card["text"] is None:
+            self.start_capture("text")
+        elif tag == "div" and css_class == "from" and not self.card["has_from"]:
+            self.card["has_from"] = True
+            self.from_depth = self.depth
+        elif tag == "a" and self.from_depth is not None and self.card["url"] is None:
+            href = attributes.get("href")
+            if href and "refer_flag" in href:
+                self.card["url"] = urljoin(self.base_url, href)
+                self.start_capture("time")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        if self.pages_depth is not None and self.depth <= self.pages_depth:
+            self.pages_depth = None
+        if self.card is not None:
+            while self.captures and self.captures[-1][1] >= self.depth:
+                field, _ = self.captures.pop()
+                self.card[field] = WHITESPACES.sub(
+                    lambda m: "\n" if "\n" in m.group() else " ", "".join(self.card[field])).strip()
+            if self.from_depth is not None and self.depth <= self.from_depth:
+                self.from_depth = None
+            if self.depth <= self.card_depth:
+                self.close_card()
+        self.depth = max(0, self.depth - 1)
+
+    def handle_data(self, data):
+        for field, _ in self.captures:
+            self.card[field].append(data)
+
+    def start_capture(self, field):
+        self.card[field] = []
+        self.captures.append((field, self.depth))
+
+    def close_card(self):
+        for field, _ in self.captures:
+            self.card[field] = "".join(self.card[field]).strip()
+        self.card.pop("has_from")
+        self.cards.append(self.card)
+        self.card = None
+        self.card_depth = None
+        self.from_depth = None
+        self.captures = []
+
+
+def parse_page(html, base_url):
+    """
+    :param html: the html of a realtime result page
+    :param base_url: the url of that page, used to resolve the (protocol relative) links
+    :return: the raw {username, text, url, time} fields of every card, missing fields being None, and the url of the next
+    result page (None on the last one)
+    """
+    parser = CardParser(base_url)
+    parser.feed(html)
+    parser.close()
+    return parser.cards, parser.next_page
+
+
+def parse_cards(html, base_url):
+    """
+    :return: the raw fields of every card of a result page, see parse_page
+    """
+    return parse_page(html, base_url)[0]
+
+
+def filter_cards(cards, min_post_length, max_oldness_seconds, clock=None):
+    """
+    Apply the same field-level filters as the Chrome extraction (see extract.CARDS_SCRIPT), the age check being exact
+    :param clock: the PageClock of the page, a new one if None
+    :return: the cards that passed, and a count of the rejected ones per reason
+    """
+    clock = clock or PageClock()
+    cutoff = clock.cutoff(max_oldness_seconds)
+    kept = []
+    rejected = {"no_url": 0, "no_time": 0, "too_old": 0, "too_short": 0}
+    for card in cards:
+        if card["url"] is None:
+            rejected["no_url"] += 1
+            continue
+        publish_time = card["time"] or ""
+        published_at = clock.parse(publish_time)
+        if published_at is None:
+            rejected["no_time"] += 1
+            continue
+        if published_at < cutoff:
+            rejected["too_old"] += 1
+            continue
+        text = card["text"] or ""
+        if len(text) < min_post_length:
+            rejected["too_short"] += 1
+            continue
+        kept.append({"username": card["username"], "text": text, "url": card["url"], "time": publish_time})
+    return kept, rejected
+
+
+def realtime_url(search_url, keyword):
+    return f"{search_url}?q={quote(keyword)}&rd=realtime&tw=realtime&Refer=weibo_realtime"
+
+
+def parse_cookies(cookies):
+    """
+    :param cookies: a dict, or a "name=value; name2=value2" cookie header string
+    :return: the cookies as a dict
+    """
+    if not cookies:
+        return {}
+    if isinstance(cookies, dict):
+        return cookies
+    parsed = {}
+    for pair in cookies.split(";"):
+        if "=" in pair:
+            name, value = pair.split("=", 1)
+            parsed[name.strip()] = value.strip()
+    return parsed
+
+
+def is_login_wall(final_url, html):
+    return any(marker in final_url for marker in LOGIN_WALL_URL_MARKERS) \
+        or any(marker in html for marker in LOGIN_WALL_PAGE_MARKERS)
+
+
+async def get_client_session():
+    """
+    :return: the pooled aiohttp session of the running event loop, created on first use
+    """
+    import aiohttp  # imported on first use, it is heavy and the Chrome engine does not need it
+
+    loop = asyncio.get_running_loop()
+    client = CLIENT_SESSIONS.get(loop)
+    if client is None or client.closed:
+        client = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS),
+        )
+        CLIENT_SESSIONS[loop] = client
+    return client
+
+
+async def close_client_session():
+    client = CLIENT_SESSIONS.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def use_client_session():
+    """
+    Register a run using the pooled session of the running event loop, it must call release_client_session once done
+    """
+    loop = asyncio.get_running_loop()
+    CLIENT_USERS[loop] = CLIENT_USERS.get(loop, 0) + 1
+
+
+async def release_client_session():
+    """
+    Unregister a run using the pooled session of the running event loop, the last one closes the session
+    """
+    loop = asyncio.get_running_loop()
+    users = CLIENT_USERS.pop(loop, 1) - 1
+    if users > 0:
+        CLIENT_USERS[loop] = users
+        return
+    await close_client_session()
+
+
+async def fetch_page(url, user_agent=None, proxy=None, cookies=None):
+    """
+    :return: the html of the page and the url we ended on (after redirects)
+    :raise LoginWallError: if we ended on a login / visitor page
+    :raise ThrottledError: if Weibo answered with one of THROTTLING_STATUSES
+    :raise aiohttp.ClientResponseError: for any other error status
+    """
+    client = await get_client_session()
+    headers = {"User-Agent": user_agent} if user_agent else None
+    async with client.get(url, headers=headers, proxy=proxy, cookies=parse_cookies(cookies)) as response:
+        if response.status in THROTTLING_STATUSES:
+            raise ThrottledError(f"HTTP {response.status} while fetching {url}")
+        response.raise_for_status()
+        html = await response.text()
+        final_url = str(response.url)
+    if is_login_wall(final_url, html):
+        raise LoginWallError(f"Login wall while fetching {url} (ended on {final_url})")
+    return html, final_url
+
+
+async def fetch_results(url, min_post_length, max_oldness_seconds, user_agent=None, proxy=None, cookies=None,
+                        metrics=None):
+    """
+    Fetch a realtime result page and extract its cards, without any browser
+    :param url: the url of the page, see realtime_url
+    :param metrics: the QueryMetrics recording the fetch time and the card counts
+    :return: {"cards", "rejected", "next_page"}, as extract_cards would return
+    """
+    metrics = metrics or QueryMetrics()
+    with metrics.phase("fetch"):
+        html, final_url = await fetch_page(url, user_agent, proxy, cookies)
+    with metrics.phase("extraction"):
+        parsed, next_page = parse_page(html, final_url)
+        cards, rejected = filter_cards(parsed, min_post_length, max_oldness_seconds)
+    metrics.count("cards_seen", len(parsed))
+    for reason, count in rejected.items():
+        if count:
+            metrics.reject(reason, count)
+    logging.info(f"[Sina Weibo http] {len(cards)} cards kept, rejected: {rejected}")
+    return {"cards": cards, "rejected": rejected, "next_page": next_page}
+
+
+async def fetch_cards(keyword, search_url, min_post_length, max_oldness_seconds, user_agent=None, proxy=None,
+                      cookies=None, metrics=None):
+    """
+    Fetch the first page of realtime results of a keyword, see fetch_results
+    :return: a list of {username, text, url, time} dicts, as extract_cards would return
+    """
+    result = await fetch_results(realtime_url(search_url, keyword), min_post_length, max_oldness_seconds, user_agent,
+                                 proxy, cookies, metrics)
+    return result["cards"]
@@ -0,0 +1,179 @@
+"""
+Adaptive keyword scheduler for the Sina Weibo collector.
+
+Some keywords bring fresh posts on nearly every visit while others rarely do, and a visit costs about the same page loads
+either way. The scheduler keeps, per keyword, how many visits it got, how many fresh items they produced, how many cards
+were rejected and how much time was spent on them. It then picks the keywords of a run with UCB1: the best yield per
+minute so far, plus an exploration bonus for the keywords we know little about. Older observations fade out (decay), so
+the picks follow the news.
+
+The statistics are kept in a small JSON file, so that they carry over from one run (and one process) to the next.
+"""
+import json
+import logging
+import math
+import os
+import random
+import threading
+
+DEFAULT_EXPLORATION = 1.0  # weight of the exploration bonus, 0 means always exploit
+DEFAULT_DECAY = 0.98  # every recorded visit multiplies the existing statistics by this factor
+MIN_VISIT_SECONDS = 1.0
+
+
+def dedupe(keywords):
+    """
+    :return: the keywords without duplicates (and blank entries), in their original order
+    """
+    seen = set()
+    unique = []
+    for keyword in keywords:
+        keyword = keyword.strip()
+        if keyword and keyword not in seen:
+            seen.add(keyword)
+            unique.append(keyword)
+    return unique
+
+
+class KeywordScheduler:
+    """
+    Per-keyword yield statistics and an explore/exploit policy built on them
+    """
+
+    def __init__(self, path=None, exploration=DEFAULT_EXPLORATION, decay=DEFAULT_DECAY):
+        """
+        :param path: the JSON file keeping the statistics between runs, None to keep them in memory only
+        :param exploration: weight of the exploration bonus
+        :param decay: factor applied to the existing statistics on every recorded visit
+        """
+        self.path = path
+        self.exploration = exploration
+        self.decay = decay
+        self.lock = threading.Lock()
+        self.stats = {}  # keyword -> {"visits", "fresh", "rejected", "seconds"}
+        if path is not None:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.stats = json.load(f)
+            logging.info(f"[Sina Weibo keywords] Loaded statistics of {len(self.stats)} keywords from {self.path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.info(f"[Sina Weibo keywords] Could not read {self.path}, starting from scratch: {e}")
+
+    def save(self):
+        if self.path is None:
+            return
+        with self.lock:
+            stats = json.dumps(self.stats, ensure_ascii=False)
+        write_stats(self.path, stats)
+
+    def export(self, path, keywords):
+        """
+        Write the statistics of some keywords to another file, e.g. to seed the scheduler of a shard with them
+        """
+        with self.lock:
+            stats = json.dumps({keyword: self.stats[keyword] for keyword in keywords if keyword in self.stats},
+                               ensure_ascii=False)
+        write_stats(path, stats)
+
+    def merge(self, path):
+        """
+        Take over the statistics of the keywords of another file, e.g. the ones a shard updated, and delete it
+        :return: how many keywords were merged
+        """
+        other = KeywordScheduler(path)
+        with self.lock:
+            self.stats.update(other.stats)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return len(other.stats)
+
+    def rate(self, keyword):
+        """
+        :return: the fresh items per minute observed on a keyword, None if it was never visited
+        """
+        stats = self.stats.get(keyword)
+        if not stats or stats["visits"] <= 0:
+            return None
+        return stats["fresh"] * 60 / max(stats["seconds"], MIN_VISIT_SECONDS * stats["visits"])
+
+    def rejection_rate(self, keyword):
+        stats = self.stats.get(keyword)
+        if not stats or stats["fresh"] + stats["rejected"] <= 0:
+            return None
+        return stats["rejected"] / (stats["fresh"] + stats["rejected"])
+
+    def pick(self, keywords, k):
+        """
+        :param keywords: the candidate keywords (duplicates are ignored)
+        :param k: how many keywords we want
+        :return: up to k distinct keywords, the most promising first
+        """
+        candidates = dedupe(keywords)
+        with self.lock:
+            total_visits = sum(self.stats.get(keyword, {}).get("visits", 0) for keyword in candidates)
+            rates = {keyword: self.rate(keyword) for keyword in candidates}
+            best_rate = max([rate for rate in rates.values() if rate is not None] or [0]) or 1.0
+
+            def score(keyword):
+                if rates[keyword] is None:
+                    return math.inf  # never tried, try it
+                visits = self.stats[keyword]["visits"]
+                bonus = best_rate * math.sqrt(2 * math.log(max(total_visits, 1.0) + 1) / visits)
+                return rates[keyword] + self.exploration * bonus
+
+            scores = {keyword: score(keyword) for keyword in candidates}
+        ranked = sorted(candidates, key=lambda keyword: (scores[keyword], random.random()), reverse=True)
+        return ranked[:k]
+
+    def record(self, keyword, fresh, rejected, seconds):
+        """
+        Record a visit of a keyword
+        :param fresh: how many items it yielded
+        :param rejected: how many of its cards were dropped (too old, too short, already collected...)
+        :param seconds: the time spent on it, navigation included
+        """
+        with self.lock:
+            for stats in self.stats.values():
+                for field in stats:
+                    stats[field] *= self.decay
+            stats = self.stats.setdefault(keyword, {"visits": 0.0, "fresh": 0.0, "rejected": 0.0, "seconds": 0.0})
+            stats["visits"] += 1
+            stats["fresh"] += fresh
+            stats["rejected"] += rejected
+            stats["seconds"] += seconds
+        logging.info(f"[Sina Weibo keywords] {keyword}: {fresh} fresh, {rejected} rejected in {seconds:.1f}s")
+
+
+def write_stats(path, stats):
+    """
+    Replace the statistics file at path with the JSON stats, atomically
+    """
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(stats)
+        os.replace(temporary_path, path)
+    except OSError as e:
+        logging.info(f"[Sina Weibo keywords] Could not write {path}: {e}")
+
+
+SCHEDULERS = {}
+SCHEDULERS_LOCK = threading.Lock()
+
+
+def get_keyword_scheduler(path):
+    """
+    :return: the scheduler backed by path, shared by every caller of the process
+    """
+    with SCHEDULERS_LOCK:
+        if path not in SCHEDULERS:
+            SCHEDULERS[path] = KeywordScheduler(path)
+        return SCHEDULERS[path]
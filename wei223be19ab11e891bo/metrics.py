@@ -0,0 +1,197 @@
+"""
+Run metrics for the Sina Weibo collector.
+
+A QueryMetrics is created for every query() run and travels with it: the DriverSessions it uses count their WebDriver
+round trips in it, and the collection steps record how long each phase took and what happened to the cards:
+
+    phases      driver_start, landing, typing, navigation, nav_wait, scroll, extraction, fetch (http engine)
+    counters    cards_seen, items_yielded, near_duplicates (counted, not dropped), webdriver_calls
+    rejections  no_url, no_time, too_old, too_short, already_seen, near_duplicate
+    budget      how the time slot of the run was spent, see CollectionPlanner.report (not merged)
+    pacing_rate the rate of the slowest RateController (one per proxy) at the end of the run, in tokens per second (not
+                merged)
+
+At the end of the run, the metrics are merged into the process-wide AGGREGATE_METRICS (unless disabled), handed to the
+metrics_callback and written in the Prometheus text format to metrics_path, if those parameters are set.
+"""
+import contextlib
+import logging
+import os
+import threading
+import time
+
+PROMETHEUS_PREFIX = "weibo"
+
+
+class QueryMetrics:
+    """
+    Phase timings and counters of a query() run, or of several ones once merged
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.phases = {}  # phase -> [count, total seconds]
+        self.counters = {}  # name -> count
+        self.rejected = {}  # reason -> count
+        self.clusters = {}  # url of a near-duplicate yielded -> its cluster, the url of the first post of the cluster
+        self.budget = None  # CollectionPlanner.report() of the run
+        self.pacing_rate = None  # RateControllers.rate at the end of the run
+
+    def add_time(self, phase, seconds):
+        with self.lock:
+            timing = self.phases.setdefault(phase, [0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        """
+        Time the enclosed block, awaits included
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.monotonic() - started)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reject(self, reason, n=1):
+        with self.lock:
+            self.rejected[reason] = self.rejected.get(reason, 0) + n
+
+    def near_duplicate(self, url, cluster):
+        """
+        Count a near-duplicate yielded, and remember its cluster: the consumers of the metrics can group the posts
+        """
+        with self.lock:
+            self.counters["near_duplicates"] = self.counters.get("near_duplicates", 0) + 1
+            self.clusters[url] = cluster
+
+    def merge(self, other):
+        """
+        Add the timings and counters of other to these ones
+        :param other: a QueryMetrics, or its as_dict() snapshot (e.g. sent by another process)
+        """
+        snapshot = other if isinstance(other, dict) else other.as_dict()
+        with self.lock:
+            self.queries += snapshot["queries"]
+            for phase, (count, seconds) in snapshot["phases"].items():
+                timing = self.phases.setdefault(phase, [0, 0.0])
+                timing[0] += count
+                timing[1] += seconds
+            for name, count in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + count
+            for reason, count in snapshot["rejected"].items():
+                self.rejected[reason] = self.rejected.get(reason, 0) + count
+            self.clusters.update(snapshot.get("clusters", {}))
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "queries": self.queries,
+                "phases": {phase: tuple(timing) for phase, timing in self.phases.items()},
+                "counters": dict(self.counters),
+                "rejected": dict(self.rejected),
+                "clusters": dict(self.clusters),
+                "budget": dict(self.budget) if self.budget else None,
+                "pacing_rate": self.pacing_rate,
+            }
+
+    def summary(self):
+        """
+        :return: a one line overview, for the logs
+        """
+        snapshot = self.as_dict()
+        phases = ", ".join(f"{phase}={seconds:.2f}s" for phase, (_, seconds) in snapshot["phases"].items())
+        budget = snapshot["budget"]
+        if budget:
+            phases += f" budget_used={budget['budget_used']:.0%} stop_reason={budget['stop_reason']}"
+        if snapshot["pacing_rate"] is not None:
+            phases += f" pacing_rate={snapshot['pacing_rate']:.2f}/s"
+        return f"{snapshot['counters']} rejected={snapshot['rejected']} {phases}"
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """
+        :return: the metrics in the Prometheus text exposition format
+        """
+        snapshot = self.as_dict()
+        lines = [
+            f"# HELP {prefix}_queries_total query() runs covered by these metrics",
+            f"# TYPE {prefix}_queries_total counter",
+            f"{prefix}_queries_total {snapshot['queries']}",
+            f"# HELP {prefix}_phase_seconds_total time spent per phase of the collection",
+            f"# TYPE {prefix}_phase_seconds_total counter",
+        ]
+        lines += [f'{prefix}_phase_seconds_total{{phase="{phase}"}} {seconds:.6f}'
+                  for phase, (_, seconds) in sorted(snapshot["phases"].items())]
+        lines += [
+            f"# HELP {prefix}_phase_runs_total times each phase of the collection ran",
+            f"# TYPE {prefix}_phase_runs_total counter",
+        ]
+        lines += [f'{prefix}_phase_runs_total{{phase="{phase}"}} {count}'
+                  for phase, (count, _) in sorted(snapshot["phases"].items())]
+        for name, count in sorted(snapshot["counters"].items()):
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {count}"]
+        lines += [
+            f"# HELP {prefix}_cards_rejected_total cards dropped per reason",
+            f"# TYPE {prefix}_cards_rejected_total counter",
+        ]
+        lines += [f'{prefix}_cards_rejected_total{{reason="{reason}"}} {count}'
+                  for reason, count in sorted(snapshot["rejected"].items())]
+        if snapshot["budget"]:
+            lines += [
+                f"# HELP {prefix}_budget_used_ratio share of the time budget of the last run that was spent",
+                f"# TYPE {prefix}_budget_used_ratio gauge",
+                f"{prefix}_budget_used_ratio {snapshot['budget']['budget_used']:.6f}",
+            ]
+        if snapshot["pacing_rate"] is not None:
+            lines += [
+                f"# HELP {prefix}_pacing_rate tokens per second of the slowest rate controller at the end of the last run",
+                f"# TYPE {prefix}_pacing_rate gauge",
+                f"{prefix}_pacing_rate {snapshot['pacing_rate']:.6f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, prefix=PROMETHEUS_PREFIX):
+        """
+        Write the metrics to path (atomically, for the node_exporter textfile collector for instance)
+        """
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus(prefix))
+            os.replace(temporary_path, path)
+        except OSError as e:
+            logging.info(f"[Sina Weibo metrics] Could not write {path}: {e}")
+
+
+AGGREGATE_METRICS = QueryMetrics()  # every query() run of the process, merged
+
+
+def publish_metrics(metrics, callback=None, path=None, aggregate=True):
+    """
+    Hand the metrics of a finished query() run to their consumers
+    :param metrics: the QueryMetrics of the run
+    :param callback: called with the metrics of the run, if not None
+    :param path: the Prometheus text file to write, if not None. It holds the aggregate when aggregate is True.
+    :param aggregate: merge the run into AGGREGATE_METRICS
+    """
+    metrics.queries = max(metrics.queries, 1)
+    if aggregate:
+        AGGREGATE_METRICS.merge(metrics)
+        AGGREGATE_METRICS.budget = metrics.budget  # a gauge, the last run wins
+        AGGREGATE_METRICS.pacing_rate = metrics.pacing_rate
+        AGGREGATE_METRICS.clusters = dict(metrics.clusters)  # the last run only, the process may run for days
+    logging.info(f"[Sina Weibo metrics] {metrics.summary()}")
+    if callback is not None:
+        try:
+            callback(metrics)
+        except Exception as e:
+            logging.info(f"[Sina Weibo metrics] The metrics callback failed: {e}")
+    if path is not None:
+        (AGGREGATE_METRICS if aggregate else metrics).write_prometheus(path)
@@ -0,0 +1,170 @@
+"""
+Near-duplicate detection for the Sina Weibo collector.
+
+The realtime results of the market keywords are full of copy-pasted spam and of reposts with a few characters changed.
+The seen cache only catches the posts we collected already, by url: the copies are new posts, with their own urls. The
+NearDuplicateIndex compares the contents instead, once normalized:
+
+    - every content gets a MinHash signature of its character n-grams (one permutation hashing: each n-gram is hashed
+      once, into one of SLOTS slots keeping their minimum). The share of equal slots of two signatures estimates the
+      Jaccard similarity of the n-grams of the contents;
+    - the signatures are split in bands, and indexed by band (LSH). A lookup only compares the signatures sharing a band
+      with it, the band size being chosen so that the pairs above the threshold almost always share one;
+    - the entries expire after window_seconds (and past max_entries), the spam waves being short lived.
+
+A post at least `threshold` similar to an indexed one joins its cluster, identified by the url of the first post of the
+cluster. Depending on the near_duplicate_mode parameter, process_and_send drops it, or yields it and records its
+cluster in the metrics (QueryMetrics.clusters, handed to the metrics callback). A post met again (the same url) is not a
+near-duplicate of itself.
+
+The signatures use the str hashes of the process (salted per process), they are only comparable within it, which is all
+the index needs.
+"""
+import collections
+import itertools
+import threading
+import time
+from array import array
+
+DEFAULT_THRESHOLD = 0.7  # estimated Jaccard similarity of the n-grams, a repost with a few characters changed is ~0.8
+DEFAULT_WINDOW_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 20000
+NGRAM = 3
+SLOT_BITS = 5
+SLOTS = 1 << SLOT_BITS
+EMPTY = (1 << 64) - 1
+MASK64 = (1 << 64) - 1
+
+
+def signature(text):
+    """
+    :param text: the normalized content
+    :return: the MinHash signature of its distinct character n-grams, SLOTS integers (EMPTY for the empty slots)
+    """
+    if len(text) <= NGRAM:
+        grams = {text}
+    else:
+        grams = {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+    slots = [EMPTY] * SLOTS
+    for gram in grams:
+        hashed = hash(gram) & MASK64
+        slot = hashed & (SLOTS - 1)
+        value = hashed >> SLOT_BITS
+        if value < slots[slot]:
+            slots[slot] = value
+    return slots
+
+
+def similarity(one, other):
+    """
+    :return: the Jaccard similarity estimated from two signatures, the slots empty in both being left out
+    """
+    matches = empty = 0
+    for a, b in zip(one, other):
+        if a == b:
+            if a == EMPTY:
+                empty += 1
+            else:
+                matches += 1
+    return matches / (SLOTS - empty) if empty < SLOTS else 1.0
+
+
+def band_rows(threshold):
+    """
+    :return: the slots per band: the largest band whose LSH threshold ((1 / bands) ** (1 / rows)) is below `threshold`.
+    Larger bands mean fewer false candidates to compare, smaller ones fewer near-duplicates missed.
+    """
+    for rows in (8, 4, 2):
+        if (rows / SLOTS) ** (1 / rows) <= threshold:
+            return rows
+    return 1
+
+
+class NearDuplicateIndex:
+    """
+    The signatures of the recent posts, with their clusters
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, window_seconds=DEFAULT_WINDOW_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        """
+        :param threshold: two contents at least this similar (0 to 1) are near-duplicates
+        :param window_seconds: how long a post stays in the index
+        :param max_entries: the oldest posts are dropped above this size
+        """
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.band_size = band_rows(threshold) * 8  # bytes of the packed signature per band
+        self.buckets = [{} for _ in range(SLOTS * 8 // self.band_size)]  # per band: band bytes -> {entry id: None}
+        self.entries = collections.OrderedDict()  # entry id -> (expires_at, packed signature, cluster), oldest first
+        self.ids = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def bands(self, packed):
+        return [packed[start:start + self.band_size] for start in range(0, len(packed), self.band_size)]
+
+    def expire(self, now):
+        while self.entries:
+            entry_id, (expires_at, packed, _) = next(iter(self.entries.items()))
+            if expires_at > now and len(self.entries) < self.max_entries:  # room for the entry to add
+                return
+            del self.entries[entry_id]
+            for buckets, band in zip(self.buckets, self.bands(packed)):
+                bucket = buckets[band]
+                del bucket[entry_id]
+                if not bucket:
+                    del buckets[band]
+
+    def check(self, content, url):
+        """
+        Look a post up, then index it
+        :param content: its normalized content
+        :param url: its url, the id of the cluster it starts if it is not a near-duplicate
+        :return: the cluster id (the url of the first post of the cluster) if the post is a near-duplicate, None
+        otherwise
+        """
+        slots = signature(content)
+        packed = array("Q", slots).tobytes()
+        bands = self.bands(packed)
+        with self.lock:
+            now = self.clock()
+            self.expire(now)
+            cluster = None
+            compared = set()
+            for buckets, band in zip(self.buckets, bands):
+                for entry_id in buckets.get(band, ()):
+                    if entry_id in compared:
+                        continue
+                    compared.add(entry_id)
+                    _, other, other_cluster = self.entries[entry_id]
+                    if other_cluster != url and similarity(slots, array("Q", other)) >= self.threshold:
+                        cluster = other_cluster
+                        break
+                if cluster is not None:
+                    break
+            # the near-duplicates are indexed too, the next copy may be closer to them than to the first post
+            entry_id = next(self.ids)
+            self.entries[entry_id] = (now + self.window_seconds, packed, cluster or url)
+            for buckets, band in zip(self.buckets, bands):
+                buckets.setdefault(band, {})[entry_id] = None
+            return cluster
+
+
+NEAR_DUPLICATE_INDEXES = {}  # (threshold, window_seconds) -> NearDuplicateIndex
+NEAR_DUPLICATE_INDEXES_LOCK = threading.Lock()
+
+
+def get_near_duplicate_index(threshold=DEFAULT_THRESHOLD, window_seconds=DEFAULT_WINDOW_SECONDS):
+    """
+    :return: the index with these settings, shared by every caller of the process
+    """
+    with NEAR_DUPLICATE_INDEXES_LOCK:
+        key = (threshold, window_seconds)
+        if key not in NEAR_DUPLICATE_INDEXES:
+            NEAR_DUPLICATE_INDEXES[key] = NearDuplicateIndex(threshold, window_seconds)
+        return NEAR_DUPLICATE_INDEXES[key]
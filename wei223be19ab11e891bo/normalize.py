@@ -0,0 +1,101 @@
+"""
+Post content normalization for the Sina Weibo collector.
+
+The text of a card comes with markup leftovers that are not part of the post:
+
+    U+E627 U+E60B ...        icon font glyphs, in the Private Use Area
+    U+200B U+FEFF ...        zero-width characters
+    [哈哈] [doge]              emoji placeholders, the alt text of the emoji images
+    展开全文c / 收起全文d        the "expand / collapse the full text" links, with their icon
+    #话题#                    the topic markers, turned into spaces
+    and whitespace runs
+
+A TextNormalizer removes all of them with a precompiled regex per character class, a replacement table for the UI text,
+and str.split for the whitespace runs. normalize_batch handles all the cards of a page at once: the texts are joined,
+every pass runs once over the whole batch, and the result is split back. Extra steps (plain
+str -> str callables) can be plugged in after the built-in ones.
+"""
+import re
+
+PRIVATE_USE_AREA = "\ue000-\uf8ff\U000f0000-\U0010ffff"
+ZERO_WIDTH = "\u00ad\u200b-\u200f\u2060-\u2064\ufeff"
+INVISIBLE = re.compile(f"[{PRIVATE_USE_AREA}{ZERO_WIDTH}]+")
+EMOJI_PLACEHOLDER = re.compile(r"\[[\u4e00-\u9fffA-Za-z]{1,6}\]")
+UI_TEXTS = ("展开全文c", "收起全文d", "展开全文", "收起全文")  # with their icon first
+UI_TEXT_MARKER = "全文"
+
+SEPARATOR = "\x00"  # joins the texts of a batch, it is neither removed nor whitespace
+
+
+class TextNormalizer:
+    """
+    A configurable normalization pipeline for the content of the posts
+    """
+
+    def __init__(self, strip_emoji_placeholders=True, strip_ui_text=True, keep_newlines=True, steps=()):
+        """
+        :param strip_emoji_placeholders: remove the [哈哈]-like emoji placeholders
+        :param strip_ui_text: remove the 展开全文 / 收起全文 links
+        :param keep_newlines: collapse the line breaks to a single one instead of a space
+        :param steps: extra str -> str callables, applied in order after the built-in normalization
+        """
+        self.strip_emoji_placeholders = strip_emoji_placeholders
+        self.strip_ui_text = strip_ui_text
+        self.keep_newlines = keep_newlines
+        self.steps = list(steps)
+
+    def remove(self, text):
+        text = INVISIBLE.sub("", text)
+        # the cheap substring checks skip the passes that have nothing to remove
+        if self.strip_ui_text and UI_TEXT_MARKER in text:
+            for ui_text in UI_TEXTS:
+                text = text.replace(ui_text, "")
+        if self.strip_emoji_placeholders and "[" in text:
+            text = EMOJI_PLACEHOLDER.sub("", text)
+        return text
+
+    def collapse(self, text):
+        text = text.replace("#", " ")
+        if self.keep_newlines:
+            lines = (" ".join(line.split()) for line in text.split("\n"))
+            return "\n".join(line for line in lines if line)
+        return " ".join(text.split())
+
+    def normalize(self, text):
+        """
+        :param text: the raw content of a post, None is read as ""
+        :return: the normalized content
+        """
+        text = self.collapse(self.remove(text or "")).strip()
+        for step in self.steps:
+            text = step(text)
+        return text
+
+    def normalize_batch(self, texts):
+        """
+        :param texts: the raw contents of the posts of a page
+        :return: the normalized contents, in the same order
+        """
+        texts = [text or "" for text in texts]
+        joined = SEPARATOR.join(texts)
+        if len(texts) < 2 or joined.count(SEPARATOR) != len(texts) - 1:
+            return [self.normalize(text) for text in texts]
+        normalized = [text.strip() for text in self.collapse(self.remove(joined)).split(SEPARATOR)]
+        for step in self.steps:
+            normalized = [step(text) for text in normalized]
+        return normalized
+
+
+DEFAULT_NORMALIZER = TextNormalizer()
+
+
+def get_normalizer(options=None):
+    """
+    :param options: None for the default pipeline, a dict of TextNormalizer arguments, or a TextNormalizer
+    :return: the TextNormalizer to use
+    """
+    if options is None:
+        return DEFAULT_NORMALIZER
+    if isinstance(options, TextNormalizer):
+        return options
+    return TextNormalizer(**options)
@@ -0,0 +1,176 @@
+"""
+Adaptive pacing for the Sina Weibo collector.
+
+Every action of the collector that Weibo could notice (a keystroke, a pause between two steps, a page load) takes tokens
+from a RateController before it happens. There is one RateController per proxy (see RateControllers), shared by every
+driver and http fetch going through it, Weibo throttling per address. The bucket refills at `rate` tokens per second,
+and holds BURST_TOKENS at most, so that the actions stay spaced like a human's:
+
+    keystroke       KEYSTROKE_TOKENS        one character typed in a search bar
+    pauses          SHORT / MEDIUM / LONG   between two steps (backspaces, scroll steps, before typing, landing page)
+    page load       PAGE_LOAD_TOKENS        a result page loaded by a driver, or fetched by the http engine
+
+The rate follows what Weibo tolerates (AIMD): every page load answered within target_latency_seconds raises it by
+ADDITIVE_STEP tokens per second, a slower one lowers it by SLOW_FACTOR, and a throttling sign (a page without its search
+input or nav bar, a redirect to a login / captcha page) halves it. The decreases are at least DECREASE_COOLDOWN_SECONDS
+apart: the drivers hitting the same wall at once only count once. A throttled proxy only slows down its own drivers.
+
+At the DEFAULT_RATE the pauses match the former fixed random sleeps on average.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+
+KEYSTROKE_TOKENS = 1
+SHORT_TOKENS = 1
+MEDIUM_TOKENS = 2
+LONG_TOKENS = 6
+PAGE_LOAD_TOKENS = 10
+
+DEFAULT_RATE = 5.0  # tokens per second, a keystroke every 0.2s and a page load every 2s
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_RATE = 50.0
+DEFAULT_TARGET_LATENCY_SECONDS = 3.0
+BURST_TOKENS = 1
+ADDITIVE_STEP = 0.5
+SLOW_FACTOR = 0.8
+THROTTLED_FACTOR = 0.5
+DECREASE_COOLDOWN_SECONDS = 10
+JITTER = 0.5  # every wait is drawn within +/- 50% of its nominal length
+
+
+class RateController:
+    """
+    A token bucket whose rate adapts to the page load latencies and to the throttling signs
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, min_rate=DEFAULT_MIN_RATE, max_rate=DEFAULT_MAX_RATE,
+                 target_latency_seconds=DEFAULT_TARGET_LATENCY_SECONDS, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency_seconds = target_latency_seconds
+        self.current_rate = min(max_rate, max(min_rate, rate))
+        self.next_free = float("-inf")  # when the reserved actions are all paid for, see reserve
+        self.decreased_at = None
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def rate(self):
+        """
+        :return: the current rate, in tokens per second
+        """
+        return self.current_rate
+
+    def configure(self, min_rate=None, max_rate=None, target_latency_seconds=None):
+        """
+        Change the bounds of the rate, the controller being shared the last query wins
+        """
+        with self.lock:
+            if min_rate is not None:
+                self.min_rate = min_rate
+            if max_rate is not None:
+                self.max_rate = max(max_rate, self.min_rate)
+            if target_latency_seconds is not None:
+                self.target_latency_seconds = target_latency_seconds
+            self.current_rate = min(self.max_rate, max(self.min_rate, self.current_rate))
+
+    def reserve(self, tokens):
+        """
+        Take tokens from the bucket
+        :return: how long to wait (in seconds) before the action they pay for
+        """
+        with self.lock:
+            now = self.clock()
+            cost = tokens / self.current_rate * random.uniform(1 - JITTER, 1 + JITTER)
+            # next_free - now is the wait of an empty bucket, we keep BURST_TOKENS of credit at most
+            self.next_free = max(self.next_free, now - BURST_TOKENS / self.current_rate) + cost
+            return max(0.0, self.next_free - now)
+
+    async def acquire(self, tokens):
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def loaded(self, seconds):
+        """
+        Record a page load: a fast one raises the rate, a slow one lowers it
+        :param seconds: how long it took
+        """
+        if seconds > self.target_latency_seconds:
+            self.decrease(SLOW_FACTOR, f"slow page load ({seconds:.1f}s)")
+            return
+        with self.lock:
+            self.current_rate = min(self.max_rate, self.current_rate + ADDITIVE_STEP)
+            self.increases += 1
+
+    def throttled(self, reason):
+        """
+        Record a throttling sign: missing elements, login / captcha page
+        """
+        self.decrease(THROTTLED_FACTOR, reason)
+
+    def decrease(self, factor, reason):
+        with self.lock:
+            now = self.clock()
+            if self.decreased_at is not None and now - self.decreased_at < DECREASE_COOLDOWN_SECONDS:
+                return
+            self.decreased_at = now
+            self.current_rate = max(self.min_rate, self.current_rate * factor)
+            self.decreases += 1
+            rate = self.current_rate
+        logging.info(f"[Sina Weibo pacing] {reason}, slowing down to {rate:.2f} tokens/s")
+
+    def summary(self):
+        """
+        :return: {rate, increases, decreases}
+        """
+        with self.lock:
+            return {"rate": self.current_rate, "increases": self.increases, "decreases": self.decreases}
+
+
+class RateControllers:
+    """
+    The RateControllers of the process, one per proxy (None for the direct connection), created on first use
+    """
+
+    def __init__(self, **settings):
+        """
+        :param settings: the RateController arguments of the controllers to come
+        """
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.controllers = {}  # proxy -> RateController
+
+    def get(self, proxy=None):
+        """
+        :return: the RateController pacing the actions going through proxy
+        """
+        with self.lock:
+            if proxy not in self.controllers:
+                self.controllers[proxy] = RateController(**self.settings)
+            return self.controllers[proxy]
+
+    @property
+    def rate(self):
+        """
+        :return: the rate of the slowest controller (the most throttled proxy), in tokens per second
+        """
+        with self.lock:
+            controllers = list(self.controllers.values())
+        return min((controller.rate for controller in controllers), default=self.settings.get("rate", DEFAULT_RATE))
+
+    def configure(self, min_rate=None, max_rate=None, target_latency_seconds=None):
+        """
+        Change the bounds of every controller, see RateController.configure
+        """
+        bounds = {"min_rate": min_rate, "max_rate": max_rate, "target_latency_seconds": target_latency_seconds}
+        with self.lock:
+            self.settings.update({name: value for name, value in bounds.items() if value is not None})
+            controllers = list(self.controllers.values())
+        for controller in controllers:
+            controller.configure(**bounds)
@@ -0,0 +1,131 @@
+"""
+Deadline-aware collection planner for the Sina Weibo collector.
+
+A query() run gets a time slot (a wall-clock deadline) and an item target. The planner hands the keywords over one at a
+time, the most promising first (see KeywordScheduler.pick), and keeps going while the time left is worth another visit:
+
+    - the target is met                         -> stop, "target_reached"
+    - the deadline passed                       -> stop, "deadline"
+    - every keyword was visited                 -> stop, "keywords_exhausted"
+    - no keyword left is expected to fit in the time left -> stop, "no_fitting_keyword"
+
+The expected time and yield of a visit come from the scheduler statistics of the keyword. A keyword we know nothing about
+is expected to take as long as the average visit, and is always worth a try. Keywords that recently yielded next to
+nothing only come once the promising ones are done: the slot is ours anyway, a few items are better than none. At the end
+of the run, report() tells how the slot was spent.
+"""
+import logging
+import time
+
+DEFAULT_VISIT_SECONDS = 30.0  # expected duration of a visit when no keyword was ever visited
+MIN_EXPECTED_ITEMS = 0.5  # keywords expected to yield less than this per visit are visited last
+
+
+class CollectionPlanner:
+    """
+    Picks the next keyword to visit within a time budget, and keeps track of how the budget was spent
+    """
+
+    def __init__(self, scheduler, keywords, target_items, deadline_seconds, clock=time.monotonic):
+        """
+        :param scheduler: the KeywordScheduler holding the per-keyword statistics
+        :param keywords: the candidate keywords
+        :param target_items: we stop handing keywords over once this many items were collected
+        :param deadline_seconds: the time budget of the run, from now on
+        :param clock: the monotonic clock to use
+        """
+        self.scheduler = scheduler
+        self.target_items = target_items
+        self.deadline_seconds = deadline_seconds
+        self.clock = clock
+        self.started_at = clock()
+        self.deadline = self.started_at + deadline_seconds
+        self.pending = scheduler.pick(keywords, len(keywords))  # the most promising first
+        self.in_flight = set()
+        self.visits = []  # (keyword, items, seconds) of every finished visit
+        self.stop_reason = None
+
+    @property
+    def remaining(self):
+        return max(0.0, self.deadline - self.clock())
+
+    def expired(self):
+        return self.clock() >= self.deadline
+
+    def expected_visit(self, keyword):
+        """
+        :return: (expected items, expected seconds) of a visit of the keyword, expected items being None if unknown
+        """
+        stats = self.scheduler.stats.get(keyword)
+        if stats and stats["visits"] > 0:
+            return stats["fresh"] / stats["visits"], stats["seconds"] / stats["visits"]
+        known = [stats for stats in self.scheduler.stats.values() if stats["visits"] > 0]
+        seconds = sum(stats["seconds"] for stats in known) / sum(stats["visits"] for stats in known) if known else \
+            DEFAULT_VISIT_SECONDS
+        return None, seconds
+
+    def next_keyword(self, collected):
+        """
+        :param collected: the items collected so far by the run
+        :return: the keyword to visit next, None when the run should stop (see stop_reason)
+        """
+        if collected >= self.target_items:
+            return self.stop("target_reached")
+        if self.expired():
+            return self.stop("deadline")
+        if not self.pending:
+            return self.stop("keywords_exhausted")
+        remaining = self.remaining
+        fitting = [keyword for keyword in self.pending if self.expected_visit(keyword)[1] <= remaining]
+        if not fitting:
+            return self.stop("no_fitting_keyword")
+        promising = [keyword for keyword in fitting
+                     if self.expected_visit(keyword)[0] is None or self.expected_visit(keyword)[0] >= MIN_EXPECTED_ITEMS]
+        keyword = (promising or fitting)[0]
+        self.pending.remove(keyword)
+        self.in_flight.add(keyword)
+        return keyword
+
+    def stop(self, reason):
+        self.stop_reason = reason
+        return None
+
+    def requeue(self, keyword):
+        """
+        Hand a keyword over again, first, when its visit could not happen
+        """
+        self.in_flight.discard(keyword)
+        self.pending.insert(0, keyword)
+
+    def record(self, keyword, items, seconds):
+        """
+        Record a finished visit
+        """
+        self.in_flight.discard(keyword)
+        self.visits.append((keyword, items, seconds))
+
+    def report(self):
+        """
+        :return: how the time budget of the run was spent
+        """
+        elapsed = self.clock() - self.started_at
+        visiting = sum(seconds for _, _, seconds in self.visits)
+        return {
+            "deadline_seconds": self.deadline_seconds,
+            "elapsed_seconds": elapsed,
+            "visit_seconds": visiting,
+            "unused_seconds": max(0.0, self.deadline_seconds - elapsed),
+            "budget_used": min(1.0, elapsed / self.deadline_seconds) if self.deadline_seconds > 0 else 1.0,
+            "keywords_visited": len(self.visits),
+            "items": sum(items for _, items, _ in self.visits),
+            "target_items": self.target_items,
+            "stop_reason": self.stop_reason or ("deadline" if self.expired() else "stopped"),
+        }
+
+    def log_report(self):
+        report = self.report()
+        logging.info(f"[Sina Weibo planner] {report['items']}/{report['target_items']} items from "
+                     f"{report['keywords_visited']} keywords in {report['elapsed_seconds']:.1f}s of a "
+                     f"{report['deadline_seconds']:.0f}s budget ({report['budget_used']:.0%} used), "
+                     f"stopped on {report['stop_reason']}")
+        return report
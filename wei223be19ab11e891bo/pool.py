@@ -0,0 +1,154 @@
+"""
+Warm driver pool for the Sina Weibo collector.
+
+Cold-starting Chromium + chromedriver and walking the login.php landing page is by far the most expensive part of a
+query() run. The pool keeps the sessions of finished runs alive, still parked on the realtime result page, and hands them
+to the next runs, which can then go straight to their keyword.
+
+Sessions are recycled (quit() and replaced) once they get too old, have served too many runs, fail a health check or
+their proxy got quarantined (see proxies.py). After every keyword, maintain() closes the tabs left behind by the searches
+and checks the resident memory of the browser process tree: a session over max_rss_mb is recycled too, even in the middle
+of a run (see processes.py). A recycled session is always quit(), whatever survives is killed.
+"""
+import asyncio
+import logging
+
+from .metrics import QueryMetrics
+from .session import DriverSession
+
+
+class DriverPool:
+    """
+    A bounded set of idle, warm DriverSessions shared by every query() run of the process
+    """
+
+    def __init__(self, factory, size=1, max_age_seconds=1800, max_uses=25, driver_options=None, proxies=None,
+                 pacers=None, max_rss_mb=None):
+        """
+        :param factory: callable building a new WebDriver (normally init_driver)
+        :param driver_options: keyword arguments passed to the factory
+        :param proxies: the ProxyPool choosing the proxy of every new driver (passed to the factory as proxy=), None for
+        no proxy
+        :param pacers: the RateControllers pacing the sessions, each one is paced by (and reports its page loads to) the
+        controller of its proxy, None for none
+        :param size: how many warm sessions are kept between runs
+        :param max_age_seconds: sessions older than this are quit instead of being reused
+        :param max_uses: sessions that served this many runs are quit instead of being reused
+        :param max_rss_mb: sessions whose process tree holds more resident memory than this are quit, None for no limit
+        """
+        self.factory = factory
+        self.size = size
+        self.max_age_seconds = max_age_seconds
+        self.max_uses = max_uses
+        self.driver_options = driver_options or {}
+        self.proxies = proxies
+        self.pacers = pacers
+        self.max_rss_mb = max_rss_mb
+        self.idle = []
+
+    def configure(self, size=None, max_age_seconds=None, max_uses=None, driver_options=None, max_rss_mb=None):
+        """
+        Change the settings of the pool, new driver_options only apply to the sessions started from now on
+        """
+        if size is not None:
+            self.size = size
+        if max_age_seconds is not None:
+            self.max_age_seconds = max_age_seconds
+        if max_uses is not None:
+            self.max_uses = max_uses
+        if driver_options is not None:
+            self.driver_options = driver_options
+        if max_rss_mb is not None:
+            self.max_rss_mb = max_rss_mb
+
+    def is_expired(self, session):
+        return session.age >= self.max_age_seconds or session.uses >= self.max_uses
+
+    async def acquire(self, metrics=None):
+        """
+        Get a warm session if a healthy one is available, or start a new one
+        :param metrics: the QueryMetrics of the run, the session records its WebDriver calls in it until it is released
+        :return: a DriverSession, owned by the caller until it is given back through release()
+        """
+        metrics = metrics or QueryMetrics()
+        while self.idle:
+            session = self.idle.pop()
+            if self.is_expired(session):
+                logging.info(f"[Sina Weibo pool] Recycling driver (age={int(session.age)}s, uses={session.uses})")
+                await self.evict(session)
+                continue
+            if self.proxies is not None and session.proxy is not None and self.proxies.is_quarantined(session.proxy):
+                logging.info(f"[Sina Weibo pool] Recycling driver, its proxy {session.proxy} is quarantined")
+                await self.evict(session)
+                continue
+            if not await session.is_healthy():
+                await self.evict(session)
+                continue
+            logging.info(f"[Sina Weibo pool] Reusing warm driver (uses={session.uses})")
+            session.metrics = metrics
+            return session
+        logging.info("[Sina Weibo pool] No warm driver available, starting a new one")
+        options = dict(self.driver_options)
+        proxy = self.proxies.choose() if self.proxies is not None else None
+        if proxy is not None:
+            options["proxy"] = proxy
+        with metrics.phase("driver_start"):
+            session = await DriverSession.start(self.factory, **options)
+        session.metrics = metrics
+        session.proxy, session.proxies = proxy, self.proxies
+        session.pacer = self.pacers.get(proxy) if self.pacers is not None else None
+        return session
+
+    async def maintain(self, session):
+        """
+        Tidy a session between two keywords: close its stale tabs, and check the memory of its process tree
+        :return: False if the session should be recycled (over max_rss_mb, or not answering anymore)
+        """
+        try:
+            await session.close_stale_tabs()
+        except Exception as e:
+            logging.info(f"[Sina Weibo pool] Could not close the stale tabs: {e}")
+            return False
+        if not self.max_rss_mb:
+            return True
+        rss_bytes = await asyncio.get_running_loop().run_in_executor(None, session.rss_bytes)
+        if rss_bytes is not None and rss_bytes > self.max_rss_mb * 1024 * 1024:
+            logging.info(f"[Sina Weibo pool] Recycling driver, its processes hold {rss_bytes / 2 ** 20:.0f} MB "
+                         f"(limit {self.max_rss_mb} MB)")
+            session.metrics.count("drivers_recycled_for_memory")
+            return False
+        return True
+
+    async def release(self, session, reusable=True):
+        """
+        Give a session back to the pool
+        :param session: the session obtained through acquire()
+        :param reusable: False if the run ended in a state we do not trust, the session is then quit
+        """
+        if reusable:
+            reusable = await self.maintain(session)
+        session.uses += 1
+        session.metrics = QueryMetrics()  # the run is over, stop counting in its metrics
+        if not reusable or self.is_expired(session) or len(self.idle) >= self.size:
+            await self.evict(session)
+            return
+        self.idle.append(session)
+
+    async def evict(self, session):
+        await session.quit()
+
+    async def close(self):
+        """
+        Quit every idle session
+        """
+        idle, self.idle = self.idle, []
+        await asyncio.gather(*(self.evict(session) for session in idle), return_exceptions=True)
+
+    def shutdown(self):
+        """
+        Synchronous variant of close(), used at interpreter exit when no event loop is running anymore
+        """
+        idle, self.idle = self.idle, []
+        for session in idle:
+            session.terminate()
+
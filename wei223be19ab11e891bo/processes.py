@@ -0,0 +1,102 @@
+"""
+Browser process tree helpers for the Sina Weibo collector.
+
+A driver is a whole tree of processes: chromedriver, the Chrome browser it started, and the zygote, GPU, network and
+renderer processes of the browser. On long-lived workers that tree grows (tabs left open, renderers leaking), and a
+browser that does not answer quit() anymore leaves it all behind. These helpers read the tree from /proc, so that the
+DriverPool can watch its resident memory and kill what survives a quit().
+
+Processes are identified by their pid and their start time, so that a pid reused by an unrelated process in the meantime
+is never killed. Outside of Linux (no /proc) the tree is empty: no memory watchdog, no orphan cleanup.
+"""
+import logging
+import os
+import signal
+
+PROC = "/proc"
+
+
+def read_stat(pid):
+    """
+    :return: (parent pid, start time) of the process, None if it is gone (or a zombie, waiting to be reaped)
+    """
+    try:
+        with open(os.path.join(PROC, str(pid), "stat"), "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    fields = stat[stat.rindex(b")") + 2:].split()  # the process name is between parentheses, and may hold spaces
+    if fields[0] == b"Z":
+        return None
+    return int(fields[1]), int(fields[19])
+
+
+def process_tree(pid):
+    """
+    :param pid: the root of the tree, e.g. the chromedriver process
+    :return: pid -> start time, for the root and all its descendants ({} if the root is gone, or without /proc)
+    """
+    if pid is None or not os.path.isdir(PROC):
+        return {}
+    children, start_times = {}, {}
+    for entry in os.listdir(PROC):
+        if not entry.isdigit():
+            continue
+        stat = read_stat(entry)
+        if stat is not None:
+            children.setdefault(stat[0], []).append(int(entry))
+            start_times[int(entry)] = stat[1]
+    if pid not in start_times:
+        return {}
+    tree, pending = {}, [pid]
+    while pending:
+        current = pending.pop()
+        tree[current] = start_times[current]
+        pending += [child for child in children.get(current, ()) if child in start_times]
+    return tree
+
+
+def tree_rss_bytes(tree):
+    """
+    :param tree: see process_tree
+    :return: the resident memory of the processes of the tree, in bytes
+    """
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for pid in tree:
+        try:
+            with open(os.path.join(PROC, str(pid), "statm")) as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue  # exited in the meantime
+    return total
+
+
+def kill_tree(tree):
+    """
+    Kill the processes of the tree that are still alive
+    :param tree: see process_tree, taken before they were asked to quit
+    :return: how many processes were killed
+    """
+    killed = 0
+    for pid, start_time in tree.items():
+        stat = read_stat(pid)
+        if stat is None or stat[1] != start_time:
+            continue  # gone, or the pid belongs to another process now
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed += 1
+        except OSError:
+            continue
+    if killed:
+        logging.info(f"[Sina Weibo processes] Killed {killed} orphaned browser processes")
+    return killed
+
+
+def driver_pid(driver):
+    """
+    :return: the pid of the chromedriver process of a WebDriver, None if it has none (remote drivers, fakes)
+    """
+    process = getattr(getattr(driver, "service", None), "process", None)
+    pid = getattr(process, "pid", None)
+    return pid if isinstance(pid, int) else None
@@ -0,0 +1,136 @@
+"""
+Shared proxy pool for the Sina Weibo collector.
+
+The proxies are loaded once per process (the HTTP_PROXIES and HTTP_PROXY variables of the .weibo_env file, and the
+"proxy" / "proxies" query parameters) into a ProxyPool shared by every run. The pool scores each proxy from the real page
+loads going through it:
+
+    latency         moving average of the page load times, in seconds
+    success rate    moving average of the outcomes (1 for a load, 0 for a failure or a login / captcha wall)
+
+New drivers (and http fetches) get one of the best scored healthy proxies, latency / success rate being the score. The
+proxies we know nothing about are tried first. A proxy that fails is quarantined, for a backoff that doubles with every
+failure in a row (BASE_QUARANTINE_SECONDS up to MAX_QUARANTINE_SECONDS), and comes back on probation once it is over: a
+single success clears its record, the next failure quarantines it for twice as long.
+"""
+import logging
+import random
+import re
+import threading
+import time
+
+EWMA_WEIGHT = 0.3  # weight of the latest page load in the moving averages
+BASE_QUARANTINE_SECONDS = 30
+MAX_QUARANTINE_SECONDS = 1800
+MIN_SUCCESS_RATE = 0.05
+CHOICE_SPREAD = 1.5  # we choose at random among the proxies scored within this factor of the best one
+
+
+def parse_proxies(text):
+    """
+    :param text: proxy urls separated by commas, spaces or new lines, None for none
+    :return: the proxy urls, in their order
+    """
+    return [proxy for proxy in re.split(r"[\s,]+", text or "") if proxy]
+
+
+class ProxyStats:
+    """
+    What we measured of a proxy
+    """
+
+    def __init__(self):
+        self.latency = None  # seconds, None until a page load succeeded through it
+        self.success_rate = 1.0
+        self.loads = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.quarantined_until = 0.0
+
+    def score(self):
+        if self.latency is None:
+            return 0.0
+        return self.latency / max(self.success_rate, MIN_SUCCESS_RATE)
+
+
+class ProxyPool:
+    """
+    The proxies of the process, with their health, shared by every query() run
+    """
+
+    def __init__(self, proxies=(), clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.proxies = {}  # proxy url -> ProxyStats
+        self.add(proxies)
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def add(self, proxies):
+        """
+        Add proxies to the pool, the ones it holds already keep their statistics
+        """
+        with self.lock:
+            for proxy in proxies:
+                if proxy and proxy not in self.proxies:
+                    self.proxies[proxy] = ProxyStats()
+
+    def is_quarantined(self, proxy, now=None):
+        return self.proxies[proxy].quarantined_until > (self.clock() if now is None else now)
+
+    def choose(self):
+        """
+        :return: a healthy proxy, among the best scored ones. When they are all quarantined, the one coming out of
+        quarantine first. None if the pool is empty.
+        """
+        with self.lock:
+            if not self.proxies:
+                return None
+            now = self.clock()
+            healthy = [proxy for proxy in self.proxies if not self.is_quarantined(proxy, now)]
+            if not healthy:
+                proxy = min(self.proxies, key=lambda proxy: self.proxies[proxy].quarantined_until)
+                logging.info(f"[Sina Weibo proxies] Every proxy is quarantined, using {proxy} anyway")
+                return proxy
+            scores = {proxy: self.proxies[proxy].score() for proxy in healthy}
+            best = min(scores.values())
+            return random.choice([proxy for proxy in healthy if scores[proxy] <= best * CHOICE_SPREAD])
+
+    def report(self, proxy, seconds=None, success=True):
+        """
+        Record the outcome of a page load through a proxy
+        :param proxy: the proxy url, None (no proxy) is ignored
+        :param seconds: how long the load took, for a success
+        :param success: False if the load failed, or landed on a login / captcha wall
+        """
+        if proxy is None:
+            return
+        with self.lock:
+            stats = self.proxies.get(proxy)
+            if stats is None:
+                return
+            stats.loads += 1
+            stats.success_rate += EWMA_WEIGHT * ((1.0 if success else 0.0) - stats.success_rate)
+            if success:
+                stats.consecutive_failures = 0
+                if seconds is not None:
+                    stats.latency = seconds if stats.latency is None else \
+                        stats.latency + EWMA_WEIGHT * (seconds - stats.latency)
+                return
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            backoff = min(MAX_QUARANTINE_SECONDS, BASE_QUARANTINE_SECONDS * 2 ** (stats.consecutive_failures - 1))
+            stats.quarantined_until = self.clock() + backoff
+        logging.info(f"[Sina Weibo proxies] Quarantining {proxy} for {backoff:.0f}s "
+                     f"({stats.consecutive_failures} failures in a row)")
+
+    def summary(self):
+        """
+        :return: proxy url -> {latency, success_rate, loads, failures, quarantined}
+        """
+        with self.lock:
+            now = self.clock()
+            return {proxy: {"latency": stats.latency, "success_rate": stats.success_rate, "loads": stats.loads,
+                            "failures": stats.failures, "quarantined": stats.quarantined_until > now}
+                    for proxy, stats in self.proxies.items()}
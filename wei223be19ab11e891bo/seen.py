@@ -0,0 +1,135 @@
+"""
+Cross-run seen-post cache for the Sina Weibo collector.
+
+The realtime page of a keyword changes slowly compared to how often we visit it, so consecutive runs keep meeting the
+posts they already sent. The cache remembers the posts we yielded (keyed by the post path, "<uid>/<mid>") for as long as
+they can still pass the oldness filter, so that process_and_send can skip them as soon as it reads their url.
+
+Lookups are served from memory. The entries are also written to a small SQLite file so that they survive a restart. One
+instance is shared by all the query() runs of the process. It is guarded by a lock, and the SQLite writes are batched.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+FLUSH_EVERY = 50  # pending additions written to disk at once
+SCHEMA = "CREATE TABLE IF NOT EXISTS seen_posts (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+
+
+def post_key(url):
+    """
+    :param url: the post url, e.g. https://weibo.com/1234567/N0abcdEFg?refer_flag=1001030103_
+    :return: the part identifying the post ("1234567/N0abcdEFg"), whatever the scheme and tracking parameters
+    """
+    return urlsplit(url).path.strip("/")
+
+
+class SeenCache:
+    """
+    A bounded set of post keys, each one expiring after its own time to live
+    """
+
+    def __init__(self, path=None, max_entries=100000):
+        """
+        :param path: the SQLite file backing the cache, None to keep it in memory only
+        :param max_entries: the oldest entries are dropped above this size
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}  # key -> expiry (epoch seconds)
+        self.pending = []
+        self.connection = None
+        if path is not None:
+            self.open(path)
+
+    def open(self, path):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(SCHEMA)
+            rows = self.connection.execute(
+                "SELECT key, expires_at FROM seen_posts WHERE expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+                (time.time(), self.max_entries),
+            ).fetchall()
+            self.entries = dict(rows)
+            logging.info(f"[Sina Weibo seen] Loaded {len(self.entries)} known posts from {path}")
+        except (sqlite3.Error, OSError) as e:
+            logging.info(f"[Sina Weibo seen] Could not open {path}, keeping the cache in memory only: {e}")
+            self.connection = None
+
+    def __contains__(self, key):
+        expires_at = self.entries.get(key)
+        return expires_at is not None and expires_at > time.time()
+
+    def add(self, key, ttl):
+        """
+        :param key: the post key, see post_key
+        :param ttl: how long (in seconds) the post must be remembered
+        """
+        expires_at = time.time() + ttl
+        with self.lock:
+            self.entries[key] = expires_at
+            self.pending.append((key, expires_at))
+            if len(self.entries) > self.max_entries:
+                self.prune()
+            if len(self.pending) >= FLUSH_EVERY:
+                self.flush_locked()
+
+    def prune(self):
+        now = time.time()
+        self.entries = {key: expires_at for key, expires_at in self.entries.items() if expires_at > now}
+        if len(self.entries) > self.max_entries:
+            newest = sorted(self.entries.items(), key=lambda entry: entry[1])[-self.max_entries:]
+            self.entries = dict(newest)
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        pending, self.pending = self.pending, []
+        if self.connection is None or not pending:
+            return
+        try:
+            self.connection.execute("BEGIN")
+            self.connection.executemany("INSERT OR REPLACE INTO seen_posts VALUES (?, ?)", pending)
+            self.connection.execute("DELETE FROM seen_posts WHERE expires_at <= ?", (time.time(),))
+            self.connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            logging.info(f"[Sina Weibo seen] Could not write to {self.path}: {e}")
+            if self.connection.in_transaction:
+                self.connection.execute("ROLLBACK")
+
+    def close(self):
+        with self.lock:
+            self.flush_locked()
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+SEEN_CACHES = {}
+SEEN_CACHES_LOCK = threading.Lock()
+
+
+def get_seen_cache(path):
+    """
+    :return: the cache backed by path, shared by every caller of the process
+    """
+    with SEEN_CACHES_LOCK:
+        if path not in SEEN_CACHES:
+            SEEN_CACHES[path] = SeenCache(path)
+        return SEEN_CACHES[path]
+
+
+@atexit.register
+def close_seen_caches():
+    with SEEN_CACHES_LOCK:
+        for cache in SEEN_CACHES.values():
+            cache.close()
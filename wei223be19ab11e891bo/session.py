@@ -0,0 +1,214 @@
+"""
+Execution layer for the Sina Weibo collector.
+
+Selenium's WebDriver API is fully synchronous: every call is an HTTP round trip to chromedriver that blocks the calling
+thread until the browser answers. Running those calls directly inside query() freezes the whole asyncio event loop, and
+with it every other exorde_data module sharing the process.
+
+A DriverSession pairs one WebDriver with one dedicated worker thread. Every blocking call on the driver (or on an element
+it returned) is shipped to that thread and awaited from the loop, so other coroutines keep running while the browser
+works. Using a single thread per driver also keeps the calls strictly ordered, which WebDriver requires.
+"""
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .browser_profile import block_urls
+from .http_engine import LOGIN_WALL_URL_MARKERS
+from .metrics import QueryMetrics
+from .processes import driver_pid, kill_tree, process_tree, tree_rss_bytes
+
+QUIT_TIMEOUT_SECONDS = 15  # a browser that did not quit by then is killed
+
+
+class DriverSession:
+    """
+    A WebDriver bound to its own single-threaded executor
+    """
+
+    def __init__(self, driver=None, executor=None):
+        self.driver = driver
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="weibo-driver")
+        self.created_at = time.monotonic()
+        self.uses = 0  # how many query() runs were served by this session
+        self.last_keyword = None  # the keyword of the result page we are on, None if not on a result page
+        self.last_navigation_at = None  # time.monotonic() of the last page load we asked for
+        self.metrics = QueryMetrics()  # the metrics of the query() run using the session, see DriverPool.acquire
+        self.proxy = None  # the proxy server of the browser
+        self.proxies = None  # the ProxyPool scoring that proxy with our page loads
+        self.pacer = None  # the RateController pacing the drivers of our proxy, fed with our page loads
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created_at
+
+    @classmethod
+    async def start(cls, factory, *args, **kwargs):
+        """
+        Build the driver on the executor that will own it, so that the (slow) browser start does not block the loop
+        :param factory: a callable returning a WebDriver instance (normally init_driver)
+        :return: a ready DriverSession
+        """
+        session = cls()
+        try:
+            session.driver = await session.run(factory, *args, **kwargs)
+        except BaseException:
+            session.executor.shutdown(wait=False)
+            raise
+        return session
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run any blocking callable on the driver thread and await its result
+        :param fn: the blocking callable (a driver/element method, or a function working on them)
+        :return: whatever fn returned
+        """
+        loop = asyncio.get_running_loop()
+        self.metrics.count("webdriver_calls")
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def get(self, url):
+        """
+        Load a page, its load time (or failure, or a redirect to a login / captcha page) counts in the score of the proxy
+        of the session and in the pace of the drivers
+        """
+        started = time.monotonic()
+        try:
+            result = await self.run(self.driver.get, url)
+            current_url = await self.run(lambda: self.driver.current_url)
+        except Exception:
+            self.report_load(success=False, reason="page load failed")
+            raise
+        if any(marker in current_url and marker not in url for marker in LOGIN_WALL_URL_MARKERS):
+            self.report_load(success=False, reason=f"redirected to {current_url}")
+        else:
+            self.report_load(time.monotonic() - started)
+        return result
+
+    def report_load(self, seconds=None, success=True, reason=None):
+        """
+        Report the outcome of a page load to the ProxyPool and to the RateController of the session
+        :param seconds: how long the load took, for a success
+        :param success: False if the load failed, or landed on a login / captcha wall (missing elements included)
+        :param reason: what went wrong, for the logs
+        """
+        if self.proxies is not None:
+            self.proxies.report(self.proxy, seconds, success)
+        if self.pacer is not None:
+            if not success:
+                self.pacer.throttled(reason or "page load failed")
+            elif seconds is not None:
+                self.pacer.loaded(seconds)
+
+    async def execute_script(self, script, *args):
+        return await self.run(self.driver.execute_script, script, *args)
+
+    async def find_element(self, by, value):
+        return await self.run(self.driver.find_element, by, value)
+
+    async def find_elements(self, by, value):
+        return await self.run(self.driver.find_elements, by, value)
+
+    async def is_healthy(self, timeout=5):
+        """
+        Check that the browser still answers, so that a dead chromedriver is not handed to a new query
+        :param timeout: how long (in seconds) we wait for the answer
+        :return: True if the driver answered in time
+        """
+        try:
+            await asyncio.wait_for(self.execute_script("return document.readyState"), timeout)
+            return True
+        except Exception as e:
+            logging.info(f"[Sina Weibo session] Health check failed: {e}")
+            return False
+
+    def process_tree(self):
+        """
+        :return: the processes of the driver (chromedriver, the browser and its children), see processes.process_tree
+        """
+        return process_tree(driver_pid(self.driver))
+
+    def rss_bytes(self):
+        """
+        :return: the resident memory of the processes of the driver, None if we cannot read it
+        """
+        tree = self.process_tree()
+        return tree_rss_bytes(tree) if tree else None
+
+    async def switch_to_window(self, handle):
+        """
+        Switch to another tab, and block the URLs of the lean profile in it if it is a new one: Network.setBlockedURLs
+        only applies to the tab that was current when it was sent
+        :param handle: the window handle of the tab
+        """
+        def switch():
+            if handle == self.driver.current_window_handle:
+                return
+            self.driver.switch_to.window(handle)
+            block_urls(self.driver, getattr(self.driver, "blocked_urls", None))
+
+        await self.run(switch)
+
+    async def close_stale_tabs(self):
+        """
+        Close every tab but the current one: each search typed in a result page opens a new tab
+        :return: how many tabs were closed
+        """
+        def close_others():
+            current = self.driver.current_window_handle
+            stale = [handle for handle in self.driver.window_handles if handle != current]
+            for handle in stale:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            if stale:
+                self.driver.switch_to.window(current)
+            return len(stale)
+
+        closed = await self.run(close_others)
+        if closed:
+            self.metrics.count("stale_tabs_closed", closed)
+        return closed
+
+    async def quit(self):
+        """
+        Quit the whole browser (all windows, chromedriver included) and release the driver thread. The processes of the
+        driver that survive (quit() failed, or timed out) are killed.
+        """
+        # /proc is read off the loop, but not on the driver thread: it may be stuck in the call that made us give up on it
+        loop = asyncio.get_running_loop()
+        tree = await loop.run_in_executor(None, self.process_tree)
+        try:
+            if self.driver is not None:
+                await asyncio.wait_for(self.run(self.driver.quit), QUIT_TIMEOUT_SECONDS)
+        except Exception as e:
+            logging.info(f"[Sina Weibo session] Error while quitting driver: {e}")
+        finally:
+            self.executor.shutdown(wait=False)
+            await loop.run_in_executor(None, self.reap, tree)
+
+    def terminate(self):
+        """
+        Synchronous variant of quit(), for the interpreter exit when no event loop is running anymore
+        """
+        tree = self.process_tree()
+        try:
+            if self.driver is not None:
+                self.driver.quit()
+        except Exception:
+            pass
+        finally:
+            self.executor.shutdown(wait=False)
+            self.reap(tree)
+
+    def reap(self, tree):
+        """
+        Kill the processes of tree still alive, and collect the exit status of chromedriver (our child process)
+        """
+        if kill_tree(tree):
+            process = getattr(getattr(self.driver, "service", None), "process", None)
+            try:
+                process.wait(timeout=1)
+            except Exception:
+                pass
@@ -0,0 +1,177 @@
+"""
+Multi-process sharded collection for the Sina Weibo collector.
+
+A query() run drives its browsers from a single process, so a single core. The sharded mode splits the keywords across
+worker processes instead, each one running its own query() (and so its own drivers) on its share of the keywords, and
+merges what they collect back into a single stream:
+
+    - the items travel through a bounded multiprocessing queue, a worker waits when the parent falls behind;
+    - the parent drops the posts it already yielded (by post url, see seen.post_key), several workers may meet the same
+      post under different keywords, and applies the item cap to the merged stream;
+    - a worker that crashes (non-zero exit code) is started again on the same keywords, up to max_restarts times. The
+      posts it sent before the crash are deduplicated like the others.
+
+The workers are started with the "spawn" method: a fresh interpreter each, nothing inherited from the event loop or the
+drivers of the parent. They are stopped with SIGTERM, which cancels their query() so that its drivers are given back
+to the pool and quit before the process exits, rather than left behind with their Chrome processes.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+DEFAULT_MAX_RESTARTS = 3  # per shard
+QUEUE_SIZE = 200
+POLL_SECONDS = 0.2
+STOP_TIMEOUT_SECONDS = 30  # for the workers to quit their drivers once stopped, they are killed after that
+
+
+def default_shards():
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def split_keywords(keywords, shards):
+    """
+    :return: the keywords dealt round-robin into at most `shards` non-empty lists
+    """
+    split = [keywords[i::shards] for i in range(shards)]
+    return [keywords for keywords in split if keywords]
+
+
+def worker_parameters(parameters, keywords, shard):
+    """
+    :return: the query() parameters of a shard: its keywords, and none of the settings that cannot cross a process
+    boundary (callables) or that the workers must not share (the metrics file, the keyword statistics file: each
+    shard gets its own, which sharded_query seeds and merges back)
+    """
+    parameters = {key: value for key, value in parameters.items() if not callable(value)}
+    parameters.update(keywords=keywords, metrics_path=None, metrics_aggregate=False)
+    if parameters.get("keyword_stats_path"):
+        parameters["keyword_stats_path"] = f"{parameters['keyword_stats_path']}.shard{shard}"
+    return parameters
+
+
+def shard_worker(parameters, shard, messages):
+    """
+    Entry point of a worker process: run query() on the shard, and send ("item", shard, item) for every item, then
+    ("metrics", shard, QueryMetrics.as_dict()) and ("done", shard, None). SIGTERM cancels the query and quits the
+    drivers, see ShardedRun.stop
+    """
+    from . import DRIVER_POOL, query
+
+    received = []
+
+    async def send(message):
+        while True:
+            try:
+                return messages.put_nowait(message)
+            except queue.Full:
+                await asyncio.sleep(POLL_SECONDS)  # the parent falls behind, wait without blocking SIGTERM
+
+    async def collect():
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass  # no loop signal handlers on Windows, where terminate() cannot be caught anyway
+        async for item in query(dict(parameters, metrics_callback=received.append)):
+            await send(("item", shard, item))
+
+    try:
+        asyncio.run(collect())
+    except asyncio.CancelledError:
+        logging.info(f"[Sina Weibo shards] Shard {shard} stopped")
+        messages.cancel_join_thread()  # the parent does not read anymore, exit without flushing to it
+        return
+    finally:
+        DRIVER_POOL.shutdown()
+    messages.put(("metrics", shard, received[0].as_dict() if received else None))
+    messages.put(("done", shard, None))
+
+
+class ShardedRun:
+    """
+    The worker processes of a sharded query, and the merged stream of their items
+    """
+
+    def __init__(self, parameters, shards, max_restarts=DEFAULT_MAX_RESTARTS):
+        """
+        :param parameters: the query() parameters, their keywords are split across the workers
+        :param shards: how many worker processes to run
+        """
+        self.context = multiprocessing.get_context("spawn")
+        self.messages = self.context.Queue(QUEUE_SIZE)
+        self.shard_parameters = [worker_parameters(parameters, keywords, shard)
+                                 for shard, keywords in enumerate(split_keywords(list(parameters["keywords"]), shards))]
+        self.max_restarts = max_restarts
+        self.processes = {}  # shard -> Process
+        self.restarts = {}  # shard -> restarts so far
+        self.done = set()
+
+    def start(self, shard):
+        process = self.context.Process(target=shard_worker, args=(self.shard_parameters[shard], shard, self.messages),
+                                       name=f"weibo-shard-{shard}", daemon=True)
+        process.start()
+        self.processes[shard] = process
+
+    def check_workers(self):
+        """
+        Restart the workers that crashed, give up on the ones that crashed too often
+        """
+        for shard, process in self.processes.items():
+            if shard in self.done or process.is_alive() or not process.exitcode:
+                continue  # running, or exited cleanly: its "done" message is on its way
+            restarts = self.restarts.get(shard, 0)
+            if restarts >= self.max_restarts:
+                logging.info(f"[Sina Weibo shards] Shard {shard} crashed {restarts + 1} times, giving up on it")
+                self.done.add(shard)
+                continue
+            logging.info(f"[Sina Weibo shards] Shard {shard} crashed (exit code {process.exitcode}), restarting it")
+            self.restarts[shard] = restarts + 1
+            self.start(shard)
+
+    def receive(self):
+        try:
+            return self.messages.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            return None
+
+    async def messages_stream(self):
+        """
+        :return: asynchronously yields the ("item" | "metrics", shard, payload) messages of the workers, until they are
+        all done
+        """
+        loop = asyncio.get_running_loop()
+        for shard in range(len(self.shard_parameters)):
+            self.start(shard)
+        try:
+            while len(self.done) < len(self.shard_parameters):
+                message = await loop.run_in_executor(None, self.receive)
+                if message is None:
+                    self.check_workers()
+                    continue
+                kind, shard, payload = message
+                if kind == "done":
+                    self.done.add(shard)
+                    continue
+                yield message
+        finally:
+            await loop.run_in_executor(None, self.stop)
+
+    def stop(self):
+        """
+        Ask the workers still running to stop (SIGTERM, they quit their drivers first), and kill the ones that are not
+        done after STOP_TIMEOUT_SECONDS. Blocking, see messages_stream
+        """
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT_SECONDS
+        for shard, process in self.processes.items():
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logging.info(f"[Sina Weibo shards] Shard {shard} did not stop in time, killing it")
+                process.kill()
+                process.join()
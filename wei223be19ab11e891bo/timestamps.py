@@ -0,0 +1,98 @@
+"""
+Publish time parsing for the Sina Weibo collector.
+
+Weibo shows the publish time of a post relative to the reader, in Asia/Shanghai local time:
+
+    刚刚                  just now
+    12秒前 / 5分钟前 / 2小时前   X seconds / minutes / hours ago
+    今天 10:12 / 昨天 23:05    today / yesterday at HH:MM
+    10月18日 10:12          month / day at HH:MM, current year
+    2023年10月18日 10:12     full date
+    2023-10-18 10:12       full date
+
+A PageClock reads the current time once (per page) and turns any of these into an epoch timestamp, so that filtering on
+age is a plain comparison. The CreatedAt string is only rendered, through format_created_at, for the items we keep.
+"""
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+SHANGHAI = timezone(timedelta(hours=8), "Asia/Shanghai")  # no daylight saving time in China
+CREATED_AT_FORMAT = "%Y-%m-%dT%H:%M:%S.00Z"
+
+JUST_NOW = "刚刚"
+RELATIVE_UNITS = {"秒前": 1, "分钟前": 60, "小时前": 3600}
+
+RELATIVE = re.compile(r"\s*(\d+)\s*(秒前|分钟前|小时前)")
+DAY_TIME = re.compile(r"\s*(今天|昨天)\s*(\d{1,2}):(\d{2})")
+MONTH_DAY_TIME = re.compile(r"\s*(?:(\d{4})\s*年\s*)?(\d{1,2})\s*月\s*(\d{1,2})\s*日\s*(\d{1,2}):(\d{2})")
+NUMERIC_DATE_TIME = re.compile(r"\s*(?:(\d{4})-)?(\d{1,2})-(\d{1,2})\s+(\d{1,2}):(\d{2})")
+
+
+class PageClock:
+    """
+    The current time, read once, and the publish time parser built on it
+    """
+
+    def __init__(self, now=None):
+        """
+        :param now: the current epoch timestamp, time.time() if None
+        """
+        self.now = time.time() if now is None else now
+        self.local_now = datetime.fromtimestamp(self.now, SHANGHAI)
+        self.midnight = self.local_now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+    def cutoff(self, max_oldness_seconds):
+        """
+        :return: the epoch timestamp before which a post is too old
+        """
+        return self.now - max_oldness_seconds
+
+    def parse(self, text):
+        """
+        :param text: the publish time as displayed by Weibo
+        :return: the epoch timestamp of the publication, None if the format is unknown
+        """
+        if not text:
+            return None
+
+        match = RELATIVE.match(text)
+        if match is not None:
+            return self.now - int(match.group(1)) * RELATIVE_UNITS[match.group(2)]
+
+        if text.strip().startswith(JUST_NOW):
+            return self.now
+
+        match = DAY_TIME.match(text)
+        if match is not None:
+            day, hour, minute = match.groups()
+            midnight = self.midnight if day == "今天" else self.midnight - 86400
+            return midnight + int(hour) * 3600 + int(minute) * 60
+
+        match = MONTH_DAY_TIME.match(text) or NUMERIC_DATE_TIME.match(text)
+        if match is not None:
+            year, month, day, hour, minute = match.groups()
+            return self.absolute(year, month, day, hour, minute)
+
+        return None
+
+    def absolute(self, year, month, day, hour, minute):
+        try:
+            published_at = datetime(int(year) if year else self.local_now.year, int(month), int(day), int(hour),
+                                    int(minute), tzinfo=SHANGHAI)
+        except ValueError:
+            return None
+        if not year and published_at > self.local_now + timedelta(days=1):
+            try:
+                published_at = published_at.replace(year=published_at.year - 1)  # e.g. "12月31日" read on January 1st
+            except ValueError:
+                return None
+        return published_at.timestamp()
+
+
+def format_created_at(published_at):
+    """
+    :param published_at: epoch timestamp
+    :return: the UTC CreatedAt string expected by exorde_data
+    """
+    return datetime.fromtimestamp(published_at, timezone.utc).strftime(CREATED_AT_FORMAT)
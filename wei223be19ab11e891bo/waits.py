@@ -0,0 +1,139 @@
+"""
+Element waits for the Sina Weibo collector.
+
+Waiting for an element used to mean catching any exception and sleeping for a whole second before retrying, so every
+element that was not there immediately cost at least one second. Here the waiting happens inside the page: a
+MutationObserver (execute_async_script) answers as soon as the element is in the DOM, within a per-step deadline. Only the
+exceptions we expect while a page is loading or navigating are retried, anything else is raised to the caller.
+"""
+import asyncio
+import logging
+
+POLL_INTERVAL_SECONDS = 0.05  # pause before retrying after an ignored exception
+OBSERVER_SLICE_SECONDS = 5  # longest time a single in-page wait may take, the driver script timeout must be above it
+
+
+
+def ignored_exceptions():
+    """
+    :return: the exceptions we expect while a page is loading or navigating, anything else is not worth retrying
+    """
+    from selenium.common.exceptions import (
+        JavascriptException,
+        NoSuchElementException,
+        NoSuchWindowException,
+        StaleElementReferenceException,
+        TimeoutException,
+    )
+
+    return (
+        JavascriptException,
+        NoSuchElementException,
+        NoSuchWindowException,
+        StaleElementReferenceException,
+        TimeoutException,
+    )
+
+
+WAIT_SCRIPT = """
+var xpath = arguments[0];
+var root = arguments[1] || document;
+var timeoutMs = arguments[2];
+var minimum = arguments[3];
+var done = arguments[arguments.length - 1];
+
+function lookup() {
+    if (minimum === 0) {
+        return document.evaluate(xpath, root, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    var snapshot = document.evaluate(xpath, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    if (snapshot.snapshotLength < minimum) { return null; }
+    var nodes = [];
+    for (var i = 0; i < snapshot.snapshotLength; i++) { nodes.push(snapshot.snapshotItem(i)); }
+    return nodes;
+}
+
+var found = lookup();
+if (found !== null) { done(found); return; }
+
+var timer = null;
+var observer = new MutationObserver(function () {
+    var found = lookup();
+    if (found !== null) {
+        observer.disconnect();
+        clearTimeout(timer);
+        done(found);
+    }
+});
+observer.observe(document, {childList: true, subtree: true, attributes: true});
+timer = setTimeout(function () { observer.disconnect(); done(null); }, timeoutMs);
+"""
+
+
+async def wait_until(session, condition, timeout, poll_interval=POLL_INTERVAL_SECONDS, ignored=None):
+    """
+    Poll a blocking condition on the driver thread until it returns something truthy
+    :param session: the DriverSession to drive
+    :param condition: blocking callable, run on the driver thread
+    :param timeout: deadline of this step (in seconds)
+    :param poll_interval: pause between two attempts (in seconds)
+    :param ignored: exceptions meaning "not yet", anything else is raised, ignored_exceptions() if None
+    :return: the first truthy value returned by condition, None if the deadline passed
+    """
+    ignored = ignored or ignored_exceptions()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            result = await session.run(condition)
+            if result:
+                return result
+        except ignored as e:
+            logging.debug(f"[Sina Weibo wait] {type(e).__name__} while waiting, retrying")
+        if loop.time() + poll_interval > deadline:
+            return None
+        await asyncio.sleep(poll_interval)
+
+
+async def wait_for_xpath(session, xpath, timeout, root=None, minimum=0, ignored=None):
+    """
+    Wait for an element (or a number of elements) to be in the DOM, the page telling us as soon as it happens
+    :param session: the DriverSession to drive
+    :param xpath: the xpath of the element(s) we are waiting for
+    :param timeout: deadline of this step (in seconds)
+    :param root: the element the xpath is evaluated from, the document if None
+    :param minimum: 0 to wait for a single element, N to wait for at least N elements
+    :param ignored: exceptions meaning "not yet", anything else is raised, ignored_exceptions() if None
+    :return: the element (minimum=0) or the list of elements, None if the deadline passed
+    """
+    ignored = ignored or ignored_exceptions()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return None
+        try:
+            slice_ms = int(min(remaining, OBSERVER_SLICE_SECONDS) * 1000)
+            found = await session.run(session.driver.execute_async_script, WAIT_SCRIPT, xpath, root, slice_ms, minimum)
+            if found:
+                return found
+        except ignored as e:
+            # most likely the page navigated while we were waiting in it
+            logging.debug(f"[Sina Weibo wait] {type(e).__name__} while waiting for {xpath}, retrying")
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+async def wait_for_element(session, xpath, timeout, root=None):
+    """
+    :return: the first element matching xpath, None if it did not show up before the deadline
+    """
+    return await wait_for_xpath(session, xpath, timeout, root=root)
+
+
+async def wait_for_elements(session, xpath, timeout, root=None, minimum=1):
+    """
+    Unlike find_elements, an empty result is not an answer: we wait until at least `minimum` elements are there
+    :return: the elements matching xpath, None if there were not enough of them before the deadline
+    """
+    return await wait_for_xpath(session, xpath, timeout, root=root, minimum=minimum)
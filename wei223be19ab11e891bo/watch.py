@@ -0,0 +1,101 @@
+"""
+Realtime watch mode for the Sina Weibo collector.
+
+query() is a one-shot run: for a topic we follow continuously, every run pays the browser start, the landing page and the
+search again, to find the few posts published since the previous run. watch() keeps its drivers (and their result pages)
+instead, and refreshes the realtime results of every keyword again and again, as an endless stream.
+
+A KeywordWatch holds what we know of a keyword between two refreshes:
+
+    - the watermark, the publish time of the newest post we saw. A refresh only scrolls down to it, and only the posts
+      newer than it are handed over. Weibo shows the publish times to the minute at best, so the posts of the last minute
+      before the watermark are told apart by their url;
+    - the refresh interval: halved when a refresh brings new posts, 1.5 times longer when it does not, within
+      [min_refresh_seconds, max_refresh_seconds]. Busy keywords are refreshed often, quiet ones rarely.
+"""
+import random
+import time
+
+DEFAULT_MIN_REFRESH_SECONDS = 20
+DEFAULT_MAX_REFRESH_SECONDS = 300
+DEFAULT_QUEUE_SIZE = 100  # items waiting for the consumer, the refreshes wait once it is full
+DEFAULT_METRICS_INTERVAL_SECONDS = 60  # the metrics of a watch are published (and reset) this often
+WATERMARK_SLACK_SECONDS = 60
+FASTER = 0.5
+SLOWER = 1.5
+
+
+class KeywordWatch:
+    """
+    The watermark and the refresh schedule of a watched keyword
+    """
+
+    def __init__(self, keyword, min_refresh_seconds=DEFAULT_MIN_REFRESH_SECONDS,
+                 max_refresh_seconds=DEFAULT_MAX_REFRESH_SECONDS, clock=time.monotonic):
+        self.keyword = keyword
+        self.min_refresh_seconds = min_refresh_seconds
+        self.max_refresh_seconds = max_refresh_seconds
+        self.clock = clock
+        self.interval = min_refresh_seconds
+        self.due_at = clock()  # the first refresh happens right away
+        self.watermark = None  # epoch publish time of the newest post seen
+        self.recent = {}  # url -> publish time, of the posts seen within the slack of the watermark
+        self.refreshes = 0
+        self.new_posts = 0
+
+    def max_oldness_seconds(self, default, now=None):
+        """
+        :param default: the oldness cutoff of the run
+        :return: the oldness cutoff of the next refresh, the posts past the watermark being known already
+        """
+        if self.watermark is None:
+            return default
+        now = time.time() if now is None else now
+        return max(WATERMARK_SLACK_SECONDS, min(default, now - self.watermark + WATERMARK_SLACK_SECONDS))
+
+    def is_new(self, url, published_at):
+        if self.watermark is not None and published_at < self.watermark - WATERMARK_SLACK_SECONDS:
+            return False
+        return url not in self.recent
+
+    def add(self, url, published_at):
+        self.recent[url] = published_at
+        if self.watermark is None or published_at > self.watermark:
+            self.watermark = published_at
+
+    def select(self, cards, clock):
+        """
+        Keep the cards of a refresh that are newer than the watermark, then move the watermark up
+        :param cards: the data of the cards of the refresh, see extract_cards
+        :param clock: the PageClock to read their publish times with
+        :return: the new cards
+        """
+        new_cards, published = [], []
+        for card in cards:
+            published_at = clock.parse(card["time"])
+            if card["url"] is None or published_at is None:
+                continue
+            if self.is_new(card["url"], published_at):
+                new_cards.append(card)
+            published.append((card["url"], published_at))
+        for url, published_at in published:
+            self.add(url, published_at)
+        return new_cards
+
+    def refreshed(self, new_posts):
+        """
+        Adapt the refresh interval to what the last refresh brought, and schedule the next one
+        :param new_posts: the items the refresh yielded
+        :return: the new refresh interval
+        """
+        self.refreshes += 1
+        self.new_posts += new_posts
+        if new_posts:
+            self.interval = max(self.min_refresh_seconds, self.interval * FASTER)
+        else:
+            self.interval = min(self.max_refresh_seconds, self.interval * SLOWER)
+        if self.watermark is not None:
+            self.recent = {url: published_at for url, published_at in self.recent.items()
+                           if published_at >= self.watermark - WATERMARK_SLACK_SECONDS}
+        self.due_at = self.clock() + self.interval * random.uniform(0.9, 1.1)
+        return self.interval